@@ -0,0 +1,68 @@
+"""Users and hashtags as Categorical vs. as strings through the analysis pipeline.
+
+The exploded hashtags (as from `explode_hashtags`) are decoded to strings for the
+baseline, then both go through the windowed Gini, the compact output and the
+secondary analysis of all windows. Run with:
+    python benchmarks/bench_categorical.py --n_posts 1000000
+"""
+
+import time
+
+import polars as pl
+
+from corpus import CorpusParams, make_corpus
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_POST,
+    _windows,
+    compact_primary_output,
+    explode_hashtags,
+    secondary_analyzer_all,
+)
+
+
+def run(df_exploded: pl.DataFrame) -> dict[str, float]:
+    timings = {}
+
+    t0 = time.perf_counter()
+    df_out = _windows(df_exploded.lazy(), every="1d", period="1d").collect()
+    timings["hashtag_analysis"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    _, df_counts = compact_primary_output(df_out)
+    timings["compact_primary_output"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    secondary_analyzer_all(df_counts)
+    timings["secondary_analyzer_all"] = time.perf_counter() - t0
+
+    timings["exploded_mb"] = df_exploded.estimated_size("mb")
+    timings["primary_output_mb"] = df_out.estimated_size("mb")
+
+    return timings
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--n_posts", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    df_corpus = make_corpus(CorpusParams(posts_per_day=args.n_posts // 100, days=100))
+    df_categorical = explode_hashtags(df_corpus)
+    df_string = df_categorical.with_columns(
+        pl.col(COL_AUTHOR_ID).cast(pl.String), pl.col(COL_POST).cast(pl.String)
+    )
+
+    for name, df_exploded in [("String", df_string), ("Categorical", df_categorical)]:
+        runs = [run(df_exploded) for _ in range(args.repeats)]
+        best = {key: min(r[key] for r in runs) for key in runs[0]}
+
+        print(f"{name}:")
+        for key, value in best.items():
+            unit = "MB" if key.endswith("_mb") else "s"
+            print(f"  {key:>24}: {value:.3f} {unit}")
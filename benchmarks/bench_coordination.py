@@ -0,0 +1,58 @@
+"""Coordinated-account clusters of a single time window with many users.
+
+All posts are in one day, so the window has close to `--n_users` users. Run with:
+    python benchmarks/bench_coordination.py --n_users 100000 --n_posts 400000
+"""
+
+import resource
+import time
+
+import numpy as np
+import polars as pl
+
+from corpus import CorpusParams, make_corpus
+from mango_blog.coordination import coordinated_clusters, user_hashtag_matrix
+from mango_blog.hashtags import (
+    OUTPUT_COL_TIMESPAN,
+    compact_primary_output,
+    hashtag_analysis,
+)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--n_users", type=int, default=100_000)
+    parser.add_argument("--n_posts", type=int, default=400_000)
+    parser.add_argument("--max_hashtag_users", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    params = CorpusParams(n_users=args.n_users, posts_per_day=args.n_posts, days=1)
+    df_out = hashtag_analysis(
+        make_corpus(params).drop("hashtags"), every="1d", period="1d"
+    ).with_columns(pl.col(OUTPUT_COL_TIMESPAN).str.to_datetime())
+    _, df_counts = compact_primary_output(df_out)
+
+    matrix, users, hashtags = user_hashtag_matrix(df_counts, 0)
+    n_active = (np.diff(matrix.indptr) >= 2).sum()
+    print(
+        f"{len(users)} users ({n_active} with 2+ hashtags), {len(hashtags)} hashtags,"
+        f" {matrix.nnz} nonzero counts"
+    )
+
+    timings = []
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        df_clusters = coordinated_clusters(
+            df_counts, 0, max_hashtag_users=args.max_hashtag_users
+        )
+        timings.append(time.perf_counter() - t0)
+
+    print(f"coordinated_clusters: best of {args.repeats} = {min(timings):.3f}s")
+    print(f"{len(df_clusters)} clusters")
+    print(
+        f"peak memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6:.2f} GB"
+    )
@@ -0,0 +1,78 @@
+"""Hashtag extraction: the previous `#\\S+` regex against `explode_hashtags`.
+
+The previous version checked the whole column for "#" and then extracted with
+`str.extract_all(r"(#\\S+)")` from every post, as strings. Timed alone and followed
+by the daily Gini aggregation of `hashtag_analysis`, which runs on the output. Run
+with:
+    python benchmarks/bench_extraction.py --n_posts 10000000
+"""
+
+import time
+
+import polars as pl
+
+from corpus import CorpusParams, make_corpus
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_POST,
+    COL_TIME,
+    _windows,
+    explode_hashtags,
+)
+
+
+def explode_hashtags_regex(df: pl.DataFrame) -> pl.DataFrame:
+    assert df.select(pl.col(COL_POST).str.contains("#").any()).item()
+
+    return (
+        df.with_columns(pl.col(COL_POST).str.extract_all(r"(#\S+)"))
+        .filter(pl.col(COL_POST) != [])
+        .select(pl.col([COL_AUTHOR_ID, COL_TIME, COL_POST]))
+        .sort(pl.col(COL_TIME))
+        .explode(pl.col(COL_POST))
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--n_posts", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    # one in four posts without hashtags, punctuation and case variants
+    df = (
+        make_corpus(CorpusParams(posts_per_day=args.n_posts // 100, days=100))
+        .select(COL_AUTHOR_ID, COL_TIME, COL_POST)
+        .with_columns(
+            pl.when(pl.int_range(pl.len()) % 3 == 0)
+            .then(pl.col(COL_POST).str.replace_all("#tag", "#Tag", literal=True))
+            .otherwise(pl.col(COL_POST).str.replace_all(r"(#tag\d+)", "$1,"))
+            .alias(COL_POST)
+        )
+    )
+
+    engines = {
+        "extract_all(#\\S+)": explode_hashtags_regex,
+        "explode_hashtags": explode_hashtags,
+    }
+
+    for name, fn in engines.items():
+        timings = []
+        timings_windows = []
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            df_out = fn(df)
+            timings.append(time.perf_counter() - t0)
+            _windows(df_out.lazy(), every="1d", period="1d").collect()
+            timings_windows.append(time.perf_counter() - t0)
+
+        n_unique = df_out[COL_POST].n_unique()
+        print(
+            f"{name:>20}: best of {args.repeats} = {min(timings):.3f}s "
+            f"(with windows {min(timings_windows):.3f}s), "
+            f"{len(df_out)} hashtags, {n_unique} unique"
+        )
@@ -0,0 +1,66 @@
+"""Compare the per-window Python `gini` (map_batches) against the native `gini_expr`.
+
+Run with:
+    python benchmarks/bench_gini.py --n_posts 1000000 --every 1h --period 1h
+"""
+
+import time
+
+import polars as pl
+from polars.testing import assert_series_equal
+
+from corpus import CorpusParams, make_corpus
+from mango_blog.hashtags import COL_POST, COL_TIME, explode_hashtags, gini, gini_expr
+
+
+def run(df: pl.DataFrame, gini_agg: pl.Expr, every: str, period: str) -> pl.DataFrame:
+    return df.group_by_dynamic(
+        pl.col(COL_TIME), every=every, period=period, start_by="datapoint"
+    ).agg(gini_agg.alias("gini"))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--n_posts", type=int, default=1_000_000)
+    parser.add_argument("--n_users", type=int, default=5_000)
+    parser.add_argument("--n_hashtags", type=int, default=50_000)
+    parser.add_argument("--every", type=str, default="1h")
+    parser.add_argument("--period", type=str, default="1h")
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    params = CorpusParams(
+        n_users=args.n_users,
+        n_hashtags=args.n_hashtags,
+        posts_per_day=args.n_posts // 365,
+        days=365,
+    )
+    df = explode_hashtags(make_corpus(params))
+
+    engines = {
+        "map_batches(gini)": pl.col(COL_POST).map_batches(
+            gini, returns_scalar=True, return_dtype=pl.Float64
+        ),
+        "gini_expr": gini_expr(COL_POST),
+    }
+
+    results = {}
+    for name, expr in engines.items():
+        timings = []
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            results[name] = run(df, expr, every=args.every, period=args.period)
+            timings.append(time.perf_counter() - t0)
+        print(f"{name:>20}: best of {args.repeats} = {min(timings):.3f}s")
+
+    # the native engine must reproduce the reference values exactly
+    assert_series_equal(
+        results["map_batches(gini)"]["gini"],
+        results["gini_expr"]["gini"],
+        check_exact=True,
+    )
+    print(f"Identical results for {len(results['gini_expr'])} windows")
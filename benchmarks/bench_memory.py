@@ -0,0 +1,99 @@
+"""Peak memory of `hashtag_analysis` on a synthetic corpus, eager vs. lazy/streaming.
+
+Each mode runs in its own subprocess so that its peak resident memory can be
+measured in isolation. The corpus is a folder of parquet files as read by
+`mango_blog.ingest.scan_dataset` (`--csv` for a single CSV file instead, polars
+memory-maps CSV files, so their size is part of the peak). The script fails if the
+lazy pipeline exceeds the ceiling:
+    python benchmarks/bench_memory.py --n_posts 5000000 --max_peak_mb 400
+"""
+
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import polars as pl
+
+from corpus import CorpusParams, make_day, write_corpus
+from mango_blog.hashtags import COL_AUTHOR_ID, COL_POST, COL_TIME, hashtag_analysis
+
+# the lazy pipeline processes the corpus in chunks, its peak memory is about the
+# same for any corpus size (tests/test_memory.py checks this)
+MAX_PEAK_MB = 400
+
+
+def write_corpus_csv(path: Path, n_posts: int, days=20):
+    params = CorpusParams(posts_per_day=n_posts // days, days=days)
+
+    # one chunk of posts per day, without the hashtags extracted at ingest
+    with open(path, "w") as f:
+        for day in range(params.days):
+            chunk = make_day(params, day).select(
+                pl.col(COL_AUTHOR_ID).cast(pl.String),
+                pl.col(COL_TIME),
+                pl.col(COL_POST),
+            )
+            chunk.write_csv(f, include_header=(day == 0))
+
+
+@pl.StringCache()  # the corpus files encode their users and hashtags separately
+def run(path: str, mode: str):
+    if Path(path).suffix == ".csv":
+        lf = pl.scan_csv(path, try_parse_dates=True)
+    else:
+        lf = pl.scan_parquet(path)
+
+    if mode == "lazy":
+        df_out = hashtag_analysis(lf, every="1d", period="1d").collect(
+            engine="streaming"
+        )
+    else:
+        df_out = hashtag_analysis(lf.collect(), every="1d", period="1d")
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:>5}: {len(df_out)} windows, peak memory {peak_mb:.0f} MB")
+
+    return peak_mb
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--n_posts", type=int, default=2_000_000)
+    parser.add_argument("--max_peak_mb", type=float, default=MAX_PEAK_MB)
+    parser.add_argument("--csv", action="store_true", help="Corpus as a CSV file")
+    parser.add_argument("--mode", choices=["eager", "lazy"], default=None)
+    parser.add_argument("--path", type=str, default=None)
+
+    args = parser.parse_args()
+
+    if args.mode is not None:  # child process
+        peak_mb = run(args.path, args.mode)
+        if args.mode == "lazy" and peak_mb > args.max_peak_mb:
+            sys.exit(f"Peak memory {peak_mb:.0f} MB above {args.max_peak_mb} MB")
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.csv:
+            path = Path(tmp, "corpus.csv")
+            write_corpus_csv(path, args.n_posts)
+            size = path.stat().st_size
+        else:
+            path = write_corpus(
+                CorpusParams(posts_per_day=args.n_posts // 20, days=20),
+                Path(tmp, "corpus"),
+            )
+            size = sum(fn.stat().st_size for fn in path.iterdir())
+        print(f"Corpus: {args.n_posts} posts, {size / 2**20:.0f} MB")
+
+        returncode = 0
+        for mode in ["eager", "lazy"]:
+            cmd = [sys.executable, __file__, "--mode", mode, "--path", str(path)]
+            cmd += ["--max_peak_mb", str(args.max_peak_mb)]
+            returncode |= subprocess.run(cmd).returncode
+
+    sys.exit(returncode)
@@ -0,0 +1,71 @@
+"""Overlapping windows: `group_by_dynamic` + `gini_expr` against `sliding_gini`.
+
+With `period` > `every`, `group_by_dynamic` aggregates every post `period / every`
+times, `sliding_gini` only adds and subtracts the counts of each post once. Run with:
+    python benchmarks/bench_sliding.py --n_posts 1000000 --every 1d --period 30d
+"""
+
+import time
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from corpus import CorpusParams, make_corpus
+from mango_blog.hashtags import (
+    COL_POST,
+    COL_TIME,
+    OUTPUT_COL_GINI,
+    explode_hashtags,
+    gini_expr,
+)
+from mango_blog.sliding import sliding_gini
+
+
+def gini_group_by_dynamic(df: pl.DataFrame, every: str, period: str) -> pl.DataFrame:
+    return (
+        explode_hashtags(df)
+        .group_by_dynamic(
+            pl.col(COL_TIME), every=every, period=period, start_by="datapoint"
+        )
+        .agg(gini_expr(COL_POST).alias(OUTPUT_COL_GINI))
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--n_posts", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--every", type=str, default="1d")
+    parser.add_argument("--period", type=str, default="7d")
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    # one string cache for the corpus and both engines (users are Categorical)
+    with pl.StringCache():
+        params = CorpusParams(posts_per_day=args.n_posts // args.days, days=args.days)
+        df = make_corpus(params).drop("hashtags")
+
+        engines = {
+            "group_by_dynamic": gini_group_by_dynamic,
+            "sliding_gini": sliding_gini,
+        }
+
+        results = {}
+        for name, fn in engines.items():
+            timings = []
+            for _ in range(args.repeats):
+                t0 = time.perf_counter()
+                results[name] = fn(df, every=args.every, period=args.period)
+                timings.append(time.perf_counter() - t0)
+            print(f"{name:>20}: best of {args.repeats} = {min(timings):.3f}s")
+
+    assert_frame_equal(
+        results["group_by_dynamic"].select(OUTPUT_COL_GINI),
+        results["sliding_gini"].select(OUTPUT_COL_GINI),
+        check_exact=True,
+    )
+    print(f"Identical results for {len(results['sliding_gini'])} windows")
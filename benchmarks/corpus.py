@@ -0,0 +1,123 @@
+"""Deterministic synthetic tweet corpus for the benchmarks.
+
+The corpus is generated one day at a time from a seed (no network access, the
+same parameters always give the same posts), so that large corpora can be
+written to disk chunk by chunk:
+    python benchmarks/corpus.py data/bench_corpus --posts_per_day 100000 --days 365
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_HASHTAGS,
+    COL_POST,
+    COL_TIME,
+    extract_hashtags,
+)
+
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit"
+
+
+@dataclass
+class CorpusParams:
+    n_users: int = 10_000
+    n_hashtags: int = 100_000
+    zipf_a: float = 1.5  # exponent of the hashtag popularity distribution
+    posts_per_day: int = 10_000
+    days: int = 100
+    max_hashtags: int = 3  # per post
+    seed: int = 0
+    start: datetime = datetime(2015, 1, 1)
+
+    @property
+    def n_posts(self) -> int:
+        return self.posts_per_day * self.days
+
+
+def make_day(params: CorpusParams, day: int) -> pl.DataFrame:
+    """
+    Posts of a single day, with the columns of `mango_blog.ingest.scan_dataset`
+    """
+    rng = np.random.default_rng([params.seed, day])
+    n = params.posts_per_day
+
+    n_tags = rng.integers(0, params.max_hashtags + 1, size=n)
+    tags = rng.zipf(a=params.zipf_a, size=(n, params.max_hashtags)) % params.n_hashtags
+
+    df = pl.DataFrame(
+        {
+            "user": rng.integers(0, params.n_users, size=n),
+            "seconds": np.sort(rng.integers(0, 24 * 3600, size=n)) + day * 24 * 3600,
+            "tags": tags,
+            "n_tags": n_tags,
+        }
+    ).with_columns(pl.col("tags").arr.to_list().list.head(pl.col("n_tags")))
+
+    return df.select(
+        pl.format("user{}", "user").cast(pl.Categorical).alias(COL_AUTHOR_ID),
+        (pl.lit(params.start) + pl.duration(seconds="seconds"))
+        .dt.replace_time_zone("UTC")
+        .alias(COL_TIME),
+        pl.concat_str(
+            pl.lit(FILLER),
+            pl.col("tags").list.eval(pl.format("#tag{}", pl.element())).list.join(" "),
+            pl.lit(FILLER),
+            separator=" ",
+        ).alias(COL_POST),
+    ).with_columns(extract_hashtags(COL_POST).alias(COL_HASHTAGS))
+
+
+@pl.StringCache()
+def make_corpus(params: CorpusParams) -> pl.DataFrame:
+    """
+    The whole corpus in memory, the days encoded with one string cache
+    """
+    return pl.concat([make_day(params, day) for day in range(params.days)])
+
+
+def write_corpus(params: CorpusParams, path: str | Path) -> Path:
+    """
+    Write the corpus as a folder of parquet files (one per day), readable with
+    `mango_blog.ingest.scan_dataset`
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    for day in range(params.days):
+        make_day(params, day).write_parquet(path / f"day-{day:05d}.parquet")
+
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("path", type=str, help="Folder to write the corpus to")
+    parser.add_argument("--n_users", type=int, default=CorpusParams.n_users)
+    parser.add_argument("--n_hashtags", type=int, default=CorpusParams.n_hashtags)
+    parser.add_argument("--zipf_a", type=float, default=CorpusParams.zipf_a)
+    parser.add_argument("--posts_per_day", type=int, default=CorpusParams.posts_per_day)
+    parser.add_argument("--days", type=int, default=CorpusParams.days)
+    parser.add_argument("--seed", type=int, default=CorpusParams.seed)
+
+    args = parser.parse_args()
+
+    params = CorpusParams(
+        n_users=args.n_users,
+        n_hashtags=args.n_hashtags,
+        zipf_a=args.zipf_a,
+        posts_per_day=args.posts_per_day,
+        days=args.days,
+        seed=args.seed,
+    )
+
+    print(f"Writing {params.n_posts} posts to {args.path}")
+    write_corpus(params, args.path)
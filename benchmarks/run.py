@@ -0,0 +1,151 @@
+"""Time the main steps of the hashtag pipeline at several corpus sizes.
+
+Each scale is written to disk once (see `corpus.py`) and scanned lazily, so the
+large scales do not have to fit in memory as raw strings. Results are stored as
+JSON to compare between releases:
+    python benchmarks/run.py --scales 10000 100000 1000000 --output results.json
+
+The corpora are written to the temporary folder, point TMPDIR to a large disk for
+the largest scales (100M posts take a few GB).
+"""
+
+import json
+import platform
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from corpus import CorpusParams, write_corpus
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_HASHTAGS,
+    COL_POST,
+    COL_TIME,
+    compact_primary_output,
+    explode_hashtags,
+    gini,
+    gini_expr,
+    hashtag_analysis,
+    make_table1,
+    secondary_analyzer,
+    secondary_analyzer_all,
+)
+from mango_blog.ingest import scan_dataset
+from mango_blog.lookup import PostLookup
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+DAYS = 100
+
+
+def best_of(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def run_scale(lf: pl.LazyFrame, repeats: int) -> dict[str, float]:
+    """
+    Time each pipeline step on the corpus `lf`, best of `repeats` in seconds
+    """
+    timings = {}
+
+    timings["hashtag_analysis"] = best_of(
+        lambda: hashtag_analysis(lf, every="1d", period="1d").collect(
+            engine="streaming"
+        ),
+        repeats,
+    )
+
+    hashtags = explode_hashtags(lf).collect(engine="streaming")[COL_POST]
+    timings["gini"] = best_of(lambda: gini(hashtags), repeats)
+    timings["gini_expr"] = best_of(
+        lambda: hashtags.to_frame().select(gini_expr(COL_POST)), repeats
+    )
+
+    df_out = hashtag_analysis(lf, every="1d", period="1d").collect(engine="streaming")
+    _, df_counts = compact_primary_output(df_out)
+    window_id = len(df_out) // 2
+    timings["secondary_analyzer"] = best_of(
+        lambda: secondary_analyzer(df_counts, window_id), repeats
+    )
+    timings["secondary_analyzer_all"] = best_of(
+        lambda: secondary_analyzer_all(df_counts), repeats
+    )
+
+    timings["make_table1"] = best_of(lambda: make_table1(lf), repeats)
+
+    # what the app's `load_raw_data_subset` does for a selected user and window
+    post_lookup = PostLookup(lf)
+    df_posts = lf.select(COL_AUTHOR_ID, COL_TIME).collect()
+    user, time_end = df_posts.row(len(df_posts) // 2)
+    timings["load_raw_data_subset"] = best_of(
+        lambda: post_lookup.lookup(user, time_end - timedelta(days=1), time_end),
+        repeats,
+    )
+
+    return timings
+
+
+def environment() -> dict:
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "platform": platform.platform(),
+        "n_threads": pl.thread_pool_size(),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--n_users", type=int, default=CorpusParams.n_users)
+    parser.add_argument("--zipf_a", type=float, default=CorpusParams.zipf_a)
+    parser.add_argument("--days", type=int, default=DAYS)
+    parser.add_argument("--seed", type=int, default=CorpusParams.seed)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=str, default="benchmark_results.json")
+
+    args = parser.parse_args()
+
+    results = []
+    for n_posts in args.scales:
+        params = CorpusParams(
+            n_users=args.n_users,
+            zipf_a=args.zipf_a,
+            posts_per_day=max(n_posts // args.days, 1),
+            days=args.days,
+            seed=args.seed,
+        )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            write_corpus(params, tmp)
+            lf = scan_dataset(tmp).select(
+                COL_AUTHOR_ID, COL_TIME, COL_POST, COL_HASHTAGS
+            )
+
+            timings = run_scale(lf, args.repeats)
+
+        for benchmark, seconds in timings.items():
+            print(f"{params.n_posts:>11} posts | {benchmark:>24}: {seconds:.4f}s")
+            results.append(
+                {"n_posts": params.n_posts, "benchmark": benchmark, "seconds": seconds}
+            )
+
+    output = {
+        "environment": environment(),
+        "params": vars(args),
+        "results": results,
+    }
+
+    print(f"Saving {args.output}")
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
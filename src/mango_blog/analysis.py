@@ -1,5 +1,5 @@
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import polars as pl
 from great_tables import GT, md
 import numpy as np
@@ -8,13 +8,28 @@ from matplotlib import pyplot as plt
 from .hashtags import (
     hashtag_analysis,
     secondary_analyzer,
+    secondary_analyzer_all,
+    compact_primary_output,
+    write_primary_output,
     make_table1,
     COL_AUTHOR_ID,
     COL_TIME,
     COL_POST,
+    COL_HASHTAGS,
     OUTPUT_COL_HASHTAGS,
     OUTPUT_COL_TIMESPAN,
+    OUTPUT_COL_WINDOW_ID,
+    PRIMARY_WINDOWS_FNAME,
+    PRIMARY_COUNTS_FNAME,
 )
+from .bursts import BURSTS_FNAME, BurstTracker, write_bursts
+from .cooccurrence import (
+    EDGES_FNAME,
+    DEGREES_FNAME,
+    cooccurrence_edges,
+    write_cooccurrence,
+)
+from .ingest import scan_dataset
 from .plots import plot_gini_annot, plot_bar, FS
 
 if __name__ == "__main__":
@@ -23,47 +38,68 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        "input_csv", type=str, help="Path to the russian trolls dataset"
+        "dataset_path",
+        type=str,
+        help="Path to the russian trolls dataset (as written by mango_blog.ingest)",
     )
     parser.add_argument("output_path", type=str, help="Folder to store the data to")
+    parser.add_argument(
+        "--ci",
+        type=float,
+        default=None,
+        help="Confidence level of the bootstrap interval of the gini (e.g. 0.95), "
+        "none if not given",
+    )
 
     args = parser.parse_args()
 
-    lf = pl.scan_csv(
-        source=args.input_csv,
-        skip_rows=3,  # we know this in advance
+    lf = scan_dataset(args.dataset_path).select(
+        pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST), pl.col(COL_HASHTAGS)
     )
 
-    df = (
-        lf.rename(
-            {
-                "Twitter screenname": COL_AUTHOR_ID,
-                "Date tweet sent": COL_TIME,
-                "Tweet text": COL_POST,
-            }
-        )
-        .select(pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST))
-        .with_columns(pl.col(COL_TIME).str.to_datetime("%m/%d/%Y %H:%M"))
-    ).collect()
-
+    # keep the corpus lazy so that it is streamed instead of loaded into memory
     df_out = hashtag_analysis(
-        data_frame=df,
+        data_frame=lf,
         every="6d",
         period="6d",
+        ci=args.ci,
+    ).collect(engine="streaming")
+
+    df_out = df_out.with_columns(
+        pl.col(OUTPUT_COL_TIMESPAN).str.to_datetime(time_zone="UTC")
     )
 
-    df_out = df_out.with_columns(pl.col(OUTPUT_COL_TIMESPAN).str.to_datetime())
+    df_windows, df_counts = compact_primary_output(df_out)
 
-    parquet_fn = "primary_output.parquet"
-    print(f"Saving {parquet_fn}")
-    df_out.write_parquet(Path(args.output_path, parquet_fn))
+    print(f"Saving {PRIMARY_WINDOWS_FNAME}, {PRIMARY_COUNTS_FNAME}")
+    write_primary_output(df_windows, df_counts, args.output_path)
 
     json_fn = "primary_output.json"
     print(f"Saving {json_fn}")
-    df_out.write_json(Path(args.output_path, json_fn))
+    df_windows.write_json(Path(args.output_path, json_fn))
+
+    # all time windows at once, so that the dashboard only has to read one window
+    # (small row groups, so that reading a window skips most of the file)
+    secondary_fn = "secondary_output.parquet"
+    print(f"Saving {secondary_fn}")
+    secondary_analyzer_all(df_counts).write_parquet(
+        Path(args.output_path, secondary_fn), row_group_size=10_000
+    )
+
+    # candidate windows for the dashboard date picker
+    print(f"Saving {BURSTS_FNAME}")
+    bursts = BurstTracker(period="6d")
+    bursts.update(df_windows, df_counts)
+    write_bursts(bursts, args.output_path)
+
+    # hashtags used together, so that the dashboard does not pair them per click
+    print(f"Saving {EDGES_FNAME}, {DEGREES_FNAME}")
+    write_cooccurrence(
+        cooccurrence_edges(lf, every="6d", period="6d"), args.output_path
+    )
 
     # select March 22
-    TIMEPOINT_STR = datetime(2016, 3, 22, 6, 59, 00)
+    TIMEPOINT_STR = datetime(2016, 3, 22, 6, 59, 00, tzinfo=timezone.utc)
 
     x_selected = df_out.with_columns(
         sel=pl.col(OUTPUT_COL_TIMESPAN) == TIMEPOINT_STR
@@ -84,7 +120,7 @@ if __name__ == "__main__":
 
     # ===== TABLE 1 ===== #
 
-    table1 = make_table1(russ_trol_df=df)
+    table1 = make_table1(russ_trol_df=lf)
 
     fn_table1_png = Path(args.output_path, "dataset_summary_table.png")
     fn_table1_pdf = Path(args.output_path, "dataset_summary_table.pdf")
@@ -101,14 +137,15 @@ if __name__ == "__main__":
     end_date = selected_date + timedelta(days=6)
     end_date_formatted = end_date.strftime("%d, %Y")
 
-    x = df_out.select(pl.col(OUTPUT_COL_TIMESPAN)).to_numpy()[idx].item()
-    df_out2 = secondary_analyzer(primary_output=df_out, timewindow=x)
+    # select the window by id, rows of `df_windows` are those of `df_out`
+    window_id = df_windows[OUTPUT_COL_WINDOW_ID][idx]
+    df_out2 = secondary_analyzer(primary_output=df_counts, timewindow=window_id)
 
     FREQ_THRESHOLD = 0.5
     df_out_filtered = df_out2.filter(pl.col("hashtag_perc") > FREQ_THRESHOLD)
 
     # Select users for selected hashtags
-    SELHASHTAG = "#IslamKills"
+    SELHASHTAG = "#islamkills"  # hashtags are lowercase (see `extract_hashtags`)
     USER_N_POSTS_THRESHOLD = 5
     users = (
         df_out_filtered.filter(
@@ -168,14 +205,14 @@ if __name__ == "__main__":
     # TWEETS TABLE
     SEL_USER = "lazykstafford"
     df_user = (
-        df.filter(
+        lf.filter(
             pl.col("user_id") == SEL_USER,
             pl.col("time").is_between(selected_date, end_date),
-            pl.col("text").str.contains(SELHASHTAG),
+            pl.col(COL_HASHTAGS).list.contains(SELHASHTAG),
         )
         .select(pl.col("time", "text"))
         .sort(by=pl.col("time"))
-    )
+    ).collect(engine="streaming")
 
     table_tweets = (
         GT(df_user.slice(10, 10))
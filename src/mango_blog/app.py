@@ -1,17 +1,51 @@
-from plots import plot_gini_plotly, plot_bar_plotly, plot_users_plotly, FS
-from hashtags import secondary_analyzer, COL_AUTHOR_ID, COL_TIME, COL_POST
+from plots import (
+    plot_gini_plotly,
+    plot_bar_plotly,
+    plot_users_plotly,
+    FS,
+    MAX_BARS,
+    BAR_HEIGHT,
+)
+from hashtags import (
+    secondary_analyzer,
+    compact_primary_output,
+    normalize_primary_output,
+    scan_primary_output,
+    COL_AUTHOR_ID,
+    COL_TIME,
+    PRIMARY_COUNTS_FNAME,
+    PRIMARY_WINDOWS_FNAME,
+)
+from bursts import BURSTS_FNAME, suggested_windows
+from ingest import scan_dataset
+from lookup import PostLookup
+from cache import ResultCache, fingerprint
+from constants import CACHE_PATH
 from matplotlib import pyplot as plt
 import polars as pl
 import numpy as np
+import asyncio
 from pathlib import Path
 
 from shiny import App, ui, render, reactive
+from shiny.types import SafeException
 from shinywidgets import render_widget, output_widget
 
 PROJECT_ROOT = Path(__file__).parents[2]
 DATA_FOLDER = Path(PROJECT_ROOT, "data")
-DATA_RAW = Path(DATA_FOLDER, "inputs", "confirmed_russia_troll_tweets.parquet")
-DATA = Path(DATA_FOLDER, "inputs", "primary_output.parquet")
+DATA_RAW = Path(DATA_FOLDER, "inputs", "confirmed_russia_troll_tweets")  # see ingest.py
+DATA = Path(DATA_FOLDER, "inputs", "primary_output.parquet")  # nested, pre-compact
+DATA_SECONDARY = Path(DATA_FOLDER, "inputs", "secondary_output.parquet")
+DATA_BURSTS = Path(DATA_FOLDER, "inputs", BURSTS_FNAME)
+
+# memory for the results shared by all sessions (secondary output, users, posts)
+CACHE_MAX_BYTES = 512 * 2**20
+
+# labels of the time windows in the date picker
+DATE_FORMAT = "%B %d, %Y"
+
+# height of the bar plots, a page of bars (see `plots.MAX_BARS`)
+BAR_PLOT_HEIGHT = f"{MAX_BARS * BAR_HEIGHT + 100}px"
 
 MANGO_ORANGE2 = "#f3921e"
 LOGO_URL = "https://raw.githubusercontent.com/CIB-Mango-Tree/CIB-Mango-Tree-Website/main/assets/images/mango-text.PNG"
@@ -22,44 +56,122 @@ question_circle_fill = ui.HTML(
 )
 
 
+# the Tweet Explorer reads the posts of the selected user and window on each click
+# (only those rows are read from the dataset, nothing is loaded at startup)
+post_lookup = PostLookup(scan_dataset(DATA_RAW))
+
+# one per process, all sessions share the results for popular windows (and, with
+# CACHE_PATH set, all workers of the app through the files in that folder, kept
+# apart for each version of the inputs)
+results = ResultCache(
+    max_bytes=CACHE_MAX_BYTES,
+    path=CACHE_PATH,
+    version=fingerprint(
+        DATA,
+        Path(DATA.parent, PRIMARY_WINDOWS_FNAME),
+        Path(DATA.parent, PRIMARY_COUNTS_FNAME),
+        DATA_SECONDARY,
+        DATA_RAW,
+    ),
+)
+
+
 def load_raw_data_subset(time_start, time_end, user_id, hashtag):
-    lf = pl.scan_parquet(source=DATA_RAW)
-
-    df_ = (
-        lf.rename(
-            {
-                "Twitter screenname": COL_AUTHOR_ID,
-                "Date tweet sent": COL_TIME,
-                "Tweet text": COL_POST,
-            }
-        )
-        .select(pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST))
-        .with_columns(pl.col(COL_TIME).str.to_datetime("%m/%d/%Y %H:%M"))
-        .with_columns(pl.col(COL_TIME).dt.replace_time_zone("UTC"))
-        .filter(
-            pl.col(COL_AUTHOR_ID) == user_id,
-            pl.col(COL_TIME).is_between(lower_bound=time_start, upper_bound=time_end),
-            pl.col(COL_POST).str.contains(hashtag),
-        )
-        .sort(by=COL_TIME)
-    ).collect()
+    if not DATA_RAW.exists():  # the rest of the dashboard only needs the outputs
+        raise SafeException(f"No posts to show, run ingest.py to write {DATA_RAW}")
 
-    return df_
+    return post_lookup.lookup(
+        user_id=user_id, time_start=time_start, time_end=time_end, hashtag=hashtag
+    )
 
 
 def load_primary_output():
-    df = pl.read_parquet(DATA)
+    """
+    Per-window table (one row per window) and the counts as a LazyFrame, the counts
+    of a window are only read when it is selected (see `get_secondary_output`)
+    """
+    if Path(DATA.parent, PRIMARY_WINDOWS_FNAME).exists():
+        df, lf_counts = scan_primary_output(DATA.parent)
+    else:  # the nested output has no window ids to filter on, compact it in memory
+        # (with hashtags as the Tweet Explorer looks them up, see `extract_hashtags`)
+        df, df_counts = compact_primary_output(
+            normalize_primary_output(pl.read_parquet(DATA))
+        )
+        lf_counts = df_counts.lazy()
 
     df = df.with_columns(pl.col("timewindow_start").dt.replace_time_zone("UTC"))
 
-    return df
+    return df, lf_counts
+
 
+def load_secondary_output():
+    if not DATA_SECONDARY.exists():  # all windows are then computed on demand
+        return None
 
-df = load_primary_output()
+    # sorted by window, a filter on `window_id` only reads the rows of that window
+    return pl.scan_parquet(DATA_SECONDARY)
+
+
+def load_bursts():
+    if not DATA_BURSTS.exists():  # written by analysis.py, not computed at startup
+        return None
+
+    return pl.read_parquet(DATA_BURSTS)
+
+
+def date_picker_choices(df, bursts):
+    """
+    Window start dates, the windows flagged by `detect_bursts` listed first (no
+    suggestions without the bursts written by analysis.py)
+    """
+    if bursts is None:
+        is_suggested = pl.lit(False)
+    else:
+        is_suggested = pl.col("window_id").is_in(suggested_windows(bursts).implode())
+
+    choices = {}
+    for label, selection in [
+        ("Suggested (bursts and change points)", is_suggested),
+        ("All time windows", ~is_suggested),
+    ]:
+        dates = (
+            df.filter(selection)["timewindow_start"].dt.strftime(DATE_FORMAT).to_list()
+        )
+        if dates:
+            choices[label] = {date: date for date in dates}
+
+    return choices
+
+
+df, lf_counts = load_primary_output()
+lf_secondary = load_secondary_output()
+df_bursts = load_bursts()
 
 # Calculate step size from the data
 time_step = df["timewindow_start"][1] - df["timewindow_start"][0]
 
+# date picker label -> row of `df`, and row -> window start and id, so that the
+# selected window is a dict lookup (the first window of a date if several share it)
+window_starts = df["timewindow_start"].to_list()
+window_ids = df["window_id"].to_list()
+window_index = {}
+for i, label in enumerate(df["timewindow_start"].dt.strftime(DATE_FORMAT)):
+    window_index.setdefault(label, i)
+
+
+def read_secondary_output(window_id):
+    """Read the window from the precomputed secondary output, compute it if missing"""
+    if lf_secondary is not None:
+        df_window = (
+            lf_secondary.filter(pl.col("window_id") == window_id)
+            .drop("window_id")
+            .collect()
+        )
+        if not df_window.is_empty():
+            return df_window
+
+    return secondary_analyzer(lf_counts, window_id).collect()
+
 
 def select_users(secondary_output, selected_hashtag):
     users_df = (
@@ -71,6 +183,32 @@ def select_users(secondary_output, selected_hashtag):
     return users_df
 
 
+def get_secondary_output(window_id):
+    return results.get(
+        ("secondary", window_id), lambda: read_secondary_output(window_id)
+    )
+
+
+def get_users(window_id, hashtag):
+    return results.get(
+        ("users", window_id, hashtag),
+        lambda: select_users(get_secondary_output(window_id), hashtag),
+    )
+
+
+def get_posts(window, hashtag, user_id):
+    """Posts of `user_id` with `hashtag` in the window in row `window` of `df`"""
+    return results.get(
+        ("posts", window_ids[window], hashtag, user_id),
+        lambda: load_raw_data_subset(
+            time_start=window_starts[window],
+            time_end=window_starts[window] + time_step,
+            user_id=user_id,
+            hashtag=hashtag,
+        ),
+    )
+
+
 def plot_bar(data_frame):
     fig3, ax3 = plt.subplots(figsize=(8, 6), layout="constrained")
 
@@ -168,11 +306,12 @@ hashtag_plot_panel = ui.card(
     ui.input_selectize(
         id="date_picker",
         label="Show hashtags for time period starting on:",
-        choices=[dt.strftime("%B %d, %Y") for dt in df["timewindow_start"].to_list()],
-        selected=df["timewindow_start"].first().strftime("%B %d, %Y"),
+        choices=date_picker_choices(df, df_bursts),
+        selected=next(iter(window_index)),
         width="100%",
     ),
-    output_widget("bar_plot", height="1500px"),
+    ui.input_numeric("hashtag_page", f"Page ({MAX_BARS} hashtags each):", 1, min=1),
+    output_widget("bar_plot", height=BAR_PLOT_HEIGHT),
     max_height="500px",
     full_screen=True,
 )
@@ -196,7 +335,8 @@ users_plot_panel = ui.card(
         choices=[],
         width="100%",
     ),
-    output_widget("user_plot", height="800px"),
+    ui.input_numeric("user_page", f"Page ({MAX_BARS} users each):", 1, min=1),
+    output_widget("user_plot", height=BAR_PLOT_HEIGHT),
     max_height="500px",
     full_screen=True,
 )
@@ -263,44 +403,66 @@ app_ui = ui.page_navbar(
 
 
 def server(input, output, session):
+    @reactive.calc
+    def selected_window():
+        """Row of `df` of the selected date, resolved once per selection"""
+        return window_index.get(input.date_picker(), 0)  # first window as fallback
+
     def get_selected_datetime():
-        """Convert selected formatted date back to datetime"""
-        selected_formatted = input.date_picker()
-        # Find the datetime that matches the formatted string
-        for dt in df["timewindow_start"].to_list():
-            if dt.strftime("%B %d, %Y") == selected_formatted:
-                return dt
-        return df["timewindow_start"].first()  # fallback
+        return window_starts[selected_window()]
 
-    @reactive.calc
-    def selected_date():
-        x_selected = df.with_columns(
-            sel=pl.col("timewindow_start") == input.date_picker()
-        ).select(pl.col("sel"))
+    # the slow steps run in a worker thread as extended tasks, so that the event
+    # loop keeps serving the other sessions; a new selection cancels the task of
+    # the previous one (its thread still finishes, and caches its result)
+    @reactive.extended_task
+    async def secondary_task(window_id):
+        return await asyncio.to_thread(get_secondary_output, window_id)
 
-        return np.where(x_selected)[0].item()
+    @reactive.extended_task
+    async def users_task(window_id, hashtag):
+        return await asyncio.to_thread(get_users, window_id, hashtag)
+
+    @reactive.extended_task
+    async def posts_task(window, hashtag, user_id):
+        return await asyncio.to_thread(get_posts, window, hashtag, user_id)
+
+    @reactive.effect
+    def start_secondary_analysis():
+        secondary_task.cancel()
+        secondary_task.invoke(window_ids[selected_window()])
+
+    @reactive.effect
+    def start_user_counts():
+        users_task.cancel()
+        users_task.invoke(window_ids[selected_window()], input.hashtag_picker())
+
+    @reactive.effect
+    def start_posts():
+        posts_task.cancel()
+        posts_task.invoke(
+            selected_window(), input.hashtag_picker(), input.user_picker()
+        )
 
     @reactive.calc
     def secondary_analysis():
-        timewindow = get_selected_datetime()
-        df_out2 = secondary_analyzer(df, timewindow)
-        return df_out2
+        return secondary_task.result()
 
     @reactive.effect
     def update_hashtag_choices():
         hashtags = secondary_analysis()["hashtags"].to_list()
+        # server=True: the browser only receives the options matching what is typed
         ui.update_selectize(
             "hashtag_picker",
             choices=hashtags,
             selected=hashtags[0] if hashtags else None,
+            server=True,
             session=session,
         )
+        ui.update_numeric("hashtag_page", value=1, session=session)
 
     @reactive.effect
     def update_user_choices():
-        df_users = select_users(
-            secondary_analysis(), selected_hashtag=input.hashtag_picker()
-        ).sort("count", descending=True)
+        df_users = users_task.result().sort("count", descending=True)
 
         users = df_users["users_all"].to_list()
 
@@ -308,8 +470,10 @@ def server(input, output, session):
             "user_picker",
             choices=users,
             selected=users[0] if users else None,
+            server=True,
             session=session,
         )
+        ui.update_numeric("user_page", value=1, session=session)
 
     @render_widget
     def line_plot():
@@ -324,14 +488,17 @@ def server(input, output, session):
             data_frame=secondary_analysis(),
             selected_date=selected_date,
             show_title=False,
+            page=input.hashtag_page(),
         )
 
     @render_widget
     def user_plot():
         selected_hashtag = input.hashtag_picker()
         if selected_hashtag:
-            users_data = select_users(secondary_analysis(), selected_hashtag)
-            return plot_users_plotly(users_data, selected_hashtag)
+            users_data = users_task.result()
+            return plot_users_plotly(
+                users_data, selected_hashtag, page=input.user_page()
+            )
         else:
             # Return empty plot if no hashtag selected
             import plotly.graph_objects as go
@@ -358,21 +525,13 @@ def server(input, output, session):
     def tweets_title():
         timewindow = get_selected_datetime()
         timewindow_end = timewindow + time_step
-        format_code = "%B %d, %Y"
-        dates_formatted = f"{timewindow.strftime(format_code)} - {timewindow_end.strftime(format_code)}"
+        dates_formatted = f"{timewindow.strftime(DATE_FORMAT)} - {timewindow_end.strftime(DATE_FORMAT)}"
 
         return "Showing posts in time window: " + dates_formatted
 
     @render.data_frame
     def tweets():
-        timewindow = get_selected_datetime()
-
-        df_posts = load_raw_data_subset(
-            time_start=timewindow,
-            time_end=timewindow + time_step,
-            user_id=input.user_picker(),
-            hashtag=input.hashtag_picker(),
-        )
+        df_posts = posts_task.result()
 
         # format strings
         df_posts = df_posts.with_columns(
@@ -32,23 +32,26 @@ def _():
 
     from mango_blog.constants import DATA_PATH
     from mango_blog.plots import plot_gini_annot
+    from mango_blog.ingest import scan_dataset
+    from mango_blog.cube import gini_cube, window_counts
     from mango_blog.hashtags import (
-        hashtag_analysis,
         secondary_analyzer,
         COL_AUTHOR_ID,
         COL_TIME,
         COL_POST,
+        COL_HASHTAGS,
         OUTPUT_COL_HASHTAGS,
     )
 
     return (
         COL_AUTHOR_ID,
+        COL_HASHTAGS,
         COL_POST,
         COL_TIME,
         DATA_PATH,
         GT,
         OUTPUT_COL_HASHTAGS,
-        hashtag_analysis,
+        gini_cube,
         md,
         mdates,
         mo,
@@ -56,8 +59,10 @@ def _():
         pl,
         plot_gini_annot,
         plt,
+        scan_dataset,
         secondary_analyzer,
         timedelta,
+        window_counts,
     )
 
 
@@ -94,8 +99,9 @@ def _(mo):
 @app.cell
 def _(mo):
     file_browser = mo.ui.file_browser(
-        label="Select .csv dataset to load",
+        label="Select dataset folder to load (written by mango_blog.ingest)",
         initial_path="../../data/inputs",
+        selection_mode="directory",
         multiple=False,
     )
     file_browser
@@ -103,28 +109,17 @@ def _(mo):
 
 
 @app.cell
-def _(file_browser, pl):
+def _(file_browser, scan_dataset):
     filename = file_browser.name(index=0)
     filepath = file_browser.path(index=0)
-    lf = pl.scan_csv(
-        source=filepath,
-        skip_rows=3,
-    )
+    lf = scan_dataset(filepath)
     return filename, lf
 
 
 @app.cell
-def _(COL_AUTHOR_ID, COL_POST, COL_TIME, lf, pl):
-    df = (
-        lf.rename(
-            {
-                "Twitter screenname": COL_AUTHOR_ID,
-                "Date tweet sent": COL_TIME,
-                "Tweet text": COL_POST,
-            }
-        )
-        .select(pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST))
-        .with_columns(pl.col(COL_TIME).str.to_datetime("%m/%d/%Y %H:%M"))
+def _(COL_AUTHOR_ID, COL_HASHTAGS, COL_POST, COL_TIME, lf, pl):
+    df = lf.select(
+        pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST), pl.col(COL_HASHTAGS)
     ).collect()
     return (df,)
 
@@ -215,13 +210,19 @@ def _(duration_selector, interval_selector, mo):
 
 
 @app.cell
-def _(df, duration_selector, hashtag_analysis, interval_selector, pl):
-    df_out = hashtag_analysis(
-        data_frame=df,
-        every=f"{interval_selector.value}d",
-        period=f"{duration_selector.value}d",
+def _(df, gini_cube):
+    # gini series for all interval/duration combinations of the selectors, computed
+    # once per dataset so that changing the selectors is only a lookup
+    df_cube = gini_cube(df, days=range(1, 21))
+    return (df_cube,)
+
+
+@app.cell
+def _(df_cube, duration_selector, interval_selector, pl):
+    df_out = df_cube.filter(
+        pl.col("every_days") == interval_selector.value,
+        pl.col("period_days") == duration_selector.value,
     )
-    df_out = df_out.with_columns(pl.col("timewindow_start").str.to_datetime())
     return (df_out,)
 
 
@@ -273,9 +274,18 @@ def _(mo):
 
 
 @app.cell
-def _(date_selector, df_out, pl, secondary_analyzer):
-    x = df_out.select(pl.col("timewindow_start")).to_numpy()
-    df_out2 = secondary_analyzer(df_out, x[date_selector.value])
+def _(
+    date_selector,
+    df,
+    df_out,
+    duration_selector,
+    secondary_analyzer,
+    window_counts,
+):
+    window_start = df_out["timewindow_start"][date_selector.value]
+    df_out2 = secondary_analyzer(
+        window_counts(df, window_start, duration_selector.value), 0
+    )
     return (df_out2,)
 
 
@@ -360,10 +370,10 @@ def _(user_selector):
 
 
 @app.cell
-def _(COL_AUTHOR_ID, COL_POST, df, hashtag_selector, pl, selected_user):
+def _(COL_AUTHOR_ID, COL_HASHTAGS, df, hashtag_selector, pl, selected_user):
     posts = df.filter(
         pl.col(COL_AUTHOR_ID) == selected_user,
-        pl.col(COL_POST).str.contains(hashtag_selector.value),
+        pl.col(COL_HASHTAGS).list.contains(hashtag_selector.value),
     ).sort(by="time")
     return (posts,)
 
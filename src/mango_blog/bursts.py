@@ -0,0 +1,593 @@
+import json
+from copy import deepcopy
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from mango_blog.hashtags import (
+    OUTPUT_COL_COUNT,
+    OUTPUT_COL_GINI,
+    OUTPUT_COL_HASHTAGS,
+    OUTPUT_COL_TIMESPAN,
+    OUTPUT_COL_WINDOW_ID,
+    parse_duration,
+)
+
+BURSTS_FNAME = "bursts.parquet"
+# state of the detectors, to continue them on the windows of incremental updates
+BURSTS_STATE_FNAME = "bursts_state.json"
+BURSTS_HASHTAG_STATE_FNAME = "bursts_state_hashtags.parquet"
+
+COL_KIND = "kind"
+COL_VALUE = "value"
+COL_Z = "z"
+COL_BURST = "burst"
+COL_CHANGE = "change_point"
+
+KIND_GINI = "gini"
+KIND_HASHTAG = "hashtag"
+
+
+class BurstDetector:
+    """
+    Streaming burst and change-point detector for a single time series
+
+    Each value is compared to an exponentially weighted mean and variance of the
+    values before it (z-score). Values are clipped to `clip` standard deviations
+    before they update the mean and variance, so that a burst does not become the
+    baseline it is compared to. A two-sided CUSUM of the z-scores flags sustained
+    shifts that single values do not, after which the baseline moves to the new
+    level. An update takes constant time and memory.
+
+    Parameters
+    ----------
+    alpha : float
+        weight of the newest value in the mean and variance
+    threshold : float
+        absolute z-score above which a value is a burst
+    drift : float
+        z-score the CUSUM tolerates per window without accumulating
+    cusum_threshold : float
+        CUSUM value above which a change point is flagged (the CUSUM then restarts)
+    clip : float
+        nr. of standard deviations values (and z-scores in the CUSUM) are clipped to
+    warmup : int
+        nr. of values before anything is flagged
+    """
+
+    def __init__(
+        self,
+        alpha=0.1,
+        threshold=3.0,
+        drift=0.5,
+        cusum_threshold=5.0,
+        clip=3.0,
+        warmup=10,
+    ):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.drift = drift
+        self.cusum_threshold = cusum_threshold
+        self.clip = clip
+        self.warmup = warmup
+
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum_hi = 0.0
+        self.cusum_lo = 0.0
+
+    def update(self, value: float) -> tuple[float, bool, bool]:
+        """
+        Add the next value of the series
+
+        Returns
+        -------
+        tuple[float, bool, bool]
+            z-score of the value (NaN during warm-up), whether it is a burst and
+            whether it is a change point
+        """
+        if self.n == 0:
+            self.n, self.mean = 1, value
+            return np.nan, False, False
+
+        sd = np.sqrt(self.var)
+        diff = value - self.mean
+
+        z, burst, change = np.nan, False, False
+        if self.n >= self.warmup and sd > 0:
+            z = diff / sd
+            burst = bool(abs(z) > self.threshold)
+
+            # a single burst alone does not make a change point
+            z_clipped = np.clip(z, -self.clip, self.clip)
+            self.cusum_hi = max(0.0, self.cusum_hi + z_clipped - self.drift)
+            self.cusum_lo = max(0.0, self.cusum_lo - z_clipped - self.drift)
+            change = bool(max(self.cusum_hi, self.cusum_lo) > self.cusum_threshold)
+
+        if change:  # the series moved to a new level, which becomes the baseline
+            self.cusum_hi = self.cusum_lo = 0.0
+            self.mean = value
+            diff = 0.0
+        elif self.n >= self.warmup:
+            diff = np.clip(diff, -self.clip * sd, self.clip * sd)
+
+        self.n += 1
+        self.mean += self.alpha * diff
+        self.var = (1 - self.alpha) * (self.var + self.alpha * diff**2)
+
+        return z, burst, change
+
+
+class HashtagBurstDetector:
+    """
+    Streaming burst detector for the count series of every hashtag
+
+    Same exponentially weighted mean and variance as `BurstDetector`, kept in arrays
+    with one entry per hashtag. A hashtag that is not used in a window has count 0
+    there: instead of updating all hashtags in every window, the zeros since a
+    hashtag was last used are applied in closed form when it is used again, so a
+    window is processed in time proportional to the hashtags used in it. The arrays
+    have room for more hashtags and double in size when full, so that adding the
+    hashtags first used in a window does not copy the others.
+
+    Only increases are flagged, for hashtags used at least `min_count` times. The
+    standard deviation is at least that of a Poisson count with the same mean, so
+    that a hashtag that appears for the first time with many uses is flagged.
+
+    Parameters
+    ----------
+    alpha : float
+        weight of the newest window in the mean and variance
+    threshold : float
+        z-score above which a count is a burst
+    min_count : int
+        counts below this are never a burst
+    warmup : int
+        nr. of windows before anything is flagged
+    """
+
+    def __init__(self, alpha=0.1, threshold=4.0, min_count=10, warmup=10):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_count = min_count
+        self.warmup = warmup
+
+        self.n_windows = 0
+        self.index = {}  # hashtag -> position in the arrays
+
+        # the first len(self.index) entries are in use
+        self._mean = np.zeros(1024)
+        self._var = np.zeros(1024)
+        self._last_window = np.zeros(1024, dtype=np.int64)
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._mean[: len(self.index)]
+
+    @property
+    def var(self) -> np.ndarray:
+        return self._var[: len(self.index)]
+
+    @property
+    def last_window(self) -> np.ndarray:
+        return self._last_window[: len(self.index)]
+
+    def _add(self, hashtags: list[str]) -> None:
+        # hashtags not seen before, they had count 0 in all windows so far
+        n_old = len(self.index)
+        n = n_old + len(hashtags)
+        if n > len(self._mean):
+            capacity = max(2 * len(self._mean), n)
+            for name in ("_mean", "_var", "_last_window"):
+                array = getattr(self, name)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:n_old] = array[:n_old]
+                setattr(self, name, grown)
+
+        self.index.update(zip(hashtags, range(n_old, n)))
+        self._mean[n_old:n] = 0.0
+        self._var[n_old:n] = 0.0
+        self._last_window[n_old:n] = self.n_windows - 1
+
+    def _positions(self, hashtags: list[str]) -> np.ndarray:
+        new = [hashtag for hashtag in hashtags if hashtag not in self.index]
+        if new:
+            self._add(new)
+
+        return np.array([self.index[hashtag] for hashtag in hashtags], dtype=np.int64)
+
+    def update(self, hashtags: list[str], counts: np.ndarray) -> np.ndarray:
+        """
+        Add the next window, `counts[i]` is the nr. of uses of `hashtags[i]` in it
+
+        Returns
+        -------
+        np.ndarray
+            z-score of each count (NaN during warm-up), in the order of `hashtags`
+        """
+        i = self._positions(hashtags)
+        counts = np.asarray(counts, dtype=np.float64)
+
+        # k windows with count 0: mean * d and d * (var + mean^2 * (1 - d)),
+        # with d = (1 - alpha)^k
+        decay = (1 - self.alpha) ** (self.n_windows - self.last_window[i] - 1)
+        mean = self.mean[i] * decay
+        var = decay * (self.var[i] + self.mean[i] ** 2 * (1 - decay))
+
+        # at least the sd of a Poisson count, a hashtag that was (nearly) never used
+        # before has no variance
+        sd = np.maximum(np.sqrt(var), np.sqrt(mean + 1))
+        z = (counts - mean) / sd
+        if self.n_windows < self.warmup:
+            z[:] = np.nan
+
+        diff = counts - mean
+        self.mean[i] = mean + self.alpha * diff
+        self.var[i] = (1 - self.alpha) * (var + self.alpha * diff**2)
+        self.last_window[i] = self.n_windows
+        self.n_windows += 1
+
+        return z
+
+    def bursts(self, z: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Whether the z-scores returned by `update` are bursts"""
+        return (np.nan_to_num(z) > self.threshold) & (
+            np.asarray(counts) >= self.min_count
+        )
+
+
+def gini_bursts(
+    windows: pl.DataFrame, detector: BurstDetector | None = None
+) -> pl.DataFrame:
+    """
+    Run a `BurstDetector` over the `gini` series of the per-window output
+
+    Parameters
+    ----------
+    windows : pl.DataFrame
+        per-window table (as from `compact_primary_output`), sorted by time
+    detector : BurstDetector | None
+        detector to continue (e.g. with the windows added by `update_primary_output`),
+        a new one if None
+
+    Returns
+    -------
+    pl.DataFrame
+        `window_id`, `timewindow_start`, `value` (the gini), `z`, `burst` and
+        `change_point` per window
+    """
+    detector = BurstDetector() if detector is None else detector
+
+    rows = [detector.update(gini) for gini in windows[OUTPUT_COL_GINI].to_list()]
+
+    return windows.select(
+        pl.col(OUTPUT_COL_WINDOW_ID),
+        pl.col(OUTPUT_COL_TIMESPAN),
+        pl.col(OUTPUT_COL_GINI).alias(COL_VALUE),
+    ).hstack(
+        pl.DataFrame(
+            rows,
+            schema={COL_Z: pl.Float64, COL_BURST: pl.Boolean, COL_CHANGE: pl.Boolean},
+            orient="row",
+        )
+    )
+
+
+def hashtag_bursts(
+    counts: pl.DataFrame, detector: HashtagBurstDetector | None = None
+) -> pl.DataFrame:
+    """
+    Run a `HashtagBurstDetector` over the per-window hashtag counts
+
+    Parameters
+    ----------
+    counts : pl.DataFrame
+        counts table (as from `compact_primary_output`), windows are processed in
+        the order of `window_id`
+    detector : HashtagBurstDetector | None
+        detector to continue, a new one if None
+
+    Returns
+    -------
+    pl.DataFrame
+        `window_id`, `hashtags`, `value` (the count) and `z` of the bursts
+    """
+    detector = HashtagBurstDetector() if detector is None else detector
+
+    per_window = (
+        counts.group_by(OUTPUT_COL_WINDOW_ID, OUTPUT_COL_HASHTAGS)
+        .agg(pl.col(OUTPUT_COL_COUNT).sum())
+        .group_by(OUTPUT_COL_WINDOW_ID)
+        .agg(pl.col(OUTPUT_COL_HASHTAGS), pl.col(OUTPUT_COL_COUNT))
+        .sort(OUTPUT_COL_WINDOW_ID)
+    )
+
+    bursts = []
+    for window_id, hashtags, window_counts in per_window.iter_rows():
+        window_counts = np.array(window_counts)
+        z = detector.update(hashtags, window_counts)
+        is_burst = detector.bursts(z, window_counts)
+
+        for j in np.flatnonzero(is_burst):
+            bursts.append((window_id, hashtags[j], int(window_counts[j]), z[j]))
+
+    return pl.DataFrame(
+        bursts,
+        schema={
+            OUTPUT_COL_WINDOW_ID: pl.UInt32,
+            OUTPUT_COL_HASHTAGS: pl.String,
+            COL_VALUE: pl.Float64,
+            COL_Z: pl.Float64,
+        },
+        orient="row",
+    )
+
+
+def detect_bursts(windows: pl.DataFrame, counts: pl.DataFrame) -> pl.DataFrame:
+    """
+    Flagged windows of the gini series and of the hashtag counts in one table
+
+    Returns
+    -------
+    pl.DataFrame
+        `window_id`, `timewindow_start`, `kind` ("gini" or "hashtag"), `hashtags`
+        (null for "gini"), `value` and `z`, sorted by time
+    """
+    return _detect(windows, counts, BurstDetector(), HashtagBurstDetector())
+
+
+def _detect(
+    windows: pl.DataFrame,
+    counts: pl.DataFrame,
+    gini_detector: BurstDetector,
+    hashtag_detector: HashtagBurstDetector,
+) -> pl.DataFrame:
+    # `detect_bursts` continuing the given detectors, on the counts of `windows` only
+    windows = windows.sort(OUTPUT_COL_TIMESPAN)
+    counts = counts.filter(
+        pl.col(OUTPUT_COL_WINDOW_ID).is_in(windows[OUTPUT_COL_WINDOW_ID].implode())
+    )
+
+    df_gini = (
+        gini_bursts(windows, gini_detector)
+        .filter(pl.col(COL_BURST) | pl.col(COL_CHANGE))
+        .select(
+            pl.col(OUTPUT_COL_WINDOW_ID),
+            pl.col(OUTPUT_COL_TIMESPAN),
+            pl.lit(KIND_GINI).alias(COL_KIND),
+            pl.lit(None, dtype=pl.String).alias(OUTPUT_COL_HASHTAGS),
+            pl.col(COL_VALUE),
+            pl.col(COL_Z),
+        )
+    )
+
+    df_hashtags = (
+        hashtag_bursts(counts, hashtag_detector)
+        .join(
+            windows.select(OUTPUT_COL_WINDOW_ID, OUTPUT_COL_TIMESPAN),
+            on=OUTPUT_COL_WINDOW_ID,
+        )
+        .select(
+            pl.col(OUTPUT_COL_WINDOW_ID),
+            pl.col(OUTPUT_COL_TIMESPAN),
+            pl.lit(KIND_HASHTAG).alias(COL_KIND),
+            pl.col(OUTPUT_COL_HASHTAGS),
+            pl.col(COL_VALUE),
+            pl.col(COL_Z),
+        )
+    )
+
+    return pl.concat([df_gini, df_hashtags]).sort(
+        OUTPUT_COL_TIMESPAN, COL_KIND, OUTPUT_COL_HASHTAGS
+    )
+
+
+class BurstTracker:
+    """
+    Bursts of a primary output that grows with `update_primary_output`, with the
+    detectors to continue from
+
+    The detectors process each window once, in time order, when it is final. New
+    posts are appended after the previous ones, so only the windows that end after
+    the start of the last window can still change (the last one, and those that
+    overlap it when `period` > `every`). These are flagged with a copy of the
+    detectors, and again at the next update. The flags are the same as those of
+    `detect_bursts` on the whole output, and an update only processes the new
+    windows and those that were not final before.
+
+    If new posts change a window that was already processed (posts older than the
+    last ones), the detectors are run again over all windows.
+
+    Parameters
+    ----------
+    period : str
+        length of the time windows, as for `hashtag_analysis`
+    gini_detector : BurstDetector | None
+        detector of the gini series, one with the default parameters if None
+    hashtag_detector : HashtagBurstDetector | None
+        detector of the hashtag counts, one with the default parameters if None
+    """
+
+    def __init__(
+        self,
+        period: str,
+        gini_detector: BurstDetector | None = None,
+        hashtag_detector: HashtagBurstDetector | None = None,
+    ):
+        self.period = period
+        self.gini_detector = gini_detector or BurstDetector()
+        self.hashtag_detector = hashtag_detector or HashtagBurstDetector()
+        self.last_final = None  # `timewindow_start` of the last processed window
+        self.bursts = None  # output of `detect_bursts` for all windows
+
+        # to start over if an already processed window changes
+        self._initial = deepcopy((self.gini_detector, self.hashtag_detector))
+
+    def update(
+        self,
+        windows: pl.DataFrame,
+        counts: pl.DataFrame,
+        first_changed: datetime | None = None,
+    ) -> pl.DataFrame:
+        """
+        Flag the windows that were not final at the last update
+
+        Parameters
+        ----------
+        windows : pl.DataFrame
+            per-window table (as from `compact_primary_output`) with all windows
+        counts : pl.DataFrame
+            counts table of the same output
+        first_changed : datetime | None
+            start of the first window whose posts changed since the last update
+            (e.g. the first window touched by `update_primary_output`)
+
+        Returns
+        -------
+        pl.DataFrame
+            `bursts`, the output of `detect_bursts` for all windows
+        """
+        if (
+            first_changed is not None
+            and self.last_final is not None
+            and first_changed <= self.last_final
+        ):
+            self.gini_detector, self.hashtag_detector = deepcopy(self._initial)
+            self.last_final, self.bursts = None, None
+
+        last_start = windows[OUTPUT_COL_TIMESPAN].max()
+        if self.last_final is not None:
+            windows = windows.filter(pl.col(OUTPUT_COL_TIMESPAN) > self.last_final)
+
+        is_final = (
+            pl.col(OUTPUT_COL_TIMESPAN) + parse_duration(self.period) <= last_start
+        )
+        df_final = windows.filter(is_final)
+        df_open = windows.filter(~is_final)
+
+        bursts_final = _detect(
+            df_final, counts, self.gini_detector, self.hashtag_detector
+        )
+        bursts_open = _detect(
+            df_open,
+            counts,
+            deepcopy(self.gini_detector),
+            deepcopy(self.hashtag_detector),
+        )
+
+        previous = []
+        if self.bursts is not None and self.last_final is not None:
+            previous = [
+                self.bursts.filter(pl.col(OUTPUT_COL_TIMESPAN) <= self.last_final)
+            ]
+        if not df_final.is_empty():
+            self.last_final = df_final[OUTPUT_COL_TIMESPAN].max()
+
+        # each part is sorted, and later than the one before
+        self.bursts = pl.concat([*previous, bursts_final, bursts_open])
+
+        return self.bursts
+
+
+def write_bursts(tracker: BurstTracker, output_path: str | Path) -> None:
+    """
+    Write the bursts of `tracker` to `BURSTS_FNAME` (read by the dashboard) and the
+    state of its detectors next to it
+    """
+    tracker.bursts.write_parquet(Path(output_path, BURSTS_FNAME))
+
+    hashtag_detector = tracker.hashtag_detector
+    pl.DataFrame(
+        {
+            OUTPUT_COL_HASHTAGS: list(hashtag_detector.index),
+            "mean": hashtag_detector.mean,
+            "var": hashtag_detector.var,
+            "last_window": hashtag_detector.last_window,
+        },
+        schema_overrides={OUTPUT_COL_HASHTAGS: pl.String},
+    ).write_parquet(Path(output_path, BURSTS_HASHTAG_STATE_FNAME))
+
+    def hashtag_params(detector: HashtagBurstDetector) -> dict:
+        # the arrays are in the parquet file
+        names = ("alpha", "threshold", "min_count", "warmup", "n_windows")
+        return {name: getattr(detector, name) for name in names}
+
+    gini_initial, hashtag_initial = tracker._initial
+    state = {
+        "period": tracker.period,
+        "last_final": None
+        if tracker.last_final is None
+        else tracker.last_final.isoformat(),
+        "gini_detector": vars(tracker.gini_detector),
+        "hashtag_detector": hashtag_params(hashtag_detector),
+        "initial": [vars(gini_initial), hashtag_params(hashtag_initial)],
+    }
+    with open(Path(output_path, BURSTS_STATE_FNAME), "w") as f:
+        json.dump(state, f, default=float)
+
+
+def read_bursts(output_path: str | Path) -> BurstTracker:
+    """Read the `BurstTracker` written by `write_bursts`"""
+    with open(Path(output_path, BURSTS_STATE_FNAME)) as f:
+        state = json.load(f)
+
+    def gini_detector(values: dict) -> BurstDetector:
+        detector = BurstDetector()
+        vars(detector).update(values)
+        return detector
+
+    def hashtag_detector(values: dict) -> HashtagBurstDetector:
+        n_windows = values.pop("n_windows", 0)
+        detector = HashtagBurstDetector(**values)
+        detector.n_windows = n_windows
+        return detector
+
+    tracker = BurstTracker(
+        state["period"],
+        gini_detector(state["gini_detector"]),
+        hashtag_detector(state["hashtag_detector"]),
+    )
+    gini_initial, hashtag_initial = state["initial"]
+    tracker._initial = (
+        gini_detector(gini_initial),
+        hashtag_detector(hashtag_initial),
+    )
+
+    df_state = pl.read_parquet(Path(output_path, BURSTS_HASHTAG_STATE_FNAME))
+    detector = tracker.hashtag_detector
+    detector._add(df_state[OUTPUT_COL_HASHTAGS].to_list())
+    detector.mean[:] = df_state["mean"].to_numpy()
+    detector.var[:] = df_state["var"].to_numpy()
+    detector.last_window[:] = df_state["last_window"].to_numpy()
+
+    if state["last_final"] is not None:
+        tracker.last_final = datetime.fromisoformat(state["last_final"])
+    tracker.bursts = pl.read_parquet(Path(output_path, BURSTS_FNAME))
+
+    return tracker
+
+
+def suggested_windows(bursts: pl.DataFrame, n_windows=10) -> pl.Series:
+    """
+    `window_id`s of the windows flagged in the output of `detect_bursts`
+
+    All windows flagged in the gini series, and the `n_windows` with the most uses
+    of bursting hashtags (hashtag bursts are common in a large corpus).
+    """
+    is_gini = pl.col(COL_KIND) == KIND_GINI
+
+    return (
+        bursts.group_by(OUTPUT_COL_WINDOW_ID)
+        .agg(
+            is_gini.any().alias(KIND_GINI),
+            pl.col(COL_VALUE).filter(~is_gini).sum().alias(KIND_HASHTAG),
+        )
+        .filter(
+            pl.col(KIND_GINI)
+            | (pl.col(KIND_HASHTAG).rank("ordinal", descending=True) <= n_windows)
+        )[OUTPUT_COL_WINDOW_ID]
+        .sort()
+    )
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import polars as pl
+
+
+def fingerprint(*paths: str | Path) -> str:
+    """
+    Short hash of the names, sizes and modification times of the files at `paths`
+    (files in folders included, missing paths skipped), it changes when any of the
+    files is written again
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.is_file()))
+        elif path.exists():
+            files.append(path)
+
+    stats = [(str(fn), fn.stat().st_size, fn.stat().st_mtime_ns) for fn in files]
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Least recently used cache of data frames, shared by all callers in a process
+
+    The cache is bounded by the estimated size of the frames it holds, the least
+    recently used frames are evicted first. With `path`, computed frames are also
+    written to parquet files in that folder, so that other processes (e.g. the
+    workers of the dashboard) read them instead of computing them again. Files are
+    written to a temporary name and renamed, so readers never see a partial file.
+
+    The files are kept in a subfolder named after `version` (e.g. the `fingerprint`
+    of the inputs the frames are computed from), so that results of older inputs
+    are not read after the inputs are replaced. The folder is bounded by
+    `max_bytes` as well, the least recently used files (of any version) are
+    deleted first.
+
+    Parameters
+    ----------
+    max_bytes : int
+        largest total estimated size of the frames kept in memory, and largest
+        total size of the files in `path`
+    path : str | Path | None
+        folder of the on-disk store, none if None
+    version : str
+        subfolder of `path` the files are read from and written to
+    """
+
+    def __init__(
+        self,
+        max_bytes=256 * 2**20,
+        path: str | Path | None = None,
+        version: str = "",
+    ):
+        self.max_bytes = max_bytes
+        self.path = None if path is None else Path(path)
+        self.folder = None if path is None else Path(path, version)
+        if self.folder is not None:
+            self.folder.mkdir(parents=True, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._entries = OrderedDict()  # key -> (frame, size), oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _file(self, key: tuple) -> Path:
+        return Path(
+            self.folder, hashlib.sha1(repr(key).encode()).hexdigest() + ".parquet"
+        )
+
+    def _read(self, key: tuple) -> pl.DataFrame | None:
+        fn = self._file(key)
+        try:
+            frame = pl.read_parquet(fn)
+            os.utime(fn)  # recently used, deleted last by `_prune`
+        except FileNotFoundError:  # not written yet, or deleted by another worker
+            return None
+
+        return frame
+
+    def _prune(self) -> None:
+        # files of all versions, least recently used first (other workers write and
+        # delete files concurrently)
+        files = []
+        for fn in self.path.rglob("*.parquet"):
+            try:
+                stat = fn.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, fn))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, fn in files:
+            if total <= self.max_bytes:
+                break
+            fn.unlink(missing_ok=True)
+            total -= size
+
+    def _insert(self, key: tuple, frame: pl.DataFrame) -> None:
+        size = frame.estimated_size()
+        if size > self.max_bytes:  # would evict everything else
+            return
+
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+
+        self._entries[key] = (frame, size)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def get(self, key: tuple, compute) -> pl.DataFrame:
+        """
+        Frame stored under `key`, `compute()` is called (and its result stored) if
+        neither the memory nor the disk store has it
+
+        `key` is a tuple of plain values (e.g. `(window_id, hashtag, user)`), its
+        `repr` names the file in the on-disk store.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        frame = None
+        if self.path is not None:
+            frame = self._read(key)
+            if frame is not None:
+                with self._lock:
+                    self.disk_hits += 1
+
+        if frame is None:
+            # computed outside the lock, concurrent misses of the same key both
+            # compute it (the results are the same)
+            frame = compute()
+            with self._lock:
+                self.misses += 1
+
+            if self.path is not None:
+                fn = self._file(key)
+                tmp = fn.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                frame.write_parquet(tmp)
+                os.replace(tmp, fn)
+                self._prune()
+
+        with self._lock:
+            self._insert(key, frame)
+
+        return frame
+
+    def clear(self) -> None:
+        """Empty the memory store (the on-disk store is kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Nr. of hits, misses, reads from the disk store, entries and their bytes"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -22,3 +22,6 @@ load_dotenv()
 DATA_PATH = os.getenv("DATA_PATH")
 OUTPUT_PATH = Path(DATA_PATH, "outputs")
 DATASET_FNAME = "confirmed_russia_troll_tweets.csv"
+
+# optional folder where the dashboard workers share cached results (see cache.py)
+CACHE_PATH = os.getenv("CACHE_PATH")
@@ -0,0 +1,211 @@
+from pathlib import Path
+
+import polars as pl
+
+from mango_blog.hashtags import (
+    COL_POST,
+    COL_POST_ID,
+    COL_TIME,
+    OUTPUT_COL_HASHTAGS,
+    OUTPUT_COL_TIMESPAN,
+    _explode_windows,
+    check_hashtags,
+    explode_hashtags,
+)
+
+EDGES_FNAME = "cooccurrence_edges.parquet"
+DEGREES_FNAME = "cooccurrence_degrees.parquet"
+
+COL_HASHTAG_A = "hashtag_a"
+COL_HASHTAG_B = "hashtag_b"
+COL_WEIGHT = "weight"
+COL_DEGREE = "degree"
+COL_WEIGHTED_DEGREE = "weighted_degree"
+
+
+@pl.StringCache()
+def cooccurrence_edges(
+    data_frame: pl.DataFrame | pl.LazyFrame,
+    every="1d",
+    period="1d",
+    min_weight=1,
+) -> pl.DataFrame:
+    """
+    Pairs of hashtags used in the same posts, per time window
+
+    Each post gets an id before its hashtags are exploded, the pairs of a post are
+    then a self-join of its hashtags on that id (a post with k distinct hashtags
+    has k * (k - 1) / 2 pairs). The weight of a pair is the nr. of posts in the
+    window that use both hashtags.
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        input data as for `hashtag_analysis`
+    every : str
+        interval of the time windows, as for `hashtag_analysis`
+    period : str
+        length of the time windows, as for `hashtag_analysis`
+    min_weight : int
+        pairs used together in fewer posts of a window are left out
+
+    Returns
+    -------
+    pl.DataFrame
+        `timewindow_start` (as in the output of `hashtag_analysis`), `hashtag_a`,
+        `hashtag_b` (`hashtag_a` < `hashtag_b`) and `weight`, sorted by time window
+        and weight
+    """
+    check_hashtags(data_frame)
+    df_exploded = (
+        explode_hashtags(
+            data_frame.lazy().with_row_index(COL_POST_ID), keep=(COL_POST_ID,)
+        )
+        .unique([COL_POST_ID, COL_POST], maintain_order=True)
+        .collect()
+    )
+
+    # windows start at the first post, as with start_by="datapoint"
+    origin = df_exploded[COL_TIME].min()
+
+    # posts with a single hashtag have no pairs
+    df_exploded = df_exploded.filter(pl.len().over(COL_POST_ID) >= 2).select(
+        pl.col(COL_POST_ID), pl.col(COL_TIME), pl.col(COL_POST)
+    )
+
+    # each pair once, in the order of the categorical encoding
+    df_pairs = (
+        df_exploded.select(pl.col(COL_POST_ID), pl.col(COL_POST).alias(COL_HASHTAG_A))
+        .join(
+            df_exploded.select(
+                pl.col(COL_POST_ID), pl.col(COL_POST).alias(COL_HASHTAG_B)
+            ),
+            on=COL_POST_ID,
+        )
+        .filter(
+            pl.col(COL_HASHTAG_A).to_physical() < pl.col(COL_HASHTAG_B).to_physical()
+        )
+    )
+
+    df_post_windows = _explode_windows(
+        df_exploded.unique(COL_POST_ID).select(pl.col(COL_POST_ID), pl.col(COL_TIME)),
+        origin,
+        every,
+        period,
+    ).drop(COL_TIME)
+
+    hashtag_a = pl.col(COL_HASHTAG_A).cast(pl.String)
+    hashtag_b = pl.col(COL_HASHTAG_B).cast(pl.String)
+
+    return (
+        df_pairs.join(df_post_windows, on=COL_POST_ID)
+        .group_by(OUTPUT_COL_TIMESPAN, COL_HASHTAG_A, COL_HASHTAG_B)
+        .agg(pl.len().alias(COL_WEIGHT))
+        .filter(pl.col(COL_WEIGHT) >= min_weight)
+        .select(
+            pl.col(OUTPUT_COL_TIMESPAN),
+            pl.min_horizontal(hashtag_a, hashtag_b).alias(COL_HASHTAG_A),
+            pl.max_horizontal(hashtag_a, hashtag_b).alias(COL_HASHTAG_B),
+            pl.col(COL_WEIGHT),
+        )
+        .sort(
+            [OUTPUT_COL_TIMESPAN, COL_WEIGHT, COL_HASHTAG_A, COL_HASHTAG_B],
+            descending=[False, True, False, False],
+        )
+        .with_columns(pl.col(OUTPUT_COL_TIMESPAN).dt.to_string("%Y-%m-%d %H:%M:%S"))
+    )
+
+
+def degree_stats(edges: pl.DataFrame) -> pl.DataFrame:
+    """
+    Degree (nr. of other hashtags used together with) and weighted degree (sum of
+    the edge weights) of each hashtag, per time window
+
+    Parameters
+    ----------
+    edges : pl.DataFrame
+        output of `cooccurrence_edges`
+
+    Returns
+    -------
+    pl.DataFrame
+        `timewindow_start`, `hashtags`, `degree` and `weighted_degree`, sorted by
+        time window and weighted degree
+    """
+    return (
+        pl.concat(
+            [
+                edges.select(
+                    pl.col(OUTPUT_COL_TIMESPAN),
+                    pl.col(column).alias(OUTPUT_COL_HASHTAGS),
+                    pl.col(COL_WEIGHT),
+                )
+                for column in (COL_HASHTAG_A, COL_HASHTAG_B)
+            ]
+        )
+        .group_by(OUTPUT_COL_TIMESPAN, OUTPUT_COL_HASHTAGS)
+        .agg(
+            pl.len().alias(COL_DEGREE),
+            pl.col(COL_WEIGHT).sum().alias(COL_WEIGHTED_DEGREE),
+        )
+        .sort(
+            [OUTPUT_COL_TIMESPAN, COL_WEIGHTED_DEGREE, OUTPUT_COL_HASHTAGS],
+            descending=[False, True, False],
+        )
+    )
+
+
+def write_cooccurrence(edges: pl.DataFrame, output_path: str | Path) -> None:
+    """Write the edges and their degree statistics (`degree_stats`) to `output_path`"""
+    edges.write_parquet(Path(output_path, EDGES_FNAME))
+    degree_stats(edges).write_parquet(Path(output_path, DEGREES_FNAME))
+
+
+def read_cooccurrence(
+    output_path: str | Path, timewindow: str | None = None
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Read the edges and degree statistics written by `write_cooccurrence`
+
+    With `timewindow` (a `timewindow_start` string), only that window is read, the
+    filter is applied while scanning the files (row groups of other windows are
+    skipped), so that a dashboard can look up a window without loading all of them.
+    """
+    frames = []
+    for fname in (EDGES_FNAME, DEGREES_FNAME):
+        lf = pl.scan_parquet(Path(output_path, fname))
+        if timewindow is not None:
+            lf = lf.filter(pl.col(OUTPUT_COL_TIMESPAN) == timewindow)
+        frames.append(lf.collect())
+
+    return frames[0], frames[1]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from mango_blog.ingest import scan_dataset
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "dataset_path",
+        type=str,
+        help="Path to the russian trolls dataset (as written by mango_blog.ingest)",
+    )
+    parser.add_argument("output_path", type=str, help="Folder to store the data to")
+    parser.add_argument("--every", type=str, default="6d")
+    parser.add_argument("--period", type=str, default="6d")
+    parser.add_argument("--min_weight", type=int, default=1)
+
+    args = parser.parse_args()
+
+    df_edges = cooccurrence_edges(
+        scan_dataset(args.dataset_path),
+        every=args.every,
+        period=args.period,
+        min_weight=args.min_weight,
+    )
+
+    print(f"Saving {EDGES_FNAME}, {DEGREES_FNAME}")
+    write_cooccurrence(df_edges, args.output_path)
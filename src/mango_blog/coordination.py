@@ -0,0 +1,515 @@
+import numpy as np
+import polars as pl
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_POST,
+    COL_TIME,
+    OUTPUT_COL_COUNT,
+    OUTPUT_COL_HASHTAGS,
+    OUTPUT_COL_TIMESPAN,
+    OUTPUT_COL_USERS,
+    OUTPUT_COL_WINDOW_ID,
+    _explode_windows,
+    check_hashtags,
+    explode_hashtags,
+)
+
+COL_CLUSTER = "cluster"
+COL_N_USERS = "n_users"
+COL_SIMILARITY = "similarity"
+
+COL_USER_A = "user_a"
+COL_USER_B = "user_b"
+COL_N_EVENTS = "n_events"
+COL_LAG = "median_lag_s"
+COL_RANK = "rank"
+
+
+def user_hashtag_matrix(
+    counts: pl.DataFrame, window_id: int
+) -> tuple[sparse.csr_array, pl.Series, pl.Series]:
+    """
+    Sparse users x hashtags matrix of the counts in a single time window
+
+    Parameters
+    ----------
+    counts : pl.DataFrame
+        counts table of `compact_primary_output`
+    window_id : int
+        time window
+
+    Returns
+    -------
+    tuple[sparse.csr_array, pl.Series, pl.Series]
+        matrix with the nr. of times each user posted each hashtag, the users (rows)
+        and the hashtags (columns)
+    """
+    df_window = counts.filter(pl.col(OUTPUT_COL_WINDOW_ID) == window_id)
+
+    users = df_window[OUTPUT_COL_USERS].unique(maintain_order=True)
+    hashtags = df_window[OUTPUT_COL_HASHTAGS].unique(maintain_order=True)
+
+    # row and column of each count, in the order of `users` and `hashtags`
+    df_index = df_window.join(
+        users.to_frame().with_row_index("row"), on=OUTPUT_COL_USERS
+    ).join(hashtags.to_frame().with_row_index("col"), on=OUTPUT_COL_HASHTAGS)
+
+    matrix = sparse.csr_array(
+        (
+            df_index[OUTPUT_COL_COUNT].to_numpy().astype(np.float64),
+            (df_index["row"].to_numpy(), df_index["col"].to_numpy()),
+        ),
+        shape=(len(users), len(hashtags)),
+    )
+
+    return matrix, users, hashtags
+
+
+def _normalize_rows(matrix: sparse.csr_array) -> sparse.csr_array:
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1))
+    return sparse.diags_array(1 / np.where(norms > 0, norms, 1)) @ matrix
+
+
+def _top_k(
+    block: sparse.csr_array, offset: int, k: int, min_similarity: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # the k largest entries of each row of a block starting at row `offset`, other
+    # than the row itself, that are at least `min_similarity`
+    block = block.tocoo()
+    rows, cols, data = block.row + offset, block.col, block.data
+
+    keep = (data >= min_similarity) & (rows != cols)
+    rows, cols, data = rows[keep], cols[keep], data[keep]
+
+    order = np.lexsort((-data, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+
+    # position of each entry within its row
+    row_starts = np.searchsorted(rows, rows, side="left")
+    keep = np.arange(len(rows)) - row_starts < k
+
+    return rows[keep], cols[keep], data[keep]
+
+
+def cosine_similarity_top_k(
+    matrix: sparse.csr_array,
+    k=10,
+    min_similarity=0.5,
+    max_nnz=2**24,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Largest cosine similarities of each row to the other rows of a sparse matrix
+
+    The rows are normalized and multiplied with the transposed matrix in blocks of
+    rows, the product is never dense. The size of each block is chosen so that its
+    product has at most about `max_nnz` nonzero entries, and only the `k` largest
+    similarities of each row are kept from it.
+
+    Parameters
+    ----------
+    matrix : sparse.csr_array
+        one row per user (e.g. from `user_hashtag_matrix`)
+    k : int
+        nr. of most similar rows to keep per row
+    min_similarity : float
+        smaller similarities are dropped
+    max_nnz : int
+        bound on the nr. of nonzero entries of a block product (memory use)
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        row, most similar other row and their similarity
+    """
+    normalized = _normalize_rows(sparse.csr_array(matrix))
+    transposed = normalized.T.tocsr()
+
+    # upper bound on the nonzero entries in each row of the product: the sum of the
+    # nr. of rows that use each of its columns
+    column_nnz = np.diff(normalized.tocsc().indptr)
+    row_nnz = (normalized != 0).astype(np.int64) @ column_nnz
+
+    cum_nnz = np.concatenate([[0], np.cumsum(row_nnz)])
+
+    rows, cols, data = [], [], []
+    start = 0
+    while start < normalized.shape[0]:
+        end = np.searchsorted(cum_nnz, cum_nnz[start] + max_nnz, side="right") - 1
+        end = max(end, start + 1)
+
+        block_rows, block_cols, block_data = _top_k(
+            normalized[start:end] @ transposed, start, k, min_similarity
+        )
+        rows.append(block_rows)
+        cols.append(block_cols)
+        data.append(block_data)
+        start = end
+
+    if not rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0)
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(data)
+
+
+def coordinated_clusters(
+    counts: pl.DataFrame,
+    window_id: int,
+    k=10,
+    min_similarity=0.8,
+    min_hashtags=2,
+    min_cluster_size=3,
+    max_hashtag_users=1000,
+    max_nnz=2**24,
+) -> pl.DataFrame:
+    """
+    Groups of users that post the same sets of hashtags in a time window
+
+    Users are connected to their `k` most similar users (cosine similarity of their
+    hashtag counts) if the similarity is at least `min_similarity`, the clusters
+    are the connected components of that graph.
+
+    Parameters
+    ----------
+    counts : pl.DataFrame
+        counts table of `compact_primary_output`
+    window_id : int
+        time window
+    k : int
+        nr. of most similar users each user is connected to
+    min_similarity : float
+        smallest cosine similarity of connected users
+    min_hashtags : int
+        users with fewer distinct hashtags in the window are left out (all users
+        of a single hashtag are trivially similar)
+    min_cluster_size : int
+        smaller clusters are left out
+    max_hashtag_users : int | None
+        hashtags used by more users are left out of the similarity (they connect
+        too many users to tell groups apart, and the cost of the products grows
+        with the square of their nr. of users)
+    max_nnz : int
+        see `cosine_similarity_top_k`
+
+    Returns
+    -------
+    pl.DataFrame
+        `cluster`, `n_users`, `users`, `hashtags` (used by at least half of the
+        users in the cluster) and mean `similarity` of the connections, sorted by
+        `n_users`
+    """
+    matrix, users, _ = user_hashtag_matrix(counts, window_id)
+
+    if max_hashtag_users is not None:
+        n_users = np.diff(matrix.tocsc().indptr)
+        matrix = matrix[:, n_users <= max_hashtag_users]
+
+    is_active = np.diff(matrix.indptr) >= min_hashtags
+    matrix, users = matrix[is_active], users.filter(is_active)
+
+    rows, cols, similarity = cosine_similarity_top_k(
+        matrix, k=k, min_similarity=min_similarity, max_nnz=max_nnz
+    )
+
+    graph = sparse.coo_array((similarity, (rows, cols)), shape=(len(users),) * 2)
+    _, labels = connected_components(graph, directed=False)
+
+    df_users = pl.DataFrame({OUTPUT_COL_USERS: users, COL_CLUSTER: labels})
+
+    # mean similarity of the connections within each cluster
+    n_edges = np.bincount(labels[rows], minlength=labels.max(initial=0) + 1)
+    total = np.bincount(labels[rows], weights=similarity, minlength=len(n_edges))
+    df_similarity = pl.DataFrame(
+        {
+            COL_CLUSTER: np.arange(len(n_edges)),
+            COL_SIMILARITY: total / np.maximum(n_edges, 1),
+        }
+    ).cast({COL_CLUSTER: df_users.schema[COL_CLUSTER]})
+
+    df_clusters = (
+        df_users.group_by(COL_CLUSTER)
+        .agg(pl.len().alias(COL_N_USERS), pl.col(OUTPUT_COL_USERS))
+        .filter(pl.col(COL_N_USERS) >= min_cluster_size)
+    )
+
+    # hashtags used by at least half of the users in each cluster
+    df_hashtags = (
+        counts.filter(pl.col(OUTPUT_COL_WINDOW_ID) == window_id)
+        .join(df_users, on=OUTPUT_COL_USERS)
+        .join(df_clusters.select(COL_CLUSTER, COL_N_USERS), on=COL_CLUSTER)
+        .group_by(COL_CLUSTER, OUTPUT_COL_HASHTAGS, maintain_order=True)
+        .agg(pl.col(OUTPUT_COL_USERS).n_unique(), pl.col(COL_N_USERS).first())
+        .filter(2 * pl.col(OUTPUT_COL_USERS) >= pl.col(COL_N_USERS))
+        .sort(OUTPUT_COL_USERS, descending=True, maintain_order=True)
+        .group_by(COL_CLUSTER)
+        .agg(pl.col(OUTPUT_COL_HASHTAGS))
+    )
+
+    return (
+        df_clusters.join(df_hashtags, on=COL_CLUSTER, how="left")
+        .join(df_similarity, on=COL_CLUSTER, how="left")
+        .sort(
+            [COL_N_USERS, COL_SIMILARITY, COL_CLUSTER], descending=[True, True, False]
+        )
+        .select(
+            pl.int_range(pl.len(), dtype=pl.UInt32).alias(COL_CLUSTER),
+            pl.col(COL_N_USERS),
+            pl.col(OUTPUT_COL_USERS),
+            pl.col(OUTPUT_COL_HASHTAGS),
+            pl.col(COL_SIMILARITY),
+        )
+    )
+
+
+def coordinated_clusters_all(counts: pl.DataFrame, **kwargs) -> pl.DataFrame:
+    """
+    Run `coordinated_clusters` for all time windows
+
+    Parameters
+    ----------
+    counts : pl.DataFrame
+        counts table of `compact_primary_output`
+    **kwargs
+        passed to `coordinated_clusters`
+
+    Returns
+    -------
+    pl.DataFrame
+        output of `coordinated_clusters` with an additional `window_id` column
+    """
+    window_ids = counts[OUTPUT_COL_WINDOW_ID].unique().sort()
+
+    return pl.concat(
+        [
+            coordinated_clusters(counts, window_id, **kwargs).select(
+                pl.lit(window_id, dtype=pl.UInt32).alias(OUTPUT_COL_WINDOW_ID),
+                pl.all(),
+            )
+            for window_id in window_ids
+        ]
+    )
+
+
+def _synchronized_posts(
+    df_exploded: pl.DataFrame, seconds: float, max_neighbors: int
+) -> pl.DataFrame:
+    if max_neighbors < 1:
+        raise ValueError(f"max_neighbors must be at least 1, got {max_neighbors}")
+
+    # posts of the same hashtag are neighbors in the order of (hashtag, time), each
+    # is compared to the k-th next one until all of those are too late
+    df_exploded = df_exploded.sort(pl.col(COL_POST).to_physical(), pl.col(COL_TIME))
+    max_lag = pl.duration(microseconds=int(seconds * 1e6))
+
+    pairs = []
+    for k in range(1, max_neighbors + 1):
+        df_k = df_exploded.select(
+            pl.col(COL_TIME),
+            pl.col(COL_POST),
+            pl.col(COL_AUTHOR_ID).cast(pl.String).alias(COL_USER_A),
+            pl.col(COL_AUTHOR_ID).shift(-k).cast(pl.String).alias(COL_USER_B),
+            (pl.col(COL_TIME).shift(-k) - pl.col(COL_TIME)).alias("lag"),
+            (pl.col(COL_POST) == pl.col(COL_POST).shift(-k)).alias("same_hashtag"),
+        ).filter(pl.col("same_hashtag"), pl.col("lag") <= max_lag)
+
+        pairs.append(df_k.filter(pl.col(COL_USER_A) != pl.col(COL_USER_B)))
+        if df_k.is_empty():
+            break
+
+    return (
+        pl.concat(pairs)
+        .select(
+            pl.col(COL_TIME),
+            pl.col(COL_POST),
+            pl.min_horizontal(COL_USER_A, COL_USER_B).alias(COL_USER_A),
+            pl.max_horizontal(COL_USER_A, COL_USER_B).alias(COL_USER_B),
+            (pl.col("lag").dt.total_microseconds() / 1e6).alias("lag_s"),
+        )
+        .sort(COL_TIME, maintain_order=True)
+    )
+
+
+@pl.StringCache()
+def synchronized_posts(
+    data_frame: pl.DataFrame | pl.LazyFrame, seconds=10, max_neighbors=50
+) -> pl.DataFrame:
+    """
+    Pairs of posts by different users with the same hashtag within `seconds`
+
+    The hashtags are sorted by hashtag and time once, after which the posts within
+    `seconds` of each other are neighbors in the sorted order. Each post is compared
+    to the next ones (shifted columns) until all of those are too late, so the cost
+    is that of the sort plus O(n) per neighbor instead of comparing all pairs.
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        input data as for `hashtag_analysis`
+    seconds : float
+        largest time difference of synchronized posts
+    max_neighbors : int
+        nr. of following posts each post is compared to at most (at least 1), which
+        bounds the pairs found within a burst of many posts of the same hashtag
+
+    Returns
+    -------
+    pl.DataFrame
+        `time` (of the earlier post), `text` (hashtag), `user_a` and `user_b`
+        (`user_a` < `user_b`) and `lag_s` (seconds between the two posts)
+    """
+    check_hashtags(data_frame)
+    df_exploded = explode_hashtags(data_frame.lazy()).collect()
+    return _synchronized_posts(df_exploded, seconds, max_neighbors)
+
+
+@pl.StringCache()
+def synchronized_pairs(
+    data_frame: pl.DataFrame | pl.LazyFrame,
+    every="1d",
+    period="1d",
+    seconds=10,
+    max_neighbors=50,
+    min_events=3,
+) -> pl.DataFrame:
+    """
+    Pairs of users that repeatedly post the same hashtags at the same time, ranked
+    per time window
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        input data as for `hashtag_analysis`
+    every : str
+        interval of the time windows, as for `hashtag_analysis`
+    period : str
+        length of the time windows, as for `hashtag_analysis`
+    seconds : float
+        see `synchronized_posts`
+    max_neighbors : int
+        see `synchronized_posts`
+    min_events : int
+        pairs with fewer synchronized posts in a window are left out
+
+    Returns
+    -------
+    pl.DataFrame
+        `timewindow_start` (as in the output of `hashtag_analysis`), `rank`,
+        `user_a`, `user_b`, `n_events` (nr. of synchronized posts), `hashtags`
+        and `median_lag_s`, sorted by time window and rank
+    """
+    check_hashtags(data_frame)
+    df_exploded = explode_hashtags(data_frame.lazy()).collect()
+    df_events = _synchronized_posts(df_exploded, seconds, max_neighbors)
+
+    # windows start at the first post, as with start_by="datapoint"
+    origin = df_exploded[COL_TIME].min()
+
+    return (
+        _explode_windows(df_events, origin, every, period)
+        .group_by(OUTPUT_COL_TIMESPAN, COL_USER_A, COL_USER_B)
+        .agg(
+            pl.len().alias(COL_N_EVENTS),
+            pl.col(COL_POST).unique(maintain_order=True).alias(OUTPUT_COL_HASHTAGS),
+            pl.col("lag_s").median().alias(COL_LAG),
+        )
+        .filter(pl.col(COL_N_EVENTS) >= min_events)
+        .sort(
+            [OUTPUT_COL_TIMESPAN, COL_N_EVENTS, COL_USER_A, COL_USER_B],
+            descending=[False, True, False, False],
+        )
+        .select(
+            pl.col(OUTPUT_COL_TIMESPAN).dt.to_string("%Y-%m-%d %H:%M:%S"),
+            pl.int_range(1, pl.len() + 1, dtype=pl.UInt32)
+            .over(OUTPUT_COL_TIMESPAN)
+            .alias(COL_RANK),
+            pl.col(COL_USER_A),
+            pl.col(COL_USER_B),
+            pl.col(COL_N_EVENTS),
+            pl.col(OUTPUT_COL_HASHTAGS),
+            pl.col(COL_LAG),
+        )
+    )
+
+
+def synchronized_groups(pairs: pl.DataFrame) -> pl.DataFrame:
+    """
+    Groups of users connected by synchronized pairs, per time window
+
+    Parameters
+    ----------
+    pairs : pl.DataFrame
+        output of `synchronized_pairs`
+
+    Returns
+    -------
+    pl.DataFrame
+        `timewindow_start`, `rank`, `n_users`, `users` and `n_events` (summed over
+        the pairs in the group), ranked by `n_events` per time window
+    """
+    groups = []
+    for (timewindow,), df_window in pairs.group_by(
+        OUTPUT_COL_TIMESPAN, maintain_order=True
+    ):
+        users = pl.concat([df_window[COL_USER_A], df_window[COL_USER_B]]).unique(
+            maintain_order=True
+        )
+        index = {user: i for i, user in enumerate(users.to_list())}
+        rows = np.array([index[user] for user in df_window[COL_USER_A].to_list()])
+        cols = np.array([index[user] for user in df_window[COL_USER_B].to_list()])
+
+        graph = sparse.coo_array(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(users),) * 2
+        )
+        _, labels = connected_components(graph, directed=False)
+
+        groups.append(
+            pl.DataFrame({OUTPUT_COL_USERS: users, COL_CLUSTER: labels})
+            .join(
+                df_window.select(
+                    pl.col(COL_USER_A).alias(OUTPUT_COL_USERS),
+                    pl.col(COL_N_EVENTS),
+                ),
+                on=OUTPUT_COL_USERS,
+                how="left",
+            )
+            .group_by(COL_CLUSTER, maintain_order=True)
+            .agg(
+                pl.col(OUTPUT_COL_USERS).unique(maintain_order=True),
+                pl.col(COL_N_EVENTS).sum(),
+            )
+            .select(
+                pl.lit(timewindow).alias(OUTPUT_COL_TIMESPAN),
+                pl.col(OUTPUT_COL_USERS).list.len().alias(COL_N_USERS),
+                pl.col(OUTPUT_COL_USERS),
+                pl.col(COL_N_EVENTS),
+            )
+        )
+
+    if not groups:
+        return pl.DataFrame(
+            schema={
+                OUTPUT_COL_TIMESPAN: pl.String,
+                COL_RANK: pl.UInt32,
+                COL_N_USERS: pl.UInt32,
+                OUTPUT_COL_USERS: pl.List(pl.String),
+                COL_N_EVENTS: pl.UInt32,
+            }
+        )
+
+    return (
+        pl.concat(groups)
+        .sort(
+            [OUTPUT_COL_TIMESPAN, COL_N_EVENTS],
+            descending=[False, True],
+            maintain_order=True,
+        )
+        .select(
+            pl.col(OUTPUT_COL_TIMESPAN),
+            pl.int_range(1, pl.len() + 1, dtype=pl.UInt32)
+            .over(OUTPUT_COL_TIMESPAN)
+            .alias(COL_RANK),
+            pl.all().exclude(OUTPUT_COL_TIMESPAN),
+        )
+    )
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_POST,
+    COL_TIME,
+    OUTPUT_COL_COUNT,
+    OUTPUT_COL_GINI,
+    OUTPUT_COL_HASHTAGS,
+    OUTPUT_COL_TIMESPAN,
+    OUTPUT_COL_USERS,
+    OUTPUT_COL_WINDOW_ID,
+    check_hashtags,
+    explode_hashtags,
+    gini_from_counts,
+)
+
+COL_DAY = "day"
+COL_EVERY_DAYS = "every_days"
+COL_PERIOD_DAYS = "period_days"
+
+
+@pl.StringCache()
+def daily_hashtag_counts(data_frame: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+    """
+    Number of times each hashtag is used per day, days counted from the first post
+
+    Returns
+    -------
+    pl.DataFrame
+        `day` (int), `text` (hashtag) and `count` columns, with the time of the first
+        post (the start of day 0) as `origin` column
+    """
+    check_hashtags(data_frame)
+    lf = explode_hashtags(data_frame.lazy())
+
+    origin = pl.col(COL_TIME).min()
+
+    return (
+        lf.with_columns(origin=origin)
+        .with_columns(
+            ((pl.col(COL_TIME) - pl.col("origin")).dt.total_days()).alias(COL_DAY)
+        )
+        .group_by(COL_DAY, COL_POST)
+        .agg(pl.len().alias(OUTPUT_COL_COUNT), pl.col("origin").first())
+        .collect()
+    )
+
+
+def gini_cube(
+    data_frame: pl.DataFrame | pl.LazyFrame, days=range(1, 21)
+) -> pl.DataFrame:
+    """
+    Gini time series for every combination of window interval and duration (in days)
+
+    Same values as `hashtag_analysis(every=f"{every}d", period=f"{period}d")`. The
+    daily hashtag counts are computed once and summed into windows once per duration:
+    windows for every interval are a subset of the windows starting on each day.
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        input data as for `hashtag_analysis`
+    days : iterable of int
+        window intervals and durations to precompute
+
+    Returns
+    -------
+    pl.DataFrame
+        `every_days`, `period_days`, `timewindow_start`, `count`, `gini` and
+        `gini_smooth`, sorted by `every_days`, `period_days` and time
+    """
+    day_counts = daily_hashtag_counts(data_frame)
+    origin = day_counts["origin"].first()
+
+    windows = []
+    for period in days:
+        # window starting on every day, summed over the days it covers
+        windows.append(
+            day_counts.with_columns(
+                start=pl.int_ranges(pl.col(COL_DAY) - period + 1, pl.col(COL_DAY) + 1)
+            )
+            .explode("start")
+            .filter(pl.col("start") >= 0)
+            .group_by("start", COL_POST)
+            .agg(pl.col(OUTPUT_COL_COUNT).sum())
+            .group_by("start")
+            .agg(
+                pl.col(OUTPUT_COL_COUNT).sum().cast(pl.UInt32),
+                gini_from_counts(pl.col(OUTPUT_COL_COUNT)).alias(OUTPUT_COL_GINI),
+            )
+            .with_columns(pl.lit(period).alias(COL_PERIOD_DAYS))
+        )
+
+    return (
+        pl.concat(windows)
+        .join(pl.DataFrame({COL_EVERY_DAYS: list(days)}), how="cross")
+        .filter(pl.col("start") % pl.col(COL_EVERY_DAYS) == 0)
+        .sort(COL_EVERY_DAYS, COL_PERIOD_DAYS, "start")
+        .select(
+            pl.col(COL_EVERY_DAYS),
+            pl.col(COL_PERIOD_DAYS),
+            (pl.lit(origin) + pl.duration(days=pl.col("start"))).alias(
+                OUTPUT_COL_TIMESPAN
+            ),
+            pl.col(OUTPUT_COL_COUNT),
+            pl.col(OUTPUT_COL_GINI),
+            pl.col(OUTPUT_COL_GINI)
+            .rolling_mean(window_size=3, center=True)
+            .over(COL_EVERY_DAYS, COL_PERIOD_DAYS)
+            .alias(OUTPUT_COL_GINI + "_smooth"),
+        )
+    )
+
+
+@pl.StringCache()
+def window_counts(
+    data_frame: pl.DataFrame | pl.LazyFrame, window_start: datetime, period_days: int
+) -> pl.DataFrame:
+    """
+    Counts table (as from `compact_primary_output`) of a single time window, to run
+    `secondary_analyzer(counts, 0)` for a window looked up in the cube
+    """
+    window_end = window_start + timedelta(days=period_days)
+
+    return (
+        explode_hashtags(
+            data_frame.lazy().filter(
+                pl.col(COL_TIME) >= window_start, pl.col(COL_TIME) < window_end
+            )
+        )
+        .group_by(
+            pl.col(COL_POST).alias(OUTPUT_COL_HASHTAGS),
+            pl.col(COL_AUTHOR_ID).alias(OUTPUT_COL_USERS),
+        )
+        .agg(pl.len().cast(pl.UInt32).alias(OUTPUT_COL_COUNT))
+        .with_columns(pl.lit(0, dtype=pl.UInt32).alias(OUTPUT_COL_WINDOW_ID))
+        .collect()
+    )
@@ -0,0 +1,401 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_POST,
+    COL_TIME,
+    OUTPUT_COL_TIMESPAN,
+    OUTPUT_COL_USERS,
+    _explode_windows,
+    explode_hashtags,
+)
+
+SIGNATURES_FNAME = "minhash_signatures.parquet"
+CLUSTERS_FNAME = "near_duplicates.parquet"
+
+COL_TEXT_NORMALIZED = "text_normalized"
+COL_SIGNATURE = "signature"
+COL_SEED = "seed"
+COL_SHINGLE_SIZE = "shingle_size"
+COL_CLUSTER = "cluster"
+COL_N_POSTS = "n_posts"
+COL_N_TEXTS = "n_texts"
+COL_N_USERS = "n_users"
+COL_FIRST = "first_post"
+COL_LAST = "last_post"
+
+SHINGLE_SIZE = 5  # characters (bytes of the UTF-8 text)
+NUM_PERM = 64
+N_BANDS = 8
+
+# hashing of the shingle bytes
+_SHINGLE_PRIME = np.uint64(1099511628211)
+
+
+def normalize_text(column=COL_POST) -> pl.Expr:
+    """
+    Lowercase text without links and repeated whitespace, so that copies of a post
+    with different (shortened) links are identical
+    """
+    return (
+        pl.col(column)
+        .str.to_lowercase()
+        .str.replace_all(r"https?://\S+", "")
+        .str.replace_all(r"\s+", " ")
+        .str.strip_chars()
+    )
+
+
+def _hash_functions(num_perm: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    # multiply-shift hashing, the upper 32 bits of a * x + b (mod 2^64)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) * 2 + 1  # odd
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(
+    texts: pl.Series,
+    num_perm=NUM_PERM,
+    shingle_size=SHINGLE_SIZE,
+    seed=0,
+    max_elements=2**24,
+) -> pl.Series:
+    """
+    MinHash signatures of the character shingles of each text
+
+    The texts are processed in chunks: the bytes of a chunk are concatenated into
+    one array, the hash of every `shingle_size` consecutive bytes is computed at
+    once, and the minimum of each hash function over the shingles of each text is
+    taken with `np.minimum.reduceat`.
+
+    Parameters
+    ----------
+    texts : pl.Series
+        (normalized) texts
+    num_perm : int
+        nr. of hash functions, the length of the signatures
+    shingle_size : int
+        nr. of bytes per shingle, shorter texts are a single shingle
+    seed : int
+        seed of the hash functions, must be the same for signatures that are
+        compared
+    max_elements : int
+        upper bound on the nr. of (shingle, hash function) values in memory
+
+    Returns
+    -------
+    pl.Series
+        `Array(UInt32, num_perm)`, one signature per text
+    """
+    a, b = _hash_functions(num_perm, seed)
+
+    # texts are padded to at least one full shingle
+    texts = texts.fill_null("").str.pad_end(shingle_size, " ")
+    lengths = texts.str.len_bytes().to_numpy().astype(np.int64)
+    cum_lengths = np.concatenate([[0], np.cumsum(lengths)])
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+
+    start = 0
+    while start < len(texts):
+        # texts per chunk such that its shingles times `num_perm` fit `max_elements`
+        end = np.searchsorted(
+            cum_lengths, cum_lengths[start] + max_elements // num_perm, side="right"
+        )
+        end = min(max(end - 1, start + 1), len(texts))
+
+        data = np.frombuffer(
+            "".join(texts.slice(start, end - start).to_list()).encode("utf-8"),
+            dtype=np.uint8,
+        )
+
+        # polynomial hash of the bytes at positions i, ..., i + shingle_size - 1
+        n_positions = len(data) - shingle_size + 1
+        shingles = np.zeros(n_positions, dtype=np.uint64)
+        for j in range(shingle_size):
+            shingles = shingles * _SHINGLE_PRIME + data[j : n_positions + j]
+
+        # only shingles that start and end in the same text
+        text_of_byte = np.repeat(np.arange(end - start), lengths[start:end])
+        is_within = text_of_byte[:n_positions] == text_of_byte[shingle_size - 1 :]
+        shingles = shingles[is_within]
+        first_shingle = np.concatenate(
+            [[0], np.cumsum(lengths[start:end] - shingle_size + 1)[:-1]]
+        )
+
+        # (hash functions x shingles), so that the minimum runs over contiguous rows
+        hashed = ((a[:, None] * shingles + b[:, None]) >> np.uint64(32)).astype(
+            np.uint32
+        )
+        signatures[start:end] = np.minimum.reduceat(hashed, first_shingle, axis=1).T
+
+        start = end
+
+    return pl.Series(COL_SIGNATURE, signatures, dtype=pl.Array(pl.UInt32, num_perm))
+
+
+def update_signatures(
+    texts: pl.Series, path: str | Path | None = None, **kwargs
+) -> pl.DataFrame:
+    """
+    Signatures of the unique texts, only computing those not stored in `path` yet
+
+    Parameters
+    ----------
+    texts : pl.Series
+        normalized texts (see `normalize_text`)
+    path : str | Path | None
+        parquet file with the signatures of earlier runs, created or extended with
+        the new texts (nothing is stored if None)
+    **kwargs
+        passed to `minhash_signatures`, must be the same in every run (the length,
+        seed and shingle size are stored with the signatures and checked)
+
+    Returns
+    -------
+    pl.DataFrame
+        `text_normalized` and `signature`, including the texts stored earlier
+    """
+    num_perm = kwargs.get("num_perm", NUM_PERM)
+    hashing = pl.DataFrame(
+        {
+            COL_SEED: [kwargs.get("seed", 0)],
+            COL_SHINGLE_SIZE: [kwargs.get("shingle_size", SHINGLE_SIZE)],
+        },
+        schema={COL_SEED: pl.Int64, COL_SHINGLE_SIZE: pl.Int64},
+    )
+
+    df_texts = texts.drop_nulls().unique().alias(COL_TEXT_NORMALIZED).to_frame()
+
+    if path is not None and Path(path).exists():
+        df_stored = pl.read_parquet(path)
+        # signatures of other hash functions would be mixed into the LSH bands
+        is_same = (
+            df_stored.schema.get(COL_SIGNATURE) == pl.Array(pl.UInt32, num_perm)
+            and set(hashing.columns) <= set(df_stored.columns)
+            and df_stored.select(hashing.columns).unique().equals(hashing)
+        )
+        if not is_same:
+            raise ValueError(
+                f"Signatures in {path} were not computed with num_perm={num_perm}, "
+                f"seed={hashing[COL_SEED].item()} and "
+                f"shingle_size={hashing[COL_SHINGLE_SIZE].item()}, remove the file "
+                "to recompute them."
+            )
+        df_texts = df_texts.join(df_stored, on=COL_TEXT_NORMALIZED, how="anti")
+    else:
+        df_stored = None
+
+    df_new = df_texts.with_columns(
+        minhash_signatures(df_texts[COL_TEXT_NORMALIZED], **kwargs)
+    ).join(hashing, how="cross")
+    df_signatures = df_new if df_stored is None else pl.concat([df_stored, df_new])
+
+    if path is not None and len(df_new) > 0:
+        df_signatures.write_parquet(path)
+
+    return df_signatures.drop(hashing.columns)
+
+
+def lsh_components(signatures: pl.Series, n_bands=N_BANDS) -> np.ndarray:
+    """
+    Groups of near-duplicate texts by locality-sensitive hashing of the signatures
+
+    The signatures are split into `n_bands` bands; texts with an identical band are
+    candidates and are connected, the groups are the connected components. With
+    `r` values per band, texts with Jaccard similarity `s` are candidates with
+    probability 1 - (1 - s^r)^n_bands, about 1/2 at s = (1 / n_bands)^(1 / r).
+
+    Parameters
+    ----------
+    signatures : pl.Series
+        output of `minhash_signatures`
+    n_bands : int
+        nr. of bands, must divide the length of the signatures
+
+    Returns
+    -------
+    np.ndarray
+        group label of each text
+    """
+    values = signatures.to_numpy()
+    n, num_perm = values.shape
+    if num_perm % n_bands != 0:
+        raise ValueError(f"n_bands ({n_bands}) does not divide {num_perm}")
+    rows = num_perm // n_bands
+
+    ids = np.arange(n)
+    edges_from, edges_to = [], []
+    for band in range(n_bands):
+        key = np.zeros(n, dtype=np.uint64)
+        for value in values[:, band * rows : (band + 1) * rows].T:
+            key = key * _SHINGLE_PRIME + value
+
+        # each text is connected to the first text in its bucket
+        first = (
+            pl.DataFrame({"id": ids, "key": key})
+            .select(pl.col("id").min().over("key"))
+            .to_series()
+            .to_numpy()
+        )
+        is_candidate = first != ids
+        edges_from.append(ids[is_candidate])
+        edges_to.append(first[is_candidate])
+
+    edges_from, edges_to = np.concatenate(edges_from), np.concatenate(edges_to)
+    graph = sparse.coo_array(
+        (np.ones(len(edges_from)), (edges_from, edges_to)), shape=(n, n)
+    )
+    _, labels = connected_components(graph, directed=False)
+
+    return labels
+
+
+@pl.StringCache()
+def near_duplicate_clusters(
+    data_frame: pl.DataFrame | pl.LazyFrame,
+    signatures_path: str | Path | None = None,
+    every="1d",
+    period="1d",
+    n_bands=N_BANDS,
+    min_posts=3,
+    min_users=2,
+    exclude_retweets=True,
+    **kwargs,
+) -> pl.DataFrame:
+    """
+    Clusters of posts with (nearly) the same text, with the users and time windows
+    they span
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        posts with `COL_AUTHOR_ID`, `COL_TIME` and `COL_POST` columns
+    signatures_path : str | Path | None
+        parquet file to keep the signatures in (see `update_signatures`)
+    every : str
+        interval of the time windows, as for `hashtag_analysis`
+    period : str
+        length of the time windows, as for `hashtag_analysis`
+    n_bands : int
+        see `lsh_components`
+    min_posts : int
+        clusters with fewer posts are left out
+    min_users : int
+        clusters posted by fewer users are left out
+    exclude_retweets : bool
+        leave out posts starting with "RT @" (copies of a single post by design)
+    **kwargs
+        passed to `minhash_signatures`
+
+    Returns
+    -------
+    pl.DataFrame
+        `cluster`, `n_posts`, `n_texts` (distinct normalized texts), `n_users`,
+        `users`, `first_post`, `last_post`, `timewindow_start` (list of the windows
+        with posts of the cluster, as in the output of `hashtag_analysis`) and an
+        example `text`, sorted by `n_users`
+    """
+    # windows start at the first post with a hashtag (retweets included), as in the
+    # output of `hashtag_analysis`
+    origin = (
+        explode_hashtags(data_frame.lazy())
+        .select(pl.col(COL_TIME).min())
+        .collect()
+        .item()
+    )
+
+    lf = data_frame.lazy().select(
+        pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST)
+    )
+    if exclude_retweets:
+        lf = lf.filter(~pl.col(COL_POST).str.starts_with("RT @"))
+
+    df = lf.with_columns(normalize_text().alias(COL_TEXT_NORMALIZED)).collect()
+
+    df_signatures = update_signatures(
+        df[COL_TEXT_NORMALIZED], signatures_path, **kwargs
+    ).join(df.select(pl.col(COL_TEXT_NORMALIZED).unique()), on=COL_TEXT_NORMALIZED)
+    df_signatures = df_signatures.with_columns(
+        pl.Series(COL_CLUSTER, lsh_components(df_signatures[COL_SIGNATURE], n_bands))
+    ).drop(COL_SIGNATURE)
+
+    df = df.join(df_signatures, on=COL_TEXT_NORMALIZED)
+
+    if origin is None:  # no hashtags, windows start at the first post
+        origin = df[COL_TIME].min()
+
+    df_windows = (
+        _explode_windows(df, origin, every, period)
+        .group_by(COL_CLUSTER)
+        .agg(
+            pl.col(OUTPUT_COL_TIMESPAN)
+            .unique()
+            .sort()
+            .dt.to_string("%Y-%m-%d %H:%M:%S")
+        )
+    )
+
+    return (
+        df.group_by(COL_CLUSTER)
+        .agg(
+            pl.len().alias(COL_N_POSTS),
+            pl.col(COL_TEXT_NORMALIZED).n_unique().alias(COL_N_TEXTS),
+            pl.col(COL_AUTHOR_ID).n_unique().alias(COL_N_USERS),
+            pl.col(COL_AUTHOR_ID).unique(maintain_order=True).alias(OUTPUT_COL_USERS),
+            pl.col(COL_TIME).min().alias(COL_FIRST),
+            pl.col(COL_TIME).max().alias(COL_LAST),
+            pl.col(COL_POST).first(),
+        )
+        .filter(pl.col(COL_N_POSTS) >= min_posts, pl.col(COL_N_USERS) >= min_users)
+        .join(df_windows, on=COL_CLUSTER)
+        .sort([COL_N_USERS, COL_N_POSTS, COL_FIRST], descending=[True, True, False])
+        .select(
+            pl.int_range(pl.len(), dtype=pl.UInt32).alias(COL_CLUSTER),
+            pl.col(COL_N_POSTS),
+            pl.col(COL_N_TEXTS),
+            pl.col(COL_N_USERS),
+            pl.col(OUTPUT_COL_USERS),
+            pl.col(COL_FIRST),
+            pl.col(COL_LAST),
+            pl.col(OUTPUT_COL_TIMESPAN),
+            pl.col(COL_POST),
+        )
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from mango_blog.ingest import scan_dataset
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "dataset_path",
+        type=str,
+        help="Path to the russian trolls dataset (as written by mango_blog.ingest)",
+    )
+    parser.add_argument("output_path", type=str, help="Folder to store the data to")
+    parser.add_argument("--every", type=str, default="6d")
+    parser.add_argument("--period", type=str, default="6d")
+
+    args = parser.parse_args()
+
+    # signatures of earlier runs are reused, only new texts are hashed
+    df_clusters = near_duplicate_clusters(
+        scan_dataset(args.dataset_path),
+        signatures_path=Path(args.output_path, SIGNATURES_FNAME),
+        every=args.every,
+        period=args.period,
+    )
+
+    fn = Path(args.output_path, CLUSTERS_FNAME)
+    print(f"Saving {fn}")
+    df_clusters.write_parquet(fn)
@@ -1,5 +1,11 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from itertools import accumulate
+from pathlib import Path
 
+import numpy as np
 import polars as pl
 from great_tables import GT, md
 
@@ -7,6 +13,21 @@ from great_tables import GT, md
 COL_AUTHOR_ID = "user_id"
 COL_TIME = "time"
 COL_POST = "text"
+# optional, hashtags pre-extracted from `COL_POST` (see `mango_blog.ingest`)
+COL_HASHTAGS = "hashtags"
+# row number of a post, kept for each of its hashtags when exploding
+COL_POST_ID = "post_id"
+
+# users and hashtags are Categorical, which can only be compared or combined across
+# sources (e.g. the files of a dataset) within one `pl.StringCache()`: the functions
+# that collect posts hold one for the call, to combine their outputs with other
+# Categorical frames the caller holds one around both
+
+# "#" followed by Unicode letters, marks, digits or "_", so that trailing punctuation
+# is not part of the hashtag ("#IslamKills," -> "#IslamKills"); a hashtag must also
+# contain a letter ("#1" is not a hashtag)
+HASHTAG_PATTERN = r"#[\p{L}\p{M}\p{N}_]+"
+HASHTAG_LETTER = r"\p{L}"
 
 OUTPUT_GINI = "hashtag_analysis"
 
@@ -15,6 +36,17 @@ OUTPUT_COL_TIMESPAN = "timewindow_start"
 OUTPUT_COL_GINI = "gini"
 OUTPUT_COL_COUNT = "count"
 OUTPUT_COL_HASHTAGS = "hashtags"
+OUTPUT_COL_WINDOW_ID = "window_id"
+OUTPUT_COL_GINI_LO = "gini_lo"
+OUTPUT_COL_GINI_HI = "gini_hi"
+
+# compact primary output, see `write_primary_output`
+PRIMARY_WINDOWS_FNAME = "primary_output_windows.parquet"
+PRIMARY_COUNTS_FNAME = "primary_output_counts.parquet"
+
+# posts per chunk of windows for a lazy input of `hashtag_analysis` (a post counts
+# once for each window it is in), the peak memory grows with this, not the corpus
+CHUNK_POSTS = 250_000
 
 
 def gini(x: pl.Series) -> float:
@@ -37,74 +69,1194 @@ def gini(x: pl.Series) -> float:
     return (n + 1 - 2 * sum(cumx) / cumx[-1]) / n
 
 
-def hashtag_analysis(data_frame: pl.DataFrame, every="1h", period="1h") -> pl.DataFrame:
-    if not isinstance(data_frame.schema[COL_TIME], pl.Datetime):
-        data_frame = data_frame.with_columns(
-            pl.col(COL_TIME).str.to_datetime().alias(COL_TIME)
+def gini_from_counts(counts: pl.Expr) -> pl.Expr:
+    """
+    Parameters
+    ----------
+    counts : pl.Expr
+        polars expression evaluating to the (unsorted) counts of each unique value
+
+    Returns
+    -------
+    pl.Expr
+        expression evaluating to the Gini coefficient, same arithmetic as `gini`
+    """
+    sorted_counts = counts.cast(pl.Int64).sort()
+    cumx = sorted_counts.cum_sum()
+    n = sorted_counts.len()
+
+    return (n + 1 - 2 * cumx.sum() / cumx.last()) / n
+
+
+def gini_expr(column: str) -> pl.Expr:
+    """
+    Native polars version of `gini`, usable inside `group_by(...).agg(...)`
+
+    Parameters
+    ----------
+    column : str
+        name of the column containing values for which to compute the Gini coefficient
+
+    Returns
+    -------
+    pl.Expr
+        expression evaluating to the Gini coefficient (between 0.0 and 1.0)
+    """
+    return gini_from_counts(pl.col(column).unique_counts())
+
+
+def entropy_from_counts(counts: pl.Expr) -> pl.Expr:
+    """Shannon entropy (in bits) of the distribution given by `counts`"""
+    return counts.entropy(base=2)
+
+
+def hhi_from_counts(counts: pl.Expr) -> pl.Expr:
+    """Herfindahl-Hirschman index, the sum of the squared shares"""
+    return ((counts / counts.sum()) ** 2).sum()
+
+
+def top_k_share(k: int):
+    """Metric for the share of the `k` largest counts in the total"""
+
+    def top_k_share_from_counts(counts: pl.Expr) -> pl.Expr:
+        return counts.top_k(k).sum() / counts.sum()
+
+    return top_k_share_from_counts
+
+
+# metrics per time window: name -> (column whose values are counted, function of the
+# counts expression), see `hashtag_analysis`; `COL_POST` counts the uses of each
+# hashtag, `COL_AUTHOR_ID` the posts of each user (not their hashtag uses)
+METRICS = {
+    "gini": (COL_POST, gini_from_counts),
+    "entropy": (COL_POST, entropy_from_counts),
+    "hhi": (COL_POST, hhi_from_counts),
+    "top10_share": (COL_POST, top_k_share(10)),
+    "user_gini": (COL_AUTHOR_ID, gini_from_counts),  # posts per user
+}
+
+
+def register_metric(name: str, column: str, metric) -> None:
+    """
+    Add a metric that `hashtag_analysis` can compute per time window
+
+    Parameters
+    ----------
+    name : str
+        name of the metric and of its output column
+    column : str
+        `COL_POST` to compute it on the hashtag counts or `COL_AUTHOR_ID` for the
+        nr. of posts per user
+    metric : callable
+        function taking the counts as a polars expression and returning an expression
+        evaluating to a scalar (e.g. `gini_from_counts`)
+    """
+    METRICS[name] = (column, metric)
+
+
+def bootstrap_gini(
+    counts: pl.Series,
+    n_resamples=1000,
+    ci=0.95,
+    seed=0,
+    max_elements=2**24,
+) -> pl.Series:
+    """
+    Percentile bootstrap confidence interval of the Gini coefficient per time window
+
+    The hashtag uses of each window are resampled with multinomial draws from its
+    counts. Windows are processed in chunks of similar nr. of hashtags, each chunk
+    as one (resamples x windows x hashtags) array of draws. The draws of a window
+    come from a generator seeded with `seed` and its sorted counts, so its interval
+    depends neither on the other windows (e.g. those recomputed with it by
+    `hashtag_analysis_incremental`) nor on the order of its hashtags.
+
+    The Gini of a resample is biased downwards (hashtags used once are often not
+    drawn), by about as much as the width of the interval for windows of a few
+    thousand posts. The percentiles are therefore taken of the deviations from the
+    median resample, and added to the observed Gini. The interval is clipped to
+    [0, 1], e.g. for a window where all hashtags are used equally often (Gini 0),
+    every resample has a Gini above the observed one.
+
+    Parameters
+    ----------
+    counts : pl.Series
+        list column with the counts of each hashtag, one row per time window
+    n_resamples : int
+        nr. of bootstrap resamples per window
+    ci : float
+        confidence level of the interval
+    seed : int
+        seed of the random number generators, combined with the counts of each
+        window
+    max_elements : int
+        upper bound on the size of the array of draws (memory use)
+
+    Returns
+    -------
+    pl.Series
+        struct with `gini_lo` and `gini_hi` fields, one row per time window
+    """
+    lengths = counts.list.len().fill_null(0).to_numpy().astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    values = counts.explode().drop_nulls().to_numpy().astype(np.int64)
+    # counts sorted within each window, the Gini does not depend on the order of the
+    # hashtags but the draws do (e.g. `update_primary_output` aggregates them anew)
+    values = values[np.lexsort((values, np.repeat(np.arange(len(counts)), lengths)))]
+
+    gini_lo = np.full(len(counts), np.nan)
+    gini_hi = np.full(len(counts), np.nan)
+
+    order = np.argsort(lengths, kind="stable")
+    order = order[lengths[order] > 0]
+
+    i = 0
+    while i < len(order):
+        # windows sorted by nr. of hashtags, so little padding within a chunk
+        width = lengths[order[i]]
+        j = i + 1
+        while j < len(order) and (j - i + 1) * lengths[order[j]] <= max(
+            max_elements // n_resamples, width
+        ):
+            width = lengths[order[j]]
+            j += 1
+        chunk = order[i:j]
+
+        padded = np.zeros((len(chunk), width), dtype=np.int64)
+        for row, window in enumerate(chunk):
+            padded[row, : lengths[window]] = values[
+                offsets[window] : offsets[window + 1]
+            ]
+        totals = padded.sum(axis=1)
+        rngs = [
+            np.random.default_rng(
+                np.concatenate([[seed], values[offsets[window] : offsets[window + 1]]])
+            )
+            for window in chunk
+        ]
+
+        # resamples in batches if a single window is larger than the bound
+        batch = max(max_elements // (len(chunk) * width), 1)
+        ginis = []
+        for start in range(0, n_resamples, batch):
+            size = min(batch, n_resamples - start)
+            draws = np.zeros((size, len(chunk), width), dtype=np.int64)
+            for row, (window, rng) in enumerate(zip(chunk, rngs)):
+                # without the padding, the draws do not depend on `width`
+                draws[:, row, : lengths[window]] = rng.multinomial(
+                    totals[row], padded[row, : lengths[window]] / totals[row], size
+                )
+
+            # same arithmetic as `gini_from_counts`, hashtags drawn zero times
+            # (sorted first, adding 0 to the cumulative sum) are not counted
+            cumx = np.cumsum(np.sort(draws, axis=-1), axis=-1)
+            n = (draws > 0).sum(axis=-1)
+            ginis.append((n + 1 - 2 * cumx.sum(axis=-1) / totals) / n)
+
+        # zero padding is sorted first, as hashtags that were not drawn
+        n = lengths[chunk]
+        cumx = np.cumsum(np.sort(padded, axis=-1), axis=-1)
+        gini = (n + 1 - 2 * cumx.sum(axis=-1) / totals) / n
+
+        ginis = np.concatenate(ginis)
+        ginis = ginis - np.median(ginis, axis=0)
+        lo, hi = np.quantile(ginis, [(1 - ci) / 2, 1 - (1 - ci) / 2], axis=0)
+        gini_lo[chunk] = np.clip(gini + lo, 0, 1)
+        gini_hi[chunk] = np.clip(gini + hi, 0, 1)
+
+        i = j
+
+    return pl.DataFrame(
+        {OUTPUT_COL_GINI_LO: gini_lo, OUTPUT_COL_GINI_HI: gini_hi}
+    ).to_struct(counts.name)
+
+
+def _gini_ci(ci: float, n_resamples: int) -> pl.Expr:
+    # confidence interval from the hashtag counts of `_window_aggregations`
+    return (
+        pl.col(_counts_column(COL_POST))
+        .map_batches(
+            lambda counts: bootstrap_gini(counts, n_resamples=n_resamples, ci=ci),
+            return_dtype=pl.Struct(
+                {OUTPUT_COL_GINI_LO: pl.Float64, OUTPUT_COL_GINI_HI: pl.Float64}
+            ),
         )
+        .alias("gini_ci")
+    )
+
+
+def _like_input(lf: pl.LazyFrame, data_frame: pl.DataFrame | pl.LazyFrame):
+    """Collect `lf` unless the caller passed a LazyFrame"""
+    return lf if isinstance(data_frame, pl.LazyFrame) else lf.collect()
 
-    # define the expressions
-    has_hashtag_symbols = pl.col(COL_POST).str.contains("#").any()
-    extract_hashtags = pl.col(COL_POST).str.extract_all(r"(#\S+)")
 
-    # if hashtag symbol is detected, extract with regex
-    if data_frame.select(has_hashtag_symbols).item():
-        df_input = data_frame.with_columns(extract_hashtags).filter(
-            pl.col(COL_POST) != []
+def extract_hashtags(column: str = COL_POST) -> pl.Expr:
+    """
+    Extract the hashtags of each post in `column` as a list of lowercase categories
+
+    Hashtags that only differ in case (`#IslamKills`, `#islamkills`) are the same
+    hashtag, the categorical encoding makes the later group-bys work on integer ids.
+    """
+    return (
+        pl.col(column)
+        .str.extract_all(HASHTAG_PATTERN)
+        .list.eval(
+            pl.element()
+            .filter(pl.element().str.contains(HASHTAG_LETTER))
+            .str.to_lowercase()
         )
+        .cast(pl.List(pl.Categorical))
+    )
+
 
-    else:  # otherwise, we assume str: "['hashtag1', 'hashtag2', ...]"
+def check_hashtags(data_frame: pl.DataFrame | pl.LazyFrame) -> None:
+    """
+    Raise a ValueError if the posts of an eager input have no hashtags
+
+    Lazy inputs are not checked, this would be a separate pass over the data. The
+    analyses call this before making their input lazy.
+    """
+    if (
+        isinstance(data_frame, pl.DataFrame)
+        and not isinstance(data_frame.schema.get(COL_HASHTAGS), pl.List)
+        and not data_frame[COL_POST].str.contains("#", literal=True).any()
+    ):
         raise ValueError(f"The data in {COL_POST} column appear to have no hashtags.")
 
-    # select columns and sort
-    df_input = df_input.select(pl.col([COL_AUTHOR_ID, COL_TIME, COL_POST])).sort(
-        pl.col(COL_TIME)
+
+@pl.StringCache()
+def explode_hashtags(
+    data_frame: pl.DataFrame | pl.LazyFrame, keep: tuple[str, ...] = ()
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Extract the hashtags from the posts and return one row per (user, time, hashtag)
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        input data with `COL_AUTHOR_ID`, `COL_TIME` and `COL_POST` columns, if it
+        also has a `COL_HASHTAGS` list column the hashtags are not extracted again
+    keep : tuple[str, ...]
+        other columns of `data_frame` to keep (e.g. a post id), repeated for each
+        hashtag of the post
+
+    Returns
+    -------
+    pl.DataFrame | pl.LazyFrame
+        exploded data sorted by time, `COL_POST` holds a single hashtag per row
+        (lowercase), users and hashtags are Categorical, lazy if the input is lazy
+    """
+    lf = data_frame.lazy()
+    schema = lf.collect_schema()
+
+    if not isinstance(schema[COL_TIME], pl.Datetime):
+        lf = lf.with_columns(pl.col(COL_TIME).str.to_datetime().alias(COL_TIME))
+
+    if isinstance(schema.get(COL_HASHTAGS), pl.List):  # extracted at ingest
+        lf = lf.with_columns(pl.col(COL_HASHTAGS).alias(COL_POST))
+
+    else:
+        check_hashtags(data_frame)
+        lf = lf.with_columns(pl.col(COL_POST).str.extract_all(HASHTAG_PATTERN))
+
+    lf = (
+        lf.filter(pl.col(COL_POST) != [])
+        .select(
+            pl.col(COL_AUTHOR_ID).cast(pl.Categorical),  # no-op if done at ingest
+            pl.col(COL_TIME),
+            *keep,
+            pl.col(COL_POST),
+        )
+        .explode(pl.col(COL_POST))
+    )
+
+    # normalize after exploding (no-op if done at ingest): encode first, then
+    # check and lowercase each distinct hashtag once instead of every occurrence
+    if schema.get(COL_HASHTAGS) != pl.List(pl.Categorical):
+        lf = lf.with_columns(pl.col(COL_POST).cast(pl.Categorical))
+        normalized = (
+            lf.select(pl.col(COL_POST).unique())
+            .filter(pl.col(COL_POST).cast(pl.String).str.contains(HASHTAG_LETTER))
+            .with_columns(
+                pl.col(COL_POST)
+                .cast(pl.String)
+                .str.to_lowercase()
+                .cast(pl.Categorical)
+                .alias("normalized")
+            )
+        )
+        lf = lf.join(
+            normalized, on=COL_POST, how="inner", maintain_order="left"
+        ).select(
+            pl.col(COL_AUTHOR_ID),
+            pl.col(COL_TIME),
+            *keep,
+            pl.col("normalized").alias(COL_POST),
+        )
+
+    # sort last, on fixed-width columns only
+    lf = lf.sort(pl.col(COL_TIME), maintain_order=True)
+
+    return _like_input(lf, data_frame)
+
+
+def _counts_column(column: str) -> str:
+    return f"{column}_counts"
+
+
+def _metric_names(metrics=()) -> tuple[str, ...]:
+    # the Gini coefficient first, each metric once
+    return tuple(dict.fromkeys((OUTPUT_COL_GINI, *metrics)))
+
+
+def _counts_posts(metrics) -> bool:
+    # the posts per user are counted on `COL_POST_ID`, see `_window_aggregations`
+    return any(METRICS[name][0] == COL_AUTHOR_ID for name in metrics)
+
+
+def _explode_for_metrics(
+    data_frame: pl.DataFrame | pl.LazyFrame, metrics
+) -> pl.LazyFrame:
+    # exploded posts with the columns the counts of `metrics` need
+    if not _counts_posts(metrics):
+        return explode_hashtags(data_frame.lazy())
+
+    return explode_hashtags(
+        data_frame.lazy().with_row_index(COL_POST_ID), keep=(COL_POST_ID,)
+    )
+
+
+def _window_aggregations(metrics=(OUTPUT_COL_GINI,)) -> list[pl.Expr]:
+    # the counts are computed once per column, all the metrics use them; a post
+    # with several hashtags is counted once for its user
+    counts = {
+        COL_POST: pl.col(COL_POST).unique_counts(),
+        COL_AUTHOR_ID: pl.col(COL_AUTHOR_ID)
+        .filter(pl.col(COL_POST_ID).is_first_distinct())
+        .unique_counts(),
+    }
+    counted_columns = sorted({METRICS[name][0] for name in metrics})
+
+    return [
+        pl.col(COL_AUTHOR_ID).alias(OUTPUT_COL_USERS),
+        pl.col(COL_POST).alias(OUTPUT_COL_HASHTAGS),
+        pl.col(COL_POST).count().alias(OUTPUT_COL_COUNT),
+        *[counts[column].alias(_counts_column(column)) for column in counted_columns],
+    ]
+
+
+def _with_metrics(
+    lf: pl.LazyFrame | pl.DataFrame,
+    metrics=(OUTPUT_COL_GINI,),
+    ci: float | None = None,
+    n_resamples=1000,
+) -> pl.LazyFrame | pl.DataFrame:
+    # compute the metrics (and confidence interval) from the counts of
+    # `_window_aggregations`
+    counted_columns = sorted({METRICS[name][0] for name in metrics})
+
+    lf = lf.with_columns(
+        pl.col(_counts_column(METRICS[name][0]))
+        .list.eval(METRICS[name][1](pl.element()))
+        .list.first()
+        .alias(name)
+        for name in metrics
+    )
+
+    if ci is not None:
+        lf = lf.with_columns(_gini_ci(ci, n_resamples)).unnest("gini_ci")
+
+    return lf.drop(_counts_column(column) for column in counted_columns)
+
+
+def _smooth_gini() -> pl.Expr:
+    return (
+        pl.col(OUTPUT_COL_GINI)
+        .rolling_mean(window_size=3, center=True)
+        .alias(OUTPUT_COL_GINI + "_smooth")
+    )
+
+
+@pl.StringCache()
+def hashtag_analysis(
+    data_frame: pl.DataFrame | pl.LazyFrame,
+    every="1h",
+    period="1h",
+    metrics=(),
+    ci: float | None = None,
+    n_resamples=1000,
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Compute the Gini coefficient of hashtag usage per time window
+
+    A LazyFrame input (e.g. from `pl.scan_csv`) returns a LazyFrame, so that corpora
+    larger than memory can be processed. With fixed-length `every` and `period`, the
+    windows are computed on the call, in chunks of consecutive windows with about
+    `CHUNK_POSTS` posts, one chunk after the other. The input is read once to size
+    the chunks and once per chunk, filtered by time: on the dataset written by
+    `ingest` only the partitions of the chunk are read, a CSV file is parsed again
+    for each chunk. With calendar durations (e.g. "1mo"), all windows are computed
+    at once on collect (within a `pl.StringCache()` if the input has Categoricals
+    from several files).
+
+    `metrics` are the names of additional metrics in `METRICS` (e.g. `("entropy",
+    "hhi", "top10_share", "user_gini")`), one column each. They are computed from
+    the same per-window counts as the Gini coefficient, at little extra cost (the
+    posts per user of `user_gini` count a post with several hashtags once).
+
+    With `ci` (e.g. 0.95), the `gini_lo` and `gini_hi` columns hold the bootstrap
+    confidence interval of the Gini coefficient (see `bootstrap_gini`).
+    """
+    check_hashtags(data_frame)
+    if isinstance(data_frame, pl.LazyFrame) and _is_fixed(every) and _is_fixed(period):
+        return _windows_chunked(
+            data_frame,
+            every=every,
+            period=period,
+            metrics=metrics,
+            ci=ci,
+            n_resamples=n_resamples,
+        ).lazy()
+
+    lf_out = _windows(
+        _explode_for_metrics(data_frame, _metric_names(metrics)),
+        every=every,
+        period=period,
+        metrics=metrics,
+        ci=ci,
+        n_resamples=n_resamples,
     )
 
+    return _like_input(lf_out, data_frame)
+
+
+def _windows(
+    lf_exploded: pl.LazyFrame,
+    every: str,
+    period: str,
+    metrics=(),
+    ci: float | None = None,
+    n_resamples=1000,
+) -> pl.LazyFrame:
+    metrics = _metric_names(metrics)
+
     # compute gini per timewindow
-    df_out = (
-        df_input.explode(pl.col(COL_POST))
-        .group_by_dynamic(
+    lf_out = (
+        lf_exploded.group_by_dynamic(
             pl.col(COL_TIME), every=every, period=period, start_by="datapoint"
         )
+        .agg(_window_aggregations(metrics))
+        .pipe(_with_metrics, metrics, ci=ci, n_resamples=n_resamples)
+        .with_columns(_smooth_gini())
+        .rename({COL_TIME: OUTPUT_COL_TIMESPAN})
+    )
+
+    # convert datetime back to string
+    return lf_out.with_columns(
+        pl.col(OUTPUT_COL_TIMESPAN).dt.to_string("%Y-%m-%d %H:%M:%S")
+    )
+
+
+def _is_fixed(duration: str) -> bool:
+    # whether `parse_duration` accepts `duration`
+    try:
+        parse_duration(duration)
+    except ValueError:
+        return False
+    return True
+
+
+def _has_hashtags(schema: pl.Schema) -> pl.Expr:
+    # whether a post has a hashtag that `explode_hashtags` keeps
+    if isinstance(schema.get(COL_HASHTAGS), pl.List):
+        hashtags = pl.col(COL_HASHTAGS).list.eval(pl.element().cast(pl.String))
+    else:
+        hashtags = pl.col(COL_POST).str.extract_all(HASHTAG_PATTERN)
+
+    return hashtags.list.eval(pl.element().str.contains(HASHTAG_LETTER)).list.any()
+
+
+def _windows_chunked(
+    data_frame: pl.LazyFrame,
+    every: str,
+    period: str,
+    metrics=(),
+    ci: float | None = None,
+    n_resamples=1000,
+) -> pl.DataFrame:
+    # `_windows` on chunks of consecutive windows (on the grid of `_explode_windows`),
+    # collected one after the other so that only the posts of one chunk are exploded,
+    # sorted and grouped at a time; in a single plan, `group_by_dynamic`, the sort and
+    # the join of `explode_hashtags` hold all posts, and the streaming engine runs
+    # the chunks of a concatenated plan at the same time
+    metrics = _metric_names(metrics)
+    every_td, period_td = parse_duration(every), parse_duration(period)
+
+    lf = data_frame
+    if not isinstance(lf.collect_schema()[COL_TIME], pl.Datetime):
+        lf = lf.with_columns(pl.col(COL_TIME).str.to_datetime())
+
+    # posts per `every` step, the first post with a hashtag starts the first window
+    steps = (
+        lf.filter(_has_hashtags(lf.collect_schema()))
+        .group_by(
+            (
+                pl.col(COL_TIME).dt.epoch("us")
+                // (every_td // timedelta(microseconds=1))
+            ).alias("step")
+        )
+        .agg(pl.col(COL_TIME).min(), pl.col(COL_TIME).max().alias("last"), pl.len())
+        .sort(COL_TIME)
+        .collect(engine="streaming")
+    )
+    if steps.is_empty():
+        return _windows(
+            _explode_for_metrics(lf, metrics),
+            every=every,
+            period=period,
+            metrics=metrics,
+            ci=ci,
+            n_resamples=n_resamples,
+        ).collect()
+
+    origin = steps[COL_TIME].first()
+    n_overlap = -(-period_td // every_td)  # nr. of windows that contain a post
+
+    # first window of each chunk, a chunk ends when it has `CHUNK_POSTS` posts
+    chunk_starts, n_posts = [0], 0
+    for step_start, n in steps.select(COL_TIME, "len").iter_rows():
+        window = (step_start - origin) // every_td
+        if (
+            n_posts > 0
+            and n_posts + n * n_overlap > CHUNK_POSTS
+            and window > chunk_starts[-1]
+        ):
+            chunk_starts.append(window)
+            n_posts = 0
+        n_posts += n * n_overlap
+    chunk_starts.append((steps["last"].max() - origin) // every_td + 1)
+
+    chunks = []
+    for first, end in zip(chunk_starts, chunk_starts[1:]):
+        time_start, time_end = origin + first * every_td, origin + end * every_td
+        posts = lf.filter(
+            pl.col(COL_TIME) >= time_start,
+            pl.col(COL_TIME) < time_end - every_td + period_td,
+        )
+        chunks.append(
+            _explode_windows(
+                _explode_for_metrics(posts, metrics), origin, every, period
+            )
+            .filter(
+                pl.col(OUTPUT_COL_TIMESPAN).is_between(
+                    time_start, time_end, closed="left"
+                )
+            )
+            .group_by(OUTPUT_COL_TIMESPAN, maintain_order=True)
+            .agg(_window_aggregations(metrics))
+            .sort(OUTPUT_COL_TIMESPAN)
+            .pipe(_with_metrics, metrics, ci=ci, n_resamples=n_resamples)
+            .collect(engine="streaming")
+        )
+
+    return (
+        pl.concat(chunks)
+        .with_columns(_smooth_gini())
+        .with_columns(pl.col(OUTPUT_COL_TIMESPAN).dt.to_string("%Y-%m-%d %H:%M:%S"))
+    )
+
+
+@pl.StringCache()
+def hashtag_analysis_sweep(
+    data_frame: pl.DataFrame | pl.LazyFrame,
+    configs: list[tuple[str, str]],
+    max_workers: int | None = None,
+    metrics=(),
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Run `hashtag_analysis` for several (every, period) window configurations
+
+    The hashtags are extracted once and the configurations are run concurrently on a
+    thread pool (polars releases the GIL while collecting).
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        input data as for `hashtag_analysis`
+    configs : list[tuple[str, str]]
+        (every, period) pairs, e.g. `[("1d", "1d"), ("1d", "7d")]`
+    max_workers : int | None
+        number of threads, defaults to that of `ThreadPoolExecutor`
+    metrics : tuple[str]
+        additional metrics, as for `hashtag_analysis`
+
+    Returns
+    -------
+    tuple[pl.DataFrame, pl.DataFrame]
+        the output of `hashtag_analysis` for all configurations stacked, with
+        `every` and `period` columns in front, and the run time per configuration
+        (`every`, `period`, `windows`, `seconds`)
+    """
+    check_hashtags(data_frame)
+    df_exploded = _explode_for_metrics(data_frame, _metric_names(metrics)).collect(
+        engine="streaming"
+    )
+
+    def run(config: tuple[str, str]) -> tuple[pl.DataFrame, float]:
+        every, period = config
+        t0 = time.perf_counter()
+        df_out = _windows(
+            df_exploded.lazy(), every=every, period=period, metrics=metrics
+        ).collect()
+        seconds = time.perf_counter() - t0
+
+        config_cols = [pl.lit(every).alias("every"), pl.lit(period).alias("period")]
+        return df_out.select(*config_cols, pl.all()), seconds
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run, configs))
+
+    timings = pl.DataFrame(
+        {
+            "every": [every for every, _ in configs],
+            "period": [period for _, period in configs],
+            "windows": [len(df_out) for df_out, _ in results],
+            "seconds": [seconds for _, seconds in results],
+        }
+    )
+
+    return pl.concat([df_out for df_out, _ in results]), timings
+
+
+DURATION_UNITS = {
+    "us": timedelta(microseconds=1),
+    "ms": timedelta(milliseconds=1),
+    "s": timedelta(seconds=1),
+    "m": timedelta(minutes=1),
+    "h": timedelta(hours=1),
+    "d": timedelta(days=1),
+    "w": timedelta(weeks=1),
+}
+
+
+def parse_duration(duration: str) -> timedelta:
+    """
+    Convert a fixed-length polars duration string (e.g. "6d", "1d12h") to timedelta
+
+    Calendar durations ("mo", "q", "y") have no fixed length and raise ValueError.
+    """
+    parts = re.findall(r"(\d+)(us|ms|s|m|h|d|w)", duration)
+
+    if not parts or "".join(n + unit for n, unit in parts) != duration:
+        raise ValueError(f"Expected a fixed-length duration string, got {duration!r}")
+
+    return sum((int(n) * DURATION_UNITS[unit] for n, unit in parts), timedelta())
+
+
+def _output_metrics(
+    output: pl.DataFrame, ci: float
+) -> tuple[tuple[str, ...], float | None]:
+    # metrics and confidence level of an existing output of `hashtag_analysis`
+    metrics = tuple(column for column in output.columns if column in METRICS)
+    per_user = [name for name in metrics if METRICS[name][0] == COL_AUTHOR_ID]
+    if per_user:
+        raise ValueError(
+            f"The posts per user of {', '.join(per_user)} are not stored in the "
+            "output, rerun `hashtag_analysis`."
+        )
+
+    return metrics, (ci if OUTPUT_COL_GINI_LO in output.columns else None)
+
+
+def _assign_windows(
+    new_data: pl.DataFrame, origin: datetime, every: str, period: str
+) -> pl.DataFrame:
+    """
+    Hashtags of `new_data` with the start of every window (on the grid of windows
+    starting at `origin`) that they fall in, as (`timewindow_start`, user, hashtag)
+    """
+    df_new = explode_hashtags(new_data)
+    if df_new[COL_TIME].first() < origin:
+        raise ValueError(
+            "New data precedes the first time window, rerun `hashtag_analysis`."
+        )
+
+    return _explode_windows(df_new, origin, every, period).select(
+        pl.col([OUTPUT_COL_TIMESPAN, COL_AUTHOR_ID, COL_POST])
+    )
+
+
+def _explode_windows(
+    data_frame: pl.DataFrame, origin: datetime, every: str, period: str
+) -> pl.DataFrame:
+    # one row per window (on the grid of windows starting at `origin`) that the
+    # `COL_TIME` of a row falls in, with its start as `timewindow_start`
+    every_td, period_td = parse_duration(every), parse_duration(period)
+    n_overlap = -(-period_td // every_td)  # nr. of windows that contain a timestamp
+
+    last_window = (pl.col(COL_TIME) - origin).dt.total_microseconds() // (
+        every_td // timedelta(microseconds=1)
+    )
+    window_start = pl.lit(origin) + pl.col("window") * every_td
+
+    return (
+        data_frame.with_columns(
+            window=pl.int_ranges(last_window - n_overlap + 1, last_window + 1)
+        )
+        .explode("window")
+        .with_columns(window_start.alias(OUTPUT_COL_TIMESPAN))
+        .filter(
+            pl.col("window") >= 0,
+            pl.col(COL_TIME) < pl.col(OUTPUT_COL_TIMESPAN) + period_td,
+        )
+        .drop("window")
+    )
+
+
+def _timespan_like_posts(
+    output: pl.DataFrame, data_frame: pl.DataFrame | pl.LazyFrame
+) -> pl.DataFrame:
+    # `timewindow_start` of a previous output as datetime in the time zone of the
+    # posts in `data_frame` (e.g. UTC for `scan_dataset`), outputs store the window
+    # starts as strings without a time zone
+    time_zone = getattr(data_frame.lazy().collect_schema()[COL_TIME], "time_zone", None)
+    output_dtype = output.schema[OUTPUT_COL_TIMESPAN]
+
+    timespan = pl.col(OUTPUT_COL_TIMESPAN)
+    if output_dtype == pl.String:
+        timespan = timespan.str.to_datetime(time_zone=time_zone)
+    elif output_dtype.time_zone is None or time_zone is None:
+        timespan = timespan.dt.replace_time_zone(time_zone)
+    else:
+        timespan = timespan.dt.convert_time_zone(time_zone)
+
+    return output.with_columns(timespan)
+
+
+@pl.StringCache()
+def hashtag_analysis_incremental(
+    previous_output: pl.DataFrame,
+    new_data: pl.DataFrame,
+    every="1h",
+    period="1h",
+    ci=0.95,
+    n_resamples=1000,
+) -> pl.DataFrame:
+    """
+    Update the output of `hashtag_analysis` with newly appended posts
+
+    Only the windows that contain a timestamp from `new_data` are recomputed (all
+    overlapping windows when `period` > `every`), and only the windows from the
+    first of them on are read, so the cost grows with the size of the new data
+    rather than the whole corpus. The result is the same as rerunning
+    `hashtag_analysis` on the old and new posts together, including the bootstrap
+    interval (see `bootstrap_gini`). Metrics of the posts per user (e.g.
+    `user_gini`) cannot be updated, the output only has the hashtag uses of each
+    user.
+
+    Parameters
+    ----------
+    previous_output : pl.DataFrame
+        output of `hashtag_analysis` (e.g. read from primary_output.parquet), if its
+        users and hashtags are Categorical, read or computed within the same
+        `pl.StringCache()` as this call
+    new_data : pl.DataFrame
+        new posts, same columns as the input to `hashtag_analysis`
+    every : str
+        must be the same value as used for `previous_output`
+    period : str
+        must be the same value as used for `previous_output`
+    ci : float
+        confidence level, used if `previous_output` has `gini_lo` and `gini_hi`
+    n_resamples : int
+        nr. of bootstrap resamples, used as `ci`
+
+    Returns
+    -------
+    pl.DataFrame
+        updated output, with `timewindow_start` and the users and hashtags of the
+        same types as in `previous_output`, and the same metrics
+    """
+    # the recomputed windows get the same columns as the previous ones
+    metrics, ci = _output_metrics(previous_output, ci)
+
+    # with start_by="datapoint" windows start at the very first post
+    origin = _timespan_like_posts(previous_output.head(1), new_data)[
+        OUTPUT_COL_TIMESPAN
+    ].first()
+    df_new = _assign_windows(new_data, origin=origin, every=every, period=period)
+
+    touched = df_new[OUTPUT_COL_TIMESPAN].unique().sort()
+    if touched.is_empty():  # new posts fall between windows (`period` < `every`)
+        return previous_output
+
+    # the previous output is sorted, only the windows from the first touched one on
+    # are converted (window starts of the posts, Categorical users and hashtags)
+    i_start = previous_output[OUTPUT_COL_TIMESPAN].search_sorted(
+        _timespan_like_output(touched.head(1), previous_output).first(), side="left"
+    )
+    df_tail = (
+        _timespan_like_posts(previous_output.slice(i_start), new_data)
+        .drop(OUTPUT_COL_GINI + "_smooth")
+        .with_columns(
+            # outputs written before users and hashtags were Categorical
+            pl.col(OUTPUT_COL_USERS).cast(pl.List(pl.Categorical)),
+            pl.col(OUTPUT_COL_HASHTAGS).cast(pl.List(pl.Categorical)),
+        )
+    )
+
+    # only the span of touched windows is rebuilt
+    i_end = df_tail[OUTPUT_COL_TIMESPAN].search_sorted(touched.last(), side="right")
+    df_span = df_tail.slice(0, i_end)
+    is_touched = pl.col(OUTPUT_COL_TIMESPAN).is_in(touched.implode())
+
+    # previous posts of touched windows come first, as they would in a full rerun
+    df_previous_posts = (
+        df_span.filter(is_touched)
+        .select(
+            pl.col(OUTPUT_COL_TIMESPAN),
+            pl.col(OUTPUT_COL_USERS).alias(COL_AUTHOR_ID),
+            pl.col(OUTPUT_COL_HASHTAGS).alias(COL_POST),
+        )
+        .explode([COL_AUTHOR_ID, COL_POST])
+    )
+
+    df_recomputed = (
+        pl.concat([df_previous_posts, df_new])
+        .group_by(OUTPUT_COL_TIMESPAN, maintain_order=True)
+        .agg(_window_aggregations(metrics))
+        .pipe(_with_metrics, metrics, ci=ci, n_resamples=n_resamples)
+    )
+
+    df_span = pl.concat([df_span.filter(~is_touched), df_recomputed]).sort(
+        OUTPUT_COL_TIMESPAN
+    )
+
+    df_tail = pl.concat([df_span, df_tail.slice(i_end)]).with_columns(
+        _timespan_like_output(pl.col(OUTPUT_COL_TIMESPAN), previous_output),
+        pl.col(OUTPUT_COL_USERS).cast(previous_output.schema[OUTPUT_COL_USERS]),
+        pl.col(OUTPUT_COL_HASHTAGS).cast(previous_output.schema[OUTPUT_COL_HASHTAGS]),
+    )
+
+    return _replace_tail(previous_output, i_start, df_tail)
+
+
+def _timespan_like_output(
+    timespan: pl.Series | pl.Expr, output: pl.DataFrame
+) -> pl.Series | pl.Expr:
+    # window starts from `_timespan_like_posts` back in the type of `timewindow_start`
+    # in `output`
+    output_dtype = output.schema[OUTPUT_COL_TIMESPAN]
+    if output_dtype == pl.String:
+        return timespan.dt.to_string("%Y-%m-%d %H:%M:%S")
+    if output_dtype.time_zone is None:
+        return timespan.dt.replace_time_zone(None)
+    return timespan.dt.convert_time_zone(output_dtype.time_zone)
+
+
+def _replace_tail(
+    output: pl.DataFrame, i_start: int, tail: pl.DataFrame
+) -> pl.DataFrame:
+    # `output` with the windows from row `i_start` on replaced by `tail` (without the
+    # smoothed gini), which is only recomputed where it changes: from the window
+    # before `i_start`, with the one before that for the centered mean
+    i_keep = max(i_start - 1, 0)
+    i_context = max(i_start - 2, 0)
+    smooth = OUTPUT_COL_GINI + "_smooth"
+
+    df_tail = (
+        pl.concat(
+            [output.slice(i_context, i_start - i_context).drop(smooth), tail],
+            how="vertical_relaxed",
+        )
+        .with_columns(_smooth_gini())
+        .slice(i_keep - i_context)
+    )
+
+    return pl.concat([output.slice(0, i_keep), df_tail.select(output.columns)])
+
+
+def compact_primary_output(
+    primary_output: pl.DataFrame | pl.LazyFrame,
+) -> tuple[pl.DataFrame, pl.DataFrame] | tuple[pl.LazyFrame, pl.LazyFrame]:
+    """
+    Normalize the output of `hashtag_analysis` into a per-window and a count table
+
+    Instead of one hashtag and one user entry per post in every window, the counts
+    table stores how many times each user posted each hashtag in the window.
+
+    Parameters
+    ----------
+    primary_output : pl.DataFrame | pl.LazyFrame
+        output of `hashtag_analysis` (with `timewindow_start` as datetime or string)
+
+    Returns
+    -------
+    tuple[pl.DataFrame, pl.DataFrame] | tuple[pl.LazyFrame, pl.LazyFrame]
+        per-window table (`window_id`, `timewindow_start`, `count`, `gini`,
+        `gini_smooth`) and counts table (`window_id`, `hashtags`, `users`, `count`)
+        with hashtags and users as Categorical, lazy if the input is lazy
+    """
+    lf = primary_output.lazy().with_row_index(OUTPUT_COL_WINDOW_ID)
+
+    windows = lf.drop(OUTPUT_COL_USERS, OUTPUT_COL_HASHTAGS)
+
+    counts = (
+        lf.select(
+            pl.col(OUTPUT_COL_WINDOW_ID),
+            pl.col(OUTPUT_COL_HASHTAGS).cast(pl.List(pl.Categorical)),
+            pl.col(OUTPUT_COL_USERS).cast(pl.List(pl.Categorical)),
+        )
+        .explode([OUTPUT_COL_HASHTAGS, OUTPUT_COL_USERS])
+        # the windows are in order already, sorting by the categories is not needed
+        .group_by(
+            OUTPUT_COL_WINDOW_ID,
+            OUTPUT_COL_HASHTAGS,
+            OUTPUT_COL_USERS,
+            maintain_order=True,
+        )
+        .agg(pl.len().cast(pl.UInt32).alias(OUTPUT_COL_COUNT))
+    )
+
+    return _like_input(windows, primary_output), _like_input(counts, primary_output)
+
+
+def normalize_primary_output(
+    primary_output: pl.DataFrame | pl.LazyFrame,
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Normalize the hashtags of an output of `hashtag_analysis` written before they
+    were normalized at extraction (`#USA`, `#Ferguson,`) as `extract_hashtags` does
+
+    Entries that are not a hashtag after normalization (`#1`) are dropped together
+    with their user, the other columns (e.g. `gini`) are kept as computed.
+    """
+    lf = primary_output.lazy()
+    columns = lf.collect_schema().names()
+    lf = lf.with_row_index("window")
+
+    hashtag = (
+        pl.col(OUTPUT_COL_HASHTAGS).cast(pl.String).str.extract(HASHTAG_PATTERN, 0)
+    )
+    normalized = (
+        lf.select(
+            pl.col("window"), pl.col(OUTPUT_COL_USERS), pl.col(OUTPUT_COL_HASHTAGS)
+        )
+        .explode([OUTPUT_COL_USERS, OUTPUT_COL_HASHTAGS])
+        .with_columns(hashtag.alias(OUTPUT_COL_HASHTAGS))
+        .filter(pl.col(OUTPUT_COL_HASHTAGS).str.contains(HASHTAG_LETTER))
+        .group_by("window", maintain_order=True)
         .agg(
-            pl.col(COL_AUTHOR_ID).alias(OUTPUT_COL_USERS),
-            pl.col(COL_POST).alias(OUTPUT_COL_HASHTAGS),
-            pl.col(COL_POST).count().alias(OUTPUT_COL_COUNT),
-            pl.col(COL_POST)
-            .map_batches(gini, returns_scalar=True, return_dtype=pl.Float64)
-            .alias(OUTPUT_COL_GINI),
+            pl.col(OUTPUT_COL_USERS).cast(pl.String),
+            pl.col(OUTPUT_COL_HASHTAGS).str.to_lowercase(),
         )
+    )
+
+    empty = pl.lit([], dtype=pl.List(pl.String))
+    lf = (
+        lf.drop(OUTPUT_COL_USERS, OUTPUT_COL_HASHTAGS)
+        .join(normalized, on="window", how="left", maintain_order="left")
         .with_columns(
-            pl.col(OUTPUT_COL_GINI)
-            .rolling_mean(window_size=3, center=True)
-            .alias(OUTPUT_COL_GINI + "_smooth")
+            pl.col(OUTPUT_COL_USERS).fill_null(empty),
+            pl.col(OUTPUT_COL_HASHTAGS).fill_null(empty),
         )
-        .rename({COL_TIME: OUTPUT_COL_TIMESPAN})
+        .select(columns)
     )
 
-    # convert datetime back to string
-    df_out = df_out.with_columns(
-        pl.col(OUTPUT_COL_TIMESPAN).dt.to_string("%Y-%m-%d %H:%M:%S")
+    return _like_input(lf, primary_output)
+
+
+def write_primary_output(
+    windows: pl.DataFrame, counts: pl.DataFrame, output_path: str | Path
+):
+    """Write the tables returned by `compact_primary_output` to `output_path`"""
+    windows.write_parquet(Path(output_path, PRIMARY_WINDOWS_FNAME))
+    counts.write_parquet(Path(output_path, PRIMARY_COUNTS_FNAME))
+
+
+def read_primary_output(output_path: str | Path) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Read the per-window and counts tables written by `write_primary_output`"""
+    return (
+        pl.read_parquet(Path(output_path, PRIMARY_WINDOWS_FNAME)),
+        pl.read_parquet(Path(output_path, PRIMARY_COUNTS_FNAME)),
     )
 
-    return df_out
 
+def scan_primary_output(output_path: str | Path) -> tuple[pl.DataFrame, pl.LazyFrame]:
+    """
+    Read the per-window table written by `write_primary_output` (memory-mapped) and
+    scan the counts table
 
-def secondary_analyzer(primary_output, timewindow):
-    dataframe_single_timewindow = primary_output.filter(
-        pl.col("timewindow_start") == timewindow
+    The counts are sorted by `window_id`, so a filter on `window_id` is pushed into
+    the scan and only the row groups of that window are read, instead of loading
+    the counts of all windows.
+    """
+    return (
+        pl.read_parquet(Path(output_path, PRIMARY_WINDOWS_FNAME), memory_map=True),
+        pl.scan_parquet(Path(output_path, PRIMARY_COUNTS_FNAME)),
     )
 
-    secondary_output = (
-        dataframe_single_timewindow.explode(
+
+@pl.StringCache()
+def update_primary_output(
+    windows: pl.DataFrame,
+    counts: pl.DataFrame,
+    new_data: pl.DataFrame,
+    every="1h",
+    period="1h",
+    ci=0.95,
+    n_resamples=1000,
+    bursts=None,
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    `hashtag_analysis_incremental` for the compact output of `compact_primary_output`
+
+    Windows that did not exist before get new `window_id`s above the current
+    maximum, so the ids of existing windows (and the counts table order) are stable.
+    As there, only the windows from the first touched one on are read.
+
+    Parameters
+    ----------
+    windows : pl.DataFrame
+        per-window table of the previous output
+    counts : pl.DataFrame
+        counts table of the previous output, read or computed within the same
+        `pl.StringCache()` as this call
+    new_data : pl.DataFrame
+        new posts, same columns as the input to `hashtag_analysis`
+    every : str
+        must be the same value as used for the previous output
+    period : str
+        must be the same value as used for the previous output
+    ci : float
+        confidence level, used if `windows` has `gini_lo` and `gini_hi`
+    n_resamples : int
+        nr. of bootstrap resamples, used as `ci`
+    bursts : BurstTracker | None
+        tracker of the previous output (see `mango_blog.bursts.read_bursts`), updated
+        in place with the windows touched by the new posts
+
+    Returns
+    -------
+    tuple[pl.DataFrame, pl.DataFrame]
+        updated per-window and counts tables, with `timewindow_start` of the same type
+        as in `windows`
+    """
+    metrics, ci = _output_metrics(windows, ci)
+
+    origin = _timespan_like_posts(windows.head(1), new_data)[
+        OUTPUT_COL_TIMESPAN
+    ].first()
+    df_new = _assign_windows(new_data, origin=origin, every=every, period=period)
+
+    starts = df_new.select(pl.col(OUTPUT_COL_TIMESPAN).unique().sort())
+    if starts.is_empty():  # new posts fall between windows (`period` < `every`)
+        return windows, counts
+
+    # windows are sorted, the touched ones are at or after the first new window start
+    first_changed = _timespan_like_output(
+        starts[OUTPUT_COL_TIMESPAN].head(1), windows
+    ).first()
+    i_windows = windows[OUTPUT_COL_TIMESPAN].search_sorted(first_changed, side="left")
+    windows_tail = _timespan_like_posts(windows.slice(i_windows), new_data).drop(
+        OUTPUT_COL_GINI + "_smooth"
+    )
+
+    # ids of the touched windows, new ones continue after the current maximum
+    touched = starts.join(
+        windows_tail.select(OUTPUT_COL_TIMESPAN, OUTPUT_COL_WINDOW_ID),
+        on=OUTPUT_COL_TIMESPAN,
+        how="left",
+    ).with_columns(
+        pl.col(OUTPUT_COL_WINDOW_ID)
+        .fill_null(
+            windows[OUTPUT_COL_WINDOW_ID].max()
+            + pl.col(OUTPUT_COL_WINDOW_ID).is_null().cum_sum()
+        )
+        .cast(pl.UInt32)
+    )
+
+    new_counts = (
+        df_new.join(touched, on=OUTPUT_COL_TIMESPAN)
+        .group_by(
+            pl.col(OUTPUT_COL_WINDOW_ID),
+            pl.col(COL_POST).cast(pl.Categorical).alias(OUTPUT_COL_HASHTAGS),
+            pl.col(COL_AUTHOR_ID).cast(pl.Categorical).alias(OUTPUT_COL_USERS),
+        )
+        .agg(pl.len().cast(pl.UInt32).alias(OUTPUT_COL_COUNT))
+    )
+
+    # counts are sorted by window_id, only the tail from the first touched id changes
+    touched_ids = touched[OUTPUT_COL_WINDOW_ID]
+    i_start = counts[OUTPUT_COL_WINDOW_ID].search_sorted(touched_ids.min())
+    is_touched = pl.col(OUTPUT_COL_WINDOW_ID).is_in(touched_ids.implode())
+
+    counts_tail = counts.slice(i_start)
+    counts_touched = (
+        pl.concat([counts_tail.filter(is_touched), new_counts])
+        .group_by(OUTPUT_COL_WINDOW_ID, OUTPUT_COL_HASHTAGS, OUTPUT_COL_USERS)
+        .agg(pl.col(OUTPUT_COL_COUNT).sum())
+    )
+
+    counts = pl.concat(
+        [
+            counts.slice(0, i_start),
+            pl.concat([counts_tail.filter(~is_touched), counts_touched]).sort(
+                OUTPUT_COL_WINDOW_ID, maintain_order=True
+            ),
+        ],
+        rechunk=False,
+    )
+
+    # per-window hashtag counts, as from `_window_aggregations` (the metrics of the
+    # posts per user are not updated, see `_output_metrics`)
+    windows_touched = counts_touched.group_by(OUTPUT_COL_WINDOW_ID).agg(
+        pl.col(OUTPUT_COL_COUNT).sum()
+    )
+    windows_touched = windows_touched.join(
+        counts_touched.group_by(OUTPUT_COL_WINDOW_ID, OUTPUT_COL_HASHTAGS)
+        .agg(pl.col(OUTPUT_COL_COUNT).sum())
+        .group_by(OUTPUT_COL_WINDOW_ID)
+        .agg(pl.col(OUTPUT_COL_COUNT).alias(_counts_column(COL_POST))),
+        on=OUTPUT_COL_WINDOW_ID,
+    )
+
+    windows_touched = _with_metrics(
+        windows_touched, metrics, ci=ci, n_resamples=n_resamples
+    ).join(touched, on=OUTPUT_COL_WINDOW_ID)
+
+    windows_tail = (
+        pl.concat(
+            [
+                windows_tail.filter(~is_touched),
+                windows_touched.select(windows_tail.columns),
+            ]
+        )
+        .sort(OUTPUT_COL_TIMESPAN)
+        .with_columns(_timespan_like_output(pl.col(OUTPUT_COL_TIMESPAN), windows))
+    )
+    windows = _replace_tail(windows, i_windows, windows_tail)
+
+    if bursts is not None:
+        bursts.update(windows, counts, first_changed=first_changed)
+
+    return windows, counts
+
+
+def _is_compact(primary_output: pl.DataFrame | pl.LazyFrame) -> bool:
+    return OUTPUT_COL_WINDOW_ID in primary_output.lazy().collect_schema()
+
+
+def _secondary_aggregation(primary_output: pl.LazyFrame) -> pl.LazyFrame:
+    return (
+        primary_output.explode(
             [OUTPUT_COL_HASHTAGS, OUTPUT_COL_USERS]
         )  # make eash hashtag and user a separate row
         .with_columns(
-            n_hashtags=pl.col(OUTPUT_COL_HASHTAGS).len()
-        )  # column with number of hashtags
+            n_hashtags=pl.col(OUTPUT_COL_HASHTAGS).len().over(OUTPUT_COL_TIMESPAN)
+        )  # column with number of hashtags in the time window
         .group_by(
-            pl.col(OUTPUT_COL_HASHTAGS)
+            pl.col(OUTPUT_COL_TIMESPAN), pl.col(OUTPUT_COL_HASHTAGS)
         )  # for each hashtag, compute the folllowing
         .agg(
             users_all=pl.col(OUTPUT_COL_USERS),
@@ -117,23 +1269,114 @@ def secondary_analyzer(primary_output, timewindow):
             / pl.col(OUTPUT_COL_USERS).len(),
             common_user=pl.col(OUTPUT_COL_USERS).value_counts(sort=True),
         )
+    )
+
+
+def _secondary_aggregation_compact(counts: pl.LazyFrame) -> pl.LazyFrame:
+    # same as `_secondary_aggregation`, (hashtag, user) pairs are unique per window
+    return (
+        counts.with_columns(
+            n_hashtags=pl.col(OUTPUT_COL_COUNT).sum().over(OUTPUT_COL_WINDOW_ID)
+        )
+        .group_by(pl.col(OUTPUT_COL_WINDOW_ID), pl.col(OUTPUT_COL_HASHTAGS))
+        .agg(
+            users_all=pl.col(OUTPUT_COL_USERS)
+            .repeat_by(pl.col(OUTPUT_COL_COUNT))
+            .flatten(),
+            users_unique=pl.col(OUTPUT_COL_USERS),
+            hashtag_perc=(pl.col(OUTPUT_COL_COUNT).sum() / pl.col("n_hashtags").first())
+            * 100,
+            user_ratio=pl.col(OUTPUT_COL_USERS).len() / pl.col(OUTPUT_COL_COUNT).sum(),
+            common_user=pl.struct(
+                pl.col(OUTPUT_COL_USERS), pl.col(OUTPUT_COL_COUNT)
+            ).sort_by(pl.col(OUTPUT_COL_COUNT), descending=True),
+        )
+    )
+
+
+def secondary_analyzer(primary_output, timewindow):
+    """
+    Parameters
+    ----------
+    primary_output : pl.DataFrame | pl.LazyFrame
+        output of `hashtag_analysis`, or the counts table of `compact_primary_output`
+    timewindow : datetime | int
+        start of the time window, or its `window_id` for the counts table
+
+    Returns
+    -------
+    pl.DataFrame | pl.LazyFrame
+        per hashtag statistics in the time window, sorted by `hashtag_perc`
+    """
+    if _is_compact(primary_output):
+        key, aggregation = OUTPUT_COL_WINDOW_ID, _secondary_aggregation_compact
+    else:
+        key, aggregation = OUTPUT_COL_TIMESPAN, _secondary_aggregation
+
+    dataframe_single_timewindow = primary_output.lazy().filter(
+        pl.col(key) == timewindow
+    )
+
+    secondary_output = (
+        aggregation(dataframe_single_timewindow)
+        .drop(key)
         .sort(by="hashtag_perc", descending=True)
         .with_columns(
             pl.col("hashtag_perc").round(2),
         )
     )
 
-    return secondary_output
+    return _like_input(secondary_output, primary_output)
+
+
+def secondary_analyzer_all(
+    primary_output: pl.DataFrame | pl.LazyFrame,
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Run `secondary_analyzer` for all time windows in a single pass
+
+    Parameters
+    ----------
+    primary_output : pl.DataFrame | pl.LazyFrame
+        output of `hashtag_analysis`, or the counts table of `compact_primary_output`
+
+    Returns
+    -------
+    pl.DataFrame | pl.LazyFrame
+        output of `secondary_analyzer` with an additional `timewindow_start` (or
+        `window_id`) column, sorted by time window so that a single window is a
+        contiguous slice
+    """
+    if _is_compact(primary_output):
+        key, aggregation = OUTPUT_COL_WINDOW_ID, _secondary_aggregation_compact
+    else:
+        key, aggregation = OUTPUT_COL_TIMESPAN, _secondary_aggregation
+
+    secondary_output = (
+        aggregation(primary_output.lazy())
+        .sort(by=[key, "hashtag_perc"], descending=[False, True])
+        .with_columns(
+            pl.col("hashtag_perc").round(2),
+        )
+    )
+
+    return _like_input(secondary_output, primary_output)
 
 
-def make_table1(russ_trol_df: pl.DataFrame) -> GT:
-    df_sum = russ_trol_df.select(
-        unique_users=pl.col(COL_AUTHOR_ID).unique().len(),
-        total_posts=pl.col(COL_AUTHOR_ID).len(),
-        has_hashtags=pl.col(COL_POST).str.contains("#").sum(),
-        has_hashtags_perc=(
-            (pl.col(COL_POST).str.contains("#").sum() / pl.col(COL_POST).len()) * 100
-        ).round(1),
+@pl.StringCache()
+def make_table1(russ_trol_df: pl.DataFrame | pl.LazyFrame) -> GT:
+    df_sum = (
+        russ_trol_df.lazy()
+        .select(
+            unique_users=pl.col(COL_AUTHOR_ID).unique().len(),
+            total_posts=pl.col(COL_AUTHOR_ID).len(),
+            has_hashtags=pl.col(COL_POST).str.contains("#").sum(),
+            has_hashtags_perc=(
+                (pl.col(COL_POST).str.contains("#").sum() / pl.col(COL_POST).len())
+                * 100
+            ).round(1),
+        )
+        .collect(engine="streaming")
     )
 
     df_sum_ = df_sum.rename(
@@ -0,0 +1,112 @@
+from pathlib import Path
+
+import polars as pl
+
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_HASHTAGS,
+    COL_POST,
+    COL_TIME,
+    extract_hashtags,
+)
+
+# column names in the NBC News release of the dataset
+RAW_COLUMNS = {
+    "Twitter screenname": COL_AUTHOR_ID,
+    "Date tweet sent": COL_TIME,
+    "Tweet text": COL_POST,
+}
+RAW_TIME_FORMAT = "%m/%d/%Y %H:%M"
+
+COL_MONTH = "month"
+
+
+def scan_raw(source: str | Path) -> pl.LazyFrame:
+    """
+    Scan the raw dataset (.csv or .parquet) and return typed, normalized columns
+
+    Parameters
+    ----------
+    source : str | Path
+        path to the raw NBC News dataset
+
+    Returns
+    -------
+    pl.LazyFrame
+        `COL_AUTHOR_ID` (Categorical), `COL_TIME` (UTC Datetime), `COL_POST` and
+        `COL_HASHTAGS` (list of hashtags extracted from `COL_POST`)
+    """
+    if Path(source).suffix == ".csv":
+        lf = pl.scan_csv(source=source, skip_rows=3)  # we know this in advance
+    else:
+        lf = pl.scan_parquet(source=source)
+
+    return (
+        lf.rename(RAW_COLUMNS)
+        .select(pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST))
+        .with_columns(
+            pl.col(COL_AUTHOR_ID).cast(pl.Categorical),
+            pl.col(COL_TIME)
+            .str.to_datetime(RAW_TIME_FORMAT)
+            .dt.replace_time_zone("UTC"),
+            extract_hashtags(COL_POST).alias(COL_HASHTAGS),
+        )
+    )
+
+
+def ingest(source: str | Path, dataset_path: str | Path) -> None:
+    """
+    Write the raw dataset as a parquet dataset partitioned by month
+
+    Parameters
+    ----------
+    source : str | Path
+        path to the raw NBC News dataset (.csv or .parquet)
+    dataset_path : str | Path
+        folder to write the dataset to, one `month=YYYY-MM` subfolder per month
+    """
+    # within each month, rows are ordered by user and time so that the parquet
+    # row-group statistics allow skipping when filtering on a single user
+    lf = scan_raw(source).sort(pl.col(COL_AUTHOR_ID).cast(pl.String), COL_TIME)
+
+    lf.sink_parquet(
+        pl.PartitionByKey(
+            dataset_path,
+            by=pl.col(COL_TIME).dt.strftime("%Y-%m").alias(COL_MONTH),
+            include_key=False,
+        ),
+        mkdir=True,
+    )
+
+
+def scan_dataset(dataset_path: str | Path) -> pl.LazyFrame:
+    """
+    Scan the dataset written by `ingest`
+
+    Parameters
+    ----------
+    dataset_path : str | Path
+        folder with the partitioned dataset
+
+    Returns
+    -------
+    pl.LazyFrame
+        `COL_AUTHOR_ID`, `COL_TIME`, `COL_POST`, `COL_HASHTAGS` and `COL_MONTH`
+    """
+    return pl.scan_parquet(source=dataset_path, hive_partitioning=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "source", type=str, help="Path to the raw russian trolls dataset"
+    )
+    parser.add_argument("dataset_path", type=str, help="Folder to store the data to")
+
+    args = parser.parse_args()
+
+    print(f"Writing {args.source} to {args.dataset_path}")
+    ingest(source=args.source, dataset_path=args.dataset_path)
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+import polars as pl
+
+from mango_blog.hashtags import COL_AUTHOR_ID, COL_HASHTAGS, COL_POST, COL_TIME
+from mango_blog.ingest import COL_MONTH
+
+
+def _month(time: datetime) -> str:
+    # partition of `time` in the dataset written by `ingest` (months in UTC)
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc)
+    return time.strftime("%Y-%m")
+
+
+class PostLookup:
+    """
+    Lookup of the posts of a user in a time range, read from the dataset on demand
+
+    There is no index, each lookup is a scan filtered by user and time, and nothing
+    is read before the first lookup (the dataset does not have to exist yet). On
+    the dataset written by `ingest` the filters are applied while reading: only the
+    `month=YYYY-MM` partitions of the time range are read, and within a month the
+    rows are sorted by user, so that row groups of other users can be skipped.
+
+    Parameters
+    ----------
+    data : pl.DataFrame | pl.LazyFrame
+        posts with `COL_AUTHOR_ID`, `COL_TIME`, `COL_POST` and `COL_HASHTAGS` columns
+        (e.g. `mango_blog.ingest.scan_dataset(...)`)
+    """
+
+    def __init__(self, data: pl.DataFrame | pl.LazyFrame):
+        self.data = data.lazy()
+        self._partitioned = None
+
+    @property
+    def partitioned(self) -> bool:
+        """Whether the data has the `month` partitions of `ingest`"""
+        if self._partitioned is None:  # reads the schema of the dataset
+            self._partitioned = COL_MONTH in self.data.collect_schema()
+        return self._partitioned
+
+    def lookup(
+        self,
+        user_id: str,
+        time_start: datetime,
+        time_end: datetime,
+        hashtag: str | None = None,
+    ) -> pl.DataFrame:
+        """
+        Posts by `user_id` between `time_start` and `time_end` (inclusive), sorted by
+        time and optionally only those containing `hashtag`
+        """
+        lf = self.data
+        if self.partitioned:
+            lf = lf.filter(
+                pl.col(COL_MONTH).is_between(
+                    pl.lit(_month(time_start)), pl.lit(_month(time_end))
+                )
+            )
+
+        lf = lf.filter(
+            pl.col(COL_AUTHOR_ID) == user_id,
+            pl.col(COL_TIME).is_between(time_start, time_end),
+        )
+
+        if hashtag is not None:
+            lf = lf.filter(pl.col(COL_HASHTAGS).list.contains(hashtag))
+
+        return (
+            lf.select(pl.col(COL_AUTHOR_ID), pl.col(COL_TIME), pl.col(COL_POST))
+            .sort(COL_TIME, maintain_order=True)
+            .collect()
+        )
@@ -7,6 +7,11 @@ from mango_blog.constants import DATES, DATES2FORMATTED
 
 FS = 14
 
+# bounds on what the plotly figures send to the browser
+MAX_BARS = 30  # bars per page of the bar plots
+MAX_POINTS = 1000  # points of the gini line (downsampled with `lttb`)
+BAR_HEIGHT = 30  # px
+
 
 def plot_gini_annot(df: pl.DataFrame, x_selected: int, smooth: bool = False):
     fig, ax = plt.subplots(figsize=(12, 3.5), layout="constrained")
@@ -110,16 +115,95 @@ def plot_bar(data_frame, ax):
     return fig, ax
 
 
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of `n_out` points of the series (x, y) that keep its visual shape
+
+    Largest-Triangle-Three-Buckets: the first and last points are kept, the points
+    in between are split into `n_out - 2` buckets and the point of each bucket that
+    forms the largest triangle with the point kept in the previous bucket and the
+    mean of the next bucket is kept. Peaks and dips survive, unlike with averaging
+    or taking every k-th point.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.zeros(n_out, dtype=np.int64)
+    selected[-1] = n - 1
+
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        x_next, y_next = x[end:next_end].mean(), y[end:next_end].mean()
+        x_prev, y_prev = x[selected[b]], y[selected[b]]
+
+        area = np.abs(
+            (x_prev - x_next) * (y[start:end] - y_prev)
+            - (x_prev - x[start:end]) * (y_next - y_prev)
+        )
+        selected[b + 1] = start + np.argmax(area)
+
+    return selected
+
+
+def _bar_page(data_frame, column, top_n, page):
+    # rows `page` (from 1) of `data_frame` sorted by `column`, top_n per page, with
+    # the nr. of the first row and the total (pages past the last show the last)
+    total = len(data_frame)
+    page = min(max(page or 1, 1), max(-(-total // top_n), 1))
+    offset = (page - 1) * top_n
+
+    df_page = data_frame.sort(column, descending=True, maintain_order=True).slice(
+        offset, top_n
+    )
+    return df_page, offset + 1, total
+
+
 def plot_gini_plotly(
-    df: pl.DataFrame, x_selected, annotate: bool = False, smooth: bool = False
+    df: pl.DataFrame,
+    x_selected,
+    annotate: bool = False,
+    smooth: bool = False,
+    max_points: int = MAX_POINTS,
 ):
-    """Create a plotly line plot with white theme"""
+    """
+    Create a plotly line plot with white theme
+
+    Series with more than `max_points` time windows are downsampled with `lttb`
+    (the confidence band and the smooth line at the same time windows).
+    """
+
+    if len(df) > max_points:
+        x_num = df["timewindow_start"].dt.epoch("s").to_numpy()
+        y_num = df["gini"].fill_nan(0).fill_null(0).to_numpy()
+        df = df[lttb(x_num, y_num, max_points)]
 
     y = df.select(pl.col("gini")).to_numpy().flatten()
     x = df.select(pl.col("timewindow_start")).to_numpy().flatten()
 
     fig = go.Figure()
 
+    # Add confidence band (from `hashtag_analysis(..., ci=...)`) below the line
+    if "gini_lo" in df.columns:
+        for col in ["gini_hi", "gini_lo"]:
+            fig.add_trace(
+                go.Scatter(
+                    x=x,
+                    y=df.select(pl.col(col)).to_numpy().flatten(),
+                    mode="lines",
+                    name=col,
+                    line=dict(width=0),
+                    fill="tonexty" if col == "gini_lo" else None,
+                    fillcolor="rgba(0, 0, 0, 0.15)",
+                    hoverinfo="skip",
+                )
+            )
+
     # Add main line
     fig.add_trace(
         go.Scatter(
@@ -191,8 +275,15 @@ def plot_gini_plotly(
     return fig
 
 
-def plot_bar_plotly(data_frame, selected_date=None, show_title=True):
-    """Create an interactive plotly bar plot"""
+def plot_bar_plotly(
+    data_frame, selected_date=None, show_title=True, top_n=MAX_BARS, page=1
+):
+    """
+    Create an interactive plotly bar plot
+
+    Only the `top_n` hashtags of page `page` (the most frequent on page 1) are
+    plotted, so that the figure stays small for windows with many hashtags.
+    """
 
     if len(data_frame) == 0:
         fig = go.Figure()
@@ -213,8 +304,8 @@ def plot_bar_plotly(data_frame, selected_date=None, show_title=True):
         )
         return fig
 
-    # Use all data, no threshold filtering
-    df_sorted = data_frame.sort("hashtag_perc", descending=False)
+    df_page, first, total = _bar_page(data_frame, "hashtag_perc", top_n, page)
+    df_sorted = df_page.reverse()
 
     # Get data (lowest to highest for plotly to display highest at top)
     hashtags = df_sorted["hashtags"].to_list()
@@ -245,16 +336,17 @@ def plot_bar_plotly(data_frame, selected_date=None, show_title=True):
     else:
         title = None
 
-    # Use fixed height and let container handle scrolling
     # Calculate dynamic height based on number of hashtags (fixed spacing per bar)
-    bar_height = 30  # Fixed height per bar
-    dynamic_height = len(hashtags) * bar_height + 100  # +100 for margins
+    dynamic_height = len(hashtags) * BAR_HEIGHT + 100  # +100 for margins
 
     # Update layout
     fig.update_layout(
         template="plotly_white",
         title=title,
-        xaxis_title="% all hashtags in the selected time period",
+        xaxis_title=(
+            "% all hashtags in the selected time period"
+            f" ({first}-{first + len(hashtags) - 1} of {total} hashtags)"
+        ),
         yaxis_title="",
         height=dynamic_height,
         margin=dict(l=0, r=100, t=10, b=50),
@@ -272,8 +364,12 @@ def plot_bar_plotly(data_frame, selected_date=None, show_title=True):
     return fig
 
 
-def plot_users_plotly(users_data, selected_hashtag=None):
-    """Create an interactive plotly bar plot for user distribution"""
+def plot_users_plotly(users_data, selected_hashtag=None, top_n=MAX_BARS, page=1):
+    """
+    Create an interactive plotly bar plot for user distribution
+
+    Only the `top_n` users of page `page` (the most active on page 1) are plotted.
+    """
 
     if len(users_data) == 0:
         fig = go.Figure()
@@ -294,8 +390,9 @@ def plot_users_plotly(users_data, selected_hashtag=None):
         )
         return fig
 
-    # Sort by count (ascending for plotly display with highest at top)
-    df_sorted = users_data.sort("count", descending=False)
+    # ascending for plotly display with highest at top
+    df_page, first, total = _bar_page(users_data, "count", top_n, page)
+    df_sorted = df_page.reverse()
 
     # Get data
     users = df_sorted["users_all"].to_list()
@@ -317,14 +414,13 @@ def plot_users_plotly(users_data, selected_hashtag=None):
     )
 
     # Calculate dynamic height based on number of users
-    bar_height = 30  # Fixed height per bar
-    dynamic_height = len(users) * bar_height + 100  # +100 for margins
+    dynamic_height = len(users) * BAR_HEIGHT + 100  # +100 for margins
 
     # Update layout
     fig.update_layout(
         template="plotly_white",
         title=None,
-        xaxis_title="Number of posts",
+        xaxis_title=f"Number of posts ({first}-{first + len(users) - 1} of {total} users)",
         yaxis_title="",
         height=dynamic_height,
         margin=dict(l=0, r=50, t=0, b=10),
@@ -0,0 +1,189 @@
+from datetime import timedelta
+from math import gcd
+
+import numpy as np
+import polars as pl
+
+from mango_blog.hashtags import (
+    COL_POST,
+    COL_TIME,
+    OUTPUT_COL_COUNT,
+    OUTPUT_COL_GINI,
+    OUTPUT_COL_TIMESPAN,
+    _smooth_gini,
+    check_hashtags,
+    explode_hashtags,
+    parse_duration,
+)
+
+
+def gini_from_histogram(
+    histogram: np.ndarray, values: np.ndarray | None = None
+) -> tuple[int, float]:
+    """
+    Gini coefficient from a count-of-counts histogram
+
+    Same value as `gini_from_counts` (the sum of the cumulative sorted counts is
+    computed exactly in integers), in time proportional to the number of distinct
+    counts rather than to the number of hashtags.
+
+    Parameters
+    ----------
+    histogram : np.ndarray
+        `histogram[c]` is the number of hashtags used `c` times
+    values : np.ndarray | None
+        the counts `c > 0` with `histogram[c] > 0`, sorted, found from the histogram
+        (in time proportional to its length) if None
+
+    Returns
+    -------
+    tuple[int, float]
+        total count and the Gini coefficient (None if the total count is 0)
+    """
+    if values is None:
+        values = np.flatnonzero(histogram)
+        values = values[values > 0]
+    if len(values) == 0:
+        return 0, None
+
+    multiplicity = histogram[values]
+    totals = values * multiplicity
+    total_before = np.cumsum(totals) - totals
+
+    # the hashtags with count `c` occupy `m` consecutive positions of the sorted
+    # counts, adding m * (total of smaller counts) + c * m(m + 1) / 2 to the sum
+    # of the cumulative counts
+    sum_cumx = int(
+        np.sum(
+            multiplicity * total_before
+            + values * multiplicity * (multiplicity + 1) // 2
+        )
+    )
+    n = int(multiplicity.sum())
+    total = int(totals.sum())
+
+    return total, (n + 1 - 2 * sum_cumx / total) / n
+
+
+@pl.StringCache()
+def sliding_gini(
+    data_frame: pl.DataFrame | pl.LazyFrame, every="1h", period="1h"
+) -> pl.DataFrame:
+    """
+    Gini coefficient per time window, for windows that overlap (`period` > `every`)
+
+    Same `count`, `gini` and `gini_smooth` as `hashtag_analysis`, without the lists
+    of users and hashtags. Instead of aggregating the posts of each window
+    separately, i.e. every post `period / every` times, the per-hashtag counts are
+    kept while the window moves forward: the counts of the posts that enter are
+    added and those of the posts that leave are subtracted, and the Gini is updated
+    from the histogram of the running counts. The cost per window is that of the
+    hashtags whose count changes plus the nr. of distinct counts in the window (at
+    most the square root of twice its count), instead of that of all its posts.
+
+    Parameters
+    ----------
+    data_frame : pl.DataFrame | pl.LazyFrame
+        input data as for `hashtag_analysis`
+    every : str
+        interval of the window starts, fixed-length units only (see `parse_duration`)
+    period : str
+        length of the windows, fixed-length units only
+
+    Returns
+    -------
+    pl.DataFrame
+        `timewindow_start` (str), `count`, `gini` and `gini_smooth` per window
+    """
+    every_us = parse_duration(every) // timedelta(microseconds=1)
+    period_us = parse_duration(period) // timedelta(microseconds=1)
+
+    # posts are counted in bins, the windows start and end on bin edges
+    bin_us = gcd(every_us, period_us)
+    bins_every, bins_period = every_us // bin_us, period_us // bin_us
+
+    check_hashtags(data_frame)
+    df_exploded = explode_hashtags(data_frame.lazy()).collect(engine="streaming")
+    origin = df_exploded[COL_TIME].first()
+    elapsed_us = (pl.col(COL_TIME) - origin).dt.total_microseconds()
+
+    bin_counts = df_exploded.group_by(
+        (elapsed_us // bin_us).alias("bin"), pl.col(COL_POST)
+    ).agg(pl.len().cast(pl.Int64).alias("n"))
+
+    # a bin is in the windows first_window, ..., last_window: its count is added when
+    # the first one starts and subtracted when the one after the last one starts
+    first_window = (
+        (pl.col("bin") - bins_period + 1).clip(0) + bins_every - 1
+    ) // bins_every
+    last_window = pl.col("bin") // bins_every
+
+    deltas = (
+        bin_counts.select(
+            first_window.alias("first_window"),
+            last_window.alias("last_window"),
+            pl.col(COL_POST),
+            pl.col("n"),
+        )
+        .filter(pl.col("first_window") <= pl.col("last_window"))  # between windows
+        .select(
+            pl.concat_list("first_window", pl.col("last_window") + 1).alias("window"),
+            pl.col(COL_POST),
+            pl.concat_list(pl.col("n"), -pl.col("n")).alias("delta"),
+        )
+        .explode("window", "delta")
+        .group_by("window", COL_POST)
+        .agg(pl.col("delta").sum())
+        .filter(pl.col("delta") != 0)
+        .sort("window")
+        .with_columns(pl.col("delta").cum_sum().over(COL_POST).alias("n"))
+    )
+
+    n_windows = df_exploded.select(elapsed_us.last()).item() // every_us + 1
+
+    window = deltas["window"].to_numpy()
+    new_count = deltas["n"].to_numpy()
+    old_count = new_count - deltas["delta"].to_numpy()
+
+    # the running count of each hashtag only matters through their histogram
+    histogram = np.zeros(new_count.max() + 1, dtype=np.int64)
+    bounds = np.searchsorted(window, np.arange(n_windows + 1))
+
+    # the counts with a nonzero histogram entry, only those changed in a window are
+    # checked again
+    values = np.empty(0, dtype=np.int64)
+
+    rows = []
+    for k in range(n_windows):
+        i, j = bounds[k], bounds[k + 1]
+        np.subtract.at(histogram, old_count[i:j], 1)
+        np.add.at(histogram, new_count[i:j], 1)
+
+        changed = np.unique(np.concatenate([old_count[i:j], new_count[i:j]]))
+        changed = changed[changed > 0]
+        values = np.union1d(
+            np.setdiff1d(values, changed, assume_unique=True),
+            changed[histogram[changed] > 0],
+        )
+
+        total, gini = gini_from_histogram(histogram, values)
+        if total > 0:  # as `group_by_dynamic`, no empty windows
+            rows.append((k, total, gini))
+
+    df_out = pl.DataFrame(
+        rows,
+        schema={
+            "window": pl.Int64,
+            OUTPUT_COL_COUNT: pl.UInt32,
+            OUTPUT_COL_GINI: pl.Float64,
+        },
+        orient="row",
+    )
+
+    return df_out.select(
+        (pl.lit(origin) + pl.duration(microseconds=pl.col("window") * every_us))
+        .dt.to_string("%Y-%m-%d %H:%M:%S")
+        .alias(OUTPUT_COL_TIMESPAN),
+        pl.col(OUTPUT_COL_COUNT),
+        pl.col(OUTPUT_COL_GINI),
+    ).with_columns(_smooth_gini())
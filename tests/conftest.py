@@ -0,0 +1,69 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from mango_blog.hashtags import COL_AUTHOR_ID, COL_POST, COL_TIME
+from mango_blog.ingest import RAW_COLUMNS, RAW_TIME_FORMAT, ingest, scan_dataset
+
+# `mango_blog.constants` needs a data folder at import (see .env_template)
+os.environ.setdefault("DATA_PATH", tempfile.gettempdir())
+
+HASHTAGS = ["#IslamKills", "#islamkills", "#USA", "#Ferguson,", "#news", "#1", "#tcot"]
+
+
+def make_raw(n_posts=3000, n_users=40, days=20, seed=0) -> pl.DataFrame:
+    """Posts in the format of the raw dataset (mixed-case tags, posts without any)"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2016, 3, 1, 6, 59)
+    minutes = np.sort(rng.integers(0, days * 24 * 60, n_posts))
+
+    texts = []
+    for i in range(n_posts):
+        tags = rng.choice(HASHTAGS, size=rng.integers(0, 4)).tolist()
+        prefix = "RT @someone: " if i % 11 == 0 else ""
+        texts.append(prefix + " ".join(["post", str(i), *tags]))
+
+    raw_names = {column: raw for raw, column in RAW_COLUMNS.items()}
+    return pl.DataFrame(
+        {
+            raw_names[COL_AUTHOR_ID]: [
+                f"user{u}" for u in rng.integers(0, n_users, n_posts)
+            ],
+            raw_names[COL_TIME]: [
+                (start + timedelta(minutes=int(m))).strftime(RAW_TIME_FORMAT)
+                for m in minutes
+            ],
+            raw_names[COL_POST]: texts,
+        }
+    )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def string_cache():
+    """One string cache for the session, so that Categoricals of the fixtures and
+    tests can be combined (as the entry points of the package do)"""
+    with pl.StringCache():
+        yield
+
+
+@pytest.fixture(scope="session")
+def dataset_path(tmp_path_factory):
+    """Path of `make_raw()` written by `ingest`"""
+    folder = tmp_path_factory.mktemp("data")
+    raw_fn = folder / "raw.csv"
+    with open(raw_fn, "w") as f:
+        f.write("header\nheader\nheader\n")  # `scan_raw` skips 3 rows
+        make_raw().write_csv(f)
+
+    ingest(raw_fn, folder / "dataset")
+    return folder / "dataset"
+
+
+@pytest.fixture(scope="session")
+def posts(dataset_path):
+    """The ingested posts, sorted by time"""
+    return scan_dataset(dataset_path).collect().sort(COL_TIME, maintain_order=True)
@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from mango_blog.bursts import (
+    BurstDetector,
+    BurstTracker,
+    HashtagBurstDetector,
+    detect_bursts,
+    read_bursts,
+    write_bursts,
+)
+from mango_blog.hashtags import (
+    COL_TIME,
+    OUTPUT_COL_TIMESPAN,
+    compact_primary_output,
+    hashtag_analysis,
+    update_primary_output,
+)
+
+CUT = datetime(2016, 3, 12, 17, 5, tzinfo=timezone.utc)
+
+
+def test_gini_spike_is_flagged():
+    rng = np.random.default_rng(0)
+    series = 0.5 + 0.01 * rng.standard_normal(50)
+    series[30] = 0.9
+
+    detector = BurstDetector()
+    z, burst, _ = zip(*(detector.update(value) for value in series))
+
+    assert np.isnan(z[: detector.warmup]).all()
+    assert np.nanargmax(z) == 30 and z[30] > 10 and burst[30]
+
+
+def test_hashtag_detector_matches_dense_updates():
+    # more hashtags than the initial buffers, first used in different windows
+    rng = np.random.default_rng(0)
+    n_hashtags, n_windows = 3000, 40
+    counts = rng.poisson(3.0, (n_windows, n_hashtags))
+    counts *= rng.random((n_windows, n_hashtags)) < 0.3
+    counts[:20, :1000] = 0
+    counts[-1] += 1  # all hashtags are used
+    counts[35, 7] = 500
+
+    detector = HashtagBurstDetector()
+    hashtags = np.array([f"#{i}" for i in range(n_hashtags)])
+    mean, var = np.zeros(n_hashtags), np.zeros(n_hashtags)
+    for n, window in enumerate(counts):
+        used = np.flatnonzero(window)
+        z = detector.update(hashtags[used].tolist(), window[used])
+
+        # every hashtag updated in every window, with count 0 if not used
+        expected = (window - mean) / np.maximum(np.sqrt(var), np.sqrt(mean + 1))
+        diff = window - mean
+        mean = mean + detector.alpha * diff
+        var = (1 - detector.alpha) * (var + detector.alpha * diff**2)
+
+        if n < detector.warmup:
+            assert np.isnan(z).all()
+        else:
+            assert z == pytest.approx(expected[used], rel=1e-9, abs=1e-12)
+        if n == 35:
+            flagged = hashtags[used][detector.bursts(z, window[used])]
+            assert "#7" in flagged
+
+    positions = [detector.index[hashtag] for hashtag in hashtags]
+    assert len(detector.mean) == n_hashtags
+    assert detector.mean[positions] == pytest.approx(mean, rel=1e-9, abs=1e-12)
+
+
+def test_tracker_matches_detect_bursts(posts):
+    windows, counts = _compact(posts, "1d", "3d")
+
+    assert_frame_equal(
+        BurstTracker("3d").update(windows, counts), detect_bursts(windows, counts)
+    )
+
+
+@pytest.mark.parametrize("every, period", [("1d", "1d"), ("1d", "3d")])
+def test_tracker_state_continues_incremental_update(posts, tmp_path, every, period):
+    def tracker():
+        # sensitive, so that the few windows of the test data have flags
+        return BurstTracker(
+            period,
+            BurstDetector(threshold=1.0, warmup=3),
+            HashtagBurstDetector(threshold=1.0, min_count=2, warmup=3),
+        )
+
+    old, new = (
+        posts.filter(pl.col(COL_TIME) < CUT),
+        posts.filter(pl.col(COL_TIME) >= CUT),
+    )
+    windows, counts = _compact(old, every, period)
+    previous = tracker()
+    previous.update(windows, counts)
+    write_bursts(previous, tmp_path)
+
+    updated = read_bursts(tmp_path)
+    windows, counts = update_primary_output(
+        windows, counts, new, every=every, period=period, bursts=updated
+    )
+
+    expected = tracker().update(windows, counts)
+    assert len(expected) > 0
+    assert_frame_equal(updated.bursts, expected)
+
+    # an already processed window changed, the detectors start over
+    updated.update(windows, counts, first_changed=windows[OUTPUT_COL_TIMESPAN][0])
+    assert_frame_equal(updated.bursts, expected)
+
+
+def _compact(data, every, period):
+    return compact_primary_output(
+        hashtag_analysis(data, every=every, period=period).with_columns(
+            pl.col(OUTPUT_COL_TIMESPAN).str.to_datetime(time_zone="UTC")
+        )
+    )
@@ -0,0 +1,33 @@
+import polars as pl
+
+from mango_blog.cache import ResultCache, fingerprint
+
+
+def frame(i, rows=1000):
+    return pl.DataFrame({"x": range(i, i + rows)})
+
+
+def test_new_inputs_are_not_served_old_results(tmp_path):
+    inputs = tmp_path / "primary_output.parquet"
+    frame(0).write_parquet(inputs)
+    old = ResultCache(path=tmp_path / "cache", version=fingerprint(inputs))
+    old.get(("secondary", 0), lambda: frame(0))
+
+    frame(1, rows=10).write_parquet(inputs)  # e.g. the primary analysis rerun
+    new = ResultCache(path=tmp_path / "cache", version=fingerprint(inputs))
+
+    assert new.get(("secondary", 0), lambda: frame(1))["x"][0] == 1
+    assert new.stats()["disk_hits"] == 0
+
+
+def test_disk_store_is_bounded(tmp_path):
+    frame(0).write_parquet(tmp_path / "one.parquet")
+    size = (tmp_path / "one.parquet").stat().st_size
+    cache = ResultCache(max_bytes=3 * size, path=tmp_path / "cache")
+    for i in range(10):
+        cache.get(("posts", i), lambda: frame(i))
+
+    files = list((tmp_path / "cache").rglob("*.parquet"))
+    assert 0 < len(files) < 10
+    assert sum(fn.stat().st_size for fn in files) <= 3 * size
+    assert cache._file(("posts", 9)).exists()  # the most recent is kept
@@ -0,0 +1,35 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import combinations
+
+import pytest
+
+from mango_blog.cooccurrence import cooccurrence_edges
+from mango_blog.hashtags import COL_HASHTAGS, COL_TIME, hashtag_analysis
+
+
+@pytest.mark.parametrize(
+    "every, period, min_weight", [("1d", "1d", 1), ("1d", "3d", 1), ("2d", "1d", 3)]
+)
+def test_edges_match_pairs_of_each_post(posts, every, period, min_weight):
+    # windows as in the output of `hashtag_analysis`
+    starts = hashtag_analysis(posts, every=every, period=period)["timewindow_start"]
+    length = timedelta(days=int(period[:-1]))
+
+    expected = []
+    for start in starts:
+        time_start = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
+        weights = Counter()
+        for time, hashtags in posts.select(COL_TIME, COL_HASHTAGS).iter_rows():
+            if time_start <= time < time_start + length:
+                weights.update(combinations(sorted(set(hashtags)), 2))
+        expected += [
+            (start, *pair, weight)
+            for pair, weight in weights.items()
+            if weight >= min_weight
+        ]
+
+    edges = cooccurrence_edges(posts, every=every, period=period, min_weight=min_weight)
+
+    assert len(expected) > 0
+    assert sorted(edges.rows()) == sorted(expected)
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from itertools import combinations
+
+import numpy as np
+import polars as pl
+import pytest
+from scipy import sparse
+
+from mango_blog.coordination import cosine_similarity_top_k, synchronized_posts
+from mango_blog.hashtags import COL_AUTHOR_ID, COL_POST, COL_TIME
+
+
+def make_posts(n_posts=300, seed=0) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    start = datetime(2016, 3, 22, 7, 0)
+    return pl.DataFrame(
+        {
+            COL_AUTHOR_ID: [f"user{u}" for u in rng.integers(0, 20, n_posts)],
+            COL_TIME: [
+                start + timedelta(seconds=int(s))
+                for s in rng.integers(0, 3600, n_posts)
+            ],
+            COL_POST: [f"post #tag{t}" for t in rng.integers(0, 5, n_posts)],
+        }
+    ).with_columns(pl.col(COL_TIME).dt.replace_time_zone("UTC"))
+
+
+def test_synchronized_posts_match_all_pairs():
+    df = make_posts()
+    seconds = 30
+
+    expected = []
+    for (text,), group in df.group_by(COL_POST, maintain_order=True):
+        rows = group.sort(COL_TIME).rows(named=True)
+        for a, b in combinations(rows, 2):
+            lag = abs((b[COL_TIME] - a[COL_TIME]).total_seconds())
+            if lag <= seconds and a[COL_AUTHOR_ID] != b[COL_AUTHOR_ID]:
+                users = sorted([a[COL_AUTHOR_ID], b[COL_AUTHOR_ID]])
+                expected.append((text.split()[-1], *users, lag))
+
+    result = synchronized_posts(df, seconds=seconds, max_neighbors=len(df))
+
+    assert len(expected) > 0
+    assert sorted(
+        result.select(
+            pl.col(COL_POST).cast(pl.String), "user_a", "user_b", "lag_s"
+        ).rows()
+    ) == sorted(expected)
+
+
+def test_synchronized_posts_need_a_neighbor():
+    with pytest.raises(ValueError, match="max_neighbors"):
+        synchronized_posts(make_posts(), max_neighbors=0)
+
+
+@pytest.mark.parametrize("max_nnz", [2**24, 50])
+def test_cosine_top_k_matches_dense(max_nnz):
+    rng = np.random.default_rng(0)
+    dense = rng.random((40, 15)) * (rng.random((40, 15)) < 0.3)
+    dense[7] = 0  # a user without hashtags has no similar users
+    k, min_similarity = 3, 0.2
+
+    norms = np.linalg.norm(dense, axis=1, keepdims=True)
+    normalized = dense / np.where(norms > 0, norms, 1)
+    similarity = normalized @ normalized.T
+    np.fill_diagonal(similarity, -1)
+
+    expected = {}
+    for row in range(len(dense)):
+        for col in np.argsort(-similarity[row])[:k]:
+            if similarity[row, col] >= min_similarity:
+                expected[row, col] = similarity[row, col]
+
+    # small `max_nnz`: the product is computed in blocks of a few rows
+    rows, cols, data = cosine_similarity_top_k(
+        sparse.csr_array(dense), k=k, min_similarity=min_similarity, max_nnz=max_nnz
+    )
+
+    assert len(expected) > len(dense)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == sorted(expected)
+    assert data == pytest.approx([expected[key] for key in zip(rows, cols)])
@@ -0,0 +1,29 @@
+import numpy as np
+import polars as pl
+
+from mango_blog.cube import COL_EVERY_DAYS, COL_PERIOD_DAYS, gini_cube
+from mango_blog.hashtags import hashtag_analysis
+
+
+def test_gini_cube_matches_hashtag_analysis(posts):
+    days = (1, 2, 3)
+    cube = gini_cube(posts, days=days)
+
+    for every in days:
+        for period in days:
+            expected = hashtag_analysis(
+                posts, every=f"{every}d", period=f"{period}d"
+            ).select("timewindow_start", "count", "gini", "gini_smooth")
+
+            result = cube.filter(
+                pl.col(COL_EVERY_DAYS) == every, pl.col(COL_PERIOD_DAYS) == period
+            ).with_columns(pl.col("timewindow_start").dt.to_string("%Y-%m-%d %H:%M:%S"))
+
+            assert result["timewindow_start"].to_list() == (
+                expected["timewindow_start"].to_list()
+            )
+            assert result["count"].to_list() == expected["count"].to_list()
+            np.testing.assert_allclose(result["gini"], expected["gini"], rtol=1e-12)
+            np.testing.assert_allclose(
+                result["gini_smooth"], expected["gini_smooth"], rtol=1e-12
+            )
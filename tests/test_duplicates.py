@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from mango_blog.duplicates import (
+    COL_TEXT_NORMALIZED,
+    near_duplicate_clusters,
+    update_signatures,
+)
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_POST,
+    COL_TIME,
+    OUTPUT_COL_TIMESPAN,
+    hashtag_analysis,
+)
+
+
+def test_windows_match_hashtag_analysis():
+    text = "the same message posted by several accounts at once #news"
+    df = pl.DataFrame(
+        {
+            COL_AUTHOR_ID: ["a", "b", "c", "d"],
+            COL_TIME: [
+                datetime(2016, 3, 1, 6, 59),
+                datetime(2016, 3, 1, 8, 0),
+                datetime(2016, 3, 2, 7, 30),
+                datetime(2016, 3, 2, 9, 0),
+            ],
+            # the first post is a retweet, left out of the clusters
+            COL_POST: ["RT @a: breaking #news", text, text, text],
+        }
+    ).with_columns(pl.col(COL_TIME).dt.replace_time_zone("UTC"))
+
+    clusters = near_duplicate_clusters(df, every="1d", period="1d")
+    windows = hashtag_analysis(df, every="1d", period="1d")[OUTPUT_COL_TIMESPAN]
+
+    assert len(clusters) == 1
+    assert clusters[OUTPUT_COL_TIMESPAN][0].to_list() == windows.to_list()
+
+
+def test_stored_signatures_of_another_seed_raise(tmp_path):
+    texts = pl.Series(["a message posted twice", "another message"])
+    path = tmp_path / "signatures.parquet"
+
+    first = update_signatures(texts, path, seed=1)
+    again = update_signatures(texts, path, seed=1)
+
+    assert again.sort(COL_TEXT_NORMALIZED).equals(first.sort(COL_TEXT_NORMALIZED))
+    with pytest.raises(ValueError, match="seed=2"):
+        update_signatures(texts, path, seed=2)
@@ -0,0 +1,81 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import mango_blog.hashtags
+
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_POST,
+    COL_TIME,
+    COL_HASHTAGS,
+    bootstrap_gini,
+    hashtag_analysis,
+    hashtag_analysis_sweep,
+    normalize_primary_output,
+)
+
+
+def test_normalize_primary_output_matches_extraction():
+    legacy = pl.DataFrame(
+        {
+            "timewindow_start": ["2016-03-22 06:59:00", "2016-03-28 06:59:00"],
+            "users": [["a", "b", "c"], ["d"]],
+            "hashtags": [["#IslamKills", "#Ferguson,", "#1"], ["#2"]],
+            "gini": [0.5, 0.0],
+        }
+    )
+
+    normalized = normalize_primary_output(legacy)
+
+    assert normalized.columns == legacy.columns
+    assert normalized["users"].to_list() == [["a", "b"], []]
+    assert normalized["hashtags"].to_list() == [["#islamkills", "#ferguson"], []]
+    assert normalized["gini"].to_list() == [0.5, 0.0]
+
+
+@pytest.mark.parametrize(
+    "analysis",
+    [hashtag_analysis, lambda df: hashtag_analysis_sweep(df, [("1d", "1d")])],
+)
+def test_posts_without_hashtags_raise(analysis):
+    df = pl.DataFrame(
+        {
+            COL_AUTHOR_ID: ["a", "b"],
+            COL_TIME: ["2016-03-22 06:59:00", "2016-03-22 07:00:00"],
+            COL_POST: ["no tags", "none here either"],
+        }
+    )
+
+    with pytest.raises(ValueError, match="no hashtags"):
+        analysis(df)
+
+
+def test_bootstrap_interval_contains_gini(posts):
+    out = hashtag_analysis(posts, every="1d", period="1d", ci=0.95)
+    # all hashtags used once (Gini 0), every resample is more unequal
+    equal = bootstrap_gini(pl.Series([[1, 1, 1, 1], [2, 2]]))
+
+    assert out["gini"].null_count() == 0
+    assert (
+        (0 <= out["gini_lo"])
+        & (out["gini_lo"] <= out["gini"])
+        & (out["gini"] <= out["gini_hi"])
+        & (out["gini_hi"] <= 1)
+    ).all()
+    assert equal.struct.field("gini_lo").to_list() == [0.0, 0.0]
+
+
+@pytest.mark.parametrize(
+    "every, period", [("1d", "1d"), ("1d", "3d"), ("2d", "1d"), ("6h", "1d")]
+)
+def test_lazy_chunks_match_eager(posts, monkeypatch, every, period):
+    # posts with the hashtags extracted again, as from a CSV
+    posts = posts.drop(COL_HASHTAGS)
+    kwargs = dict(every=every, period=period, metrics=["user_gini"], ci=0.95)
+    eager = hashtag_analysis(posts, n_resamples=50, **kwargs)
+
+    monkeypatch.setattr(mango_blog.hashtags, "CHUNK_POSTS", 500)
+    lazy = hashtag_analysis(posts.lazy(), n_resamples=50, **kwargs)
+
+    assert_frame_equal(lazy.collect(), eager)
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from mango_blog.hashtags import (
+    COL_TIME,
+    OUTPUT_COL_TIMESPAN,
+    compact_primary_output,
+    hashtag_analysis,
+    hashtag_analysis_incremental,
+    update_primary_output,
+)
+
+WINDOWS = [("1d", "1d"), ("1d", "3d"), ("2d", "1d")]
+CUT = datetime(2016, 3, 12, 17, 5, tzinfo=timezone.utc)
+
+
+def _split(posts):
+    return posts.filter(pl.col(COL_TIME) < CUT), posts.filter(pl.col(COL_TIME) >= CUT)
+
+
+@pytest.mark.parametrize("ci", [None, 0.95])
+@pytest.mark.parametrize("every, period", WINDOWS)
+def test_incremental_matches_full_rerun(posts, every, period, ci):
+    old, new = _split(posts)
+
+    kwargs = dict(every=every, period=period, ci=ci, n_resamples=50)
+    full = hashtag_analysis(posts, **kwargs)
+    previous = hashtag_analysis(old, **kwargs)
+    updated = hashtag_analysis_incremental(previous, new, **kwargs)
+
+    assert_frame_equal(updated, full)
+
+
+@pytest.mark.parametrize("ci", [None, 0.95])
+@pytest.mark.parametrize("every, period", WINDOWS)
+def test_update_primary_output_matches_full_rerun(posts, every, period, ci):
+    old, new = _split(posts)
+    kwargs = dict(every=every, period=period, ci=ci, n_resamples=50)
+
+    def compact(data):
+        return compact_primary_output(
+            hashtag_analysis(data, **kwargs).with_columns(
+                pl.col(OUTPUT_COL_TIMESPAN).str.to_datetime(time_zone="UTC")
+            )
+        )
+
+    windows_full, counts_full = compact(posts)
+    windows, counts = update_primary_output(*compact(old), new, **kwargs)
+
+    assert_frame_equal(windows, windows_full, check_column_order=False)
+
+    key = ["window_id", "hashtags", "users"]
+    assert_frame_equal(
+        counts.with_columns(pl.col(key[1:]).cast(pl.String)).sort(key),
+        counts_full.with_columns(pl.col(key[1:]).cast(pl.String)).sort(key),
+    )
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+import polars as pl
+
+from mango_blog.hashtags import COL_AUTHOR_ID, COL_HASHTAGS, COL_POST, COL_TIME
+from mango_blog.ingest import scan_dataset
+from mango_blog.lookup import PostLookup
+
+
+def test_lookup_matches_filter(dataset_path, posts):
+    post_lookup = PostLookup(scan_dataset(dataset_path))
+    user, time_end = posts.row(len(posts) // 2)[:2]
+    # from the month before the first post, which has no partition
+    time_start = time_end - timedelta(days=20)
+
+    for hashtag in (None, "#islamkills"):
+        expected = posts.filter(
+            pl.col(COL_AUTHOR_ID) == user,
+            pl.col(COL_TIME).is_between(time_start, time_end),
+            hashtag is None or pl.col(COL_HASHTAGS).list.contains(hashtag),
+        ).select(COL_AUTHOR_ID, COL_TIME, COL_POST)
+
+        result = post_lookup.lookup(user, time_start, time_end, hashtag)
+
+        assert len(result) > 0
+        assert result.sort(pl.all()).equals(expected.sort(pl.all()))
+
+
+def test_nothing_is_read_before_the_first_lookup(tmp_path):
+    PostLookup(scan_dataset(tmp_path / "missing"))
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+import mango_blog
+from mango_blog.hashtags import COL_AUTHOR_ID, COL_POST, COL_TIME
+
+# growth of the peak memory of the lazy `hashtag_analysis` from 200k to 2M posts,
+# mostly the output (about 190 MB when all posts were exploded and sorted at once)
+MAX_GROWTH_MB = 100
+
+PEAK_MB = """
+import resource, sys
+import polars as pl
+from mango_blog.hashtags import hashtag_analysis
+
+lf = pl.scan_parquet(sys.argv[1])
+hashtag_analysis(lf, every="1d", period="1d").collect(engine="streaming")
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+
+def write_posts(path: Path, n_posts: int, days=20, seed=0) -> Path:
+    """`n_posts` posts with up to 3 of 10000 hashtags, one parquet file per day"""
+    path.mkdir()
+    rng = np.random.default_rng(seed)
+    n = n_posts // days
+    for day in range(days):
+        tags = rng.zipf(1.5, size=(n, 3)) % 10_000
+        pl.DataFrame(
+            {
+                "user": rng.integers(0, 10_000, n),
+                "seconds": np.sort(rng.integers(0, 24 * 3600, n)) + day * 24 * 3600,
+                "tags": tags,
+                "n_tags": rng.integers(0, 4, n),
+            }
+        ).select(
+            pl.format("user{}", "user").alias(COL_AUTHOR_ID),
+            (pl.lit(datetime(2016, 1, 1)) + pl.duration(seconds="seconds")).alias(
+                COL_TIME
+            ),
+            pl.col("tags")
+            .arr.to_list()
+            .list.head(pl.col("n_tags"))
+            .list.eval(pl.format("#tag{}", pl.element()))
+            .list.join(" ")
+            .alias(COL_POST),
+        ).write_parquet(path / f"day-{day:02d}.parquet")
+
+    return path
+
+
+def peak_mb(path: Path) -> float:
+    # in a new process, so that the peak is that of `hashtag_analysis` only
+    env = {**os.environ, "PYTHONPATH": str(Path(mango_blog.__file__).parents[1])}
+    result = subprocess.run(
+        [sys.executable, "-c", PEAK_MB, str(path / "*.parquet")],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout)
+
+
+def test_lazy_peak_memory_does_not_grow_with_corpus(tmp_path):
+    small = peak_mb(write_posts(tmp_path / "small", 200_000))
+    large = peak_mb(write_posts(tmp_path / "large", 2_000_000))
+
+    assert large - small < MAX_GROWTH_MB
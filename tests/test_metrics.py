@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import polars as pl
+import pytest
+
+from mango_blog.hashtags import (
+    COL_AUTHOR_ID,
+    COL_HASHTAGS,
+    COL_TIME,
+    gini_from_counts,
+    hashtag_analysis,
+    hashtag_analysis_incremental,
+)
+
+METRICS = ("entropy", "hhi", "top10_share", "user_gini")
+
+
+def _gini(counts) -> float:
+    return pl.select(gini_from_counts(pl.lit(pl.Series(counts)))).item()
+
+
+def test_metrics_match_counts_of_each_window(posts):
+    out = hashtag_analysis(posts, every="1d", period="1d", metrics=METRICS)
+
+    for row in out.iter_rows(named=True):
+        start = datetime.fromisoformat(row["timewindow_start"]).replace(
+            tzinfo=timezone.utc
+        )
+        window = posts.filter(
+            pl.col(COL_TIME).is_between(start, start + timedelta(days=1), "left"),
+            pl.col(COL_HASHTAGS).list.len() > 0,
+        )
+        hashtags = window[COL_HASHTAGS].explode().value_counts()["count"].to_numpy()
+        shares = hashtags / hashtags.sum()
+        # each post once, however many hashtags it has
+        posts_per_user = window[COL_AUTHOR_ID].value_counts()["count"].to_numpy()
+
+        assert row["count"] == hashtags.sum()
+        assert row["gini"] == pytest.approx(_gini(hashtags))
+        assert row["entropy"] == pytest.approx(-(shares * np.log2(shares)).sum())
+        assert row["hhi"] == pytest.approx((shares**2).sum())
+        assert row["top10_share"] == pytest.approx(np.sort(shares)[-10:].sum())
+        assert row["user_gini"] == pytest.approx(_gini(posts_per_user))
+
+
+def test_metrics_are_computed_once(posts):
+    out = hashtag_analysis(
+        posts, every="1d", period="1d", metrics=("gini", "hhi", "hhi")
+    )
+
+    assert out.columns.count("gini") == 1
+    assert out.columns.count("hhi") == 1
+
+
+def test_incremental_update_of_posts_per_user_raises(posts):
+    previous = hashtag_analysis(posts, every="1d", period="1d", metrics=METRICS)
+
+    with pytest.raises(ValueError, match="user_gini"):
+        hashtag_analysis_incremental(previous, posts.tail(10), every="1d", period="1d")
@@ -0,0 +1,38 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from mango_blog.plots import _bar_page, lttb
+
+
+@pytest.mark.parametrize("n_out", [3, 10, 100])
+def test_lttb_keeps_ends_and_length(n_out):
+    rng = np.random.default_rng(0)
+    x = np.arange(1000)
+    y = rng.standard_normal(1000)
+    y[500] = 50  # a peak survives the downsampling
+
+    selected = lttb(x, y, n_out)
+
+    assert len(selected) == n_out
+    assert selected[0] == 0 and selected[-1] == len(y) - 1
+    assert (np.diff(selected) > 0).all()
+    assert 500 in selected
+
+
+def test_lttb_short_series_is_kept():
+    assert lttb(np.arange(5), np.zeros(5), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_bar_page():
+    df = pl.DataFrame({"hashtag": list("abcdefg"), "n": [3, 7, 1, 5, 7, 2, 4]})
+
+    df_page, first, total = _bar_page(df, "n", 3, 2)
+    assert df_page["hashtag"].to_list() == ["g", "a", "f"]
+    assert (first, total) == (4, 7)
+
+    # ties keep their order, pages before the first and past the last are clamped
+    assert _bar_page(df, "n", 3, None)[0]["hashtag"].to_list() == ["b", "e", "d"]
+    df_page, first, _ = _bar_page(df, "n", 3, 9)
+    assert df_page["hashtag"].to_list() == ["c"] and first == 7
+    assert _bar_page(df.clear(), "n", 3, 2)[1:] == (1, 0)
@@ -0,0 +1,39 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from mango_blog.hashtags import gini_from_counts, hashtag_analysis
+from mango_blog.sliding import gini_from_histogram, sliding_gini
+
+
+@pytest.mark.parametrize(
+    "every, period", [("1d", "1d"), ("1d", "3d"), ("6h", "1d"), ("2d", "1d")]
+)
+def test_sliding_gini_matches_hashtag_analysis(posts, every, period):
+    expected = hashtag_analysis(posts, every=every, period=period).select(
+        "timewindow_start", "count", "gini", "gini_smooth"
+    )
+
+    result = sliding_gini(posts, every=every, period=period)
+
+    assert result["timewindow_start"].to_list() == (
+        expected["timewindow_start"].to_list()
+    )
+    assert result["count"].to_list() == expected["count"].to_list()
+    np.testing.assert_allclose(result["gini"], expected["gini"], rtol=1e-12)
+    np.testing.assert_allclose(
+        result["gini_smooth"], expected["gini_smooth"], rtol=1e-12
+    )
+
+
+def test_gini_from_histogram():
+    counts = np.array([1, 1, 2, 5, 5, 5, 9])
+    histogram = np.bincount(counts)
+
+    total, value = gini_from_histogram(histogram)
+
+    assert total == counts.sum()
+    assert value == pytest.approx(
+        pl.select(gini_from_counts(pl.lit(pl.Series(counts)))).item()
+    )
+    assert gini_from_histogram(histogram, np.array([1, 2, 5, 9])) == (total, value)